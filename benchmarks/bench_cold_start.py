@@ -0,0 +1,95 @@
+# benchmarks/bench_cold_start.py
+"""
+Cold-start time of the API: importing src.app.main and serving the first /status.
+
+Each run is a fresh interpreter. The script exits non-zero if the median
+time to first /status exceeds --budget-s, or if any module in HEAVY_MODULES
+was imported by `import src.app.main` (they belong to the background
+warm-up), so it can gate CI.
+
+    python -m benchmarks.bench_cold_start --runs 5 --budget-s 2.0
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import ROOT
+
+# Must not be imported just to serve /status
+HEAVY_MODULES = [
+    "torch", "transformers", "matplotlib", "plotly", "bs4", "boto3", "botocore", "psutil", "cv2"
+]
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import src.app.main as main
+imported = time.perf_counter()
+loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+
+import asyncio, httpx
+
+async def first_status():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        return (await client.get("/status")).json()
+
+status = asyncio.run(first_status())
+served = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "first_status_s": served - start,
+    "status_ok": status.get("status") == "ok",
+    "ready": status.get("ready"),
+    "loaded": loaded,
+}))
+"""
+
+
+def run_once() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT, os.path.join(ROOT, "src"), env.get("PYTHONPATH", "")])
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{PROBE}"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Cold-start probe failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-s", type=float, default=2.0, help="Maximum median time to first /status")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    loaded = sorted({m for run in runs for m in run["loaded"]})
+    report = {
+        "runs": args.runs,
+        "import_median_s": round(statistics.median(r["import_s"] for r in runs), 3),
+        "first_status_median_s": round(statistics.median(r["first_status_s"] for r in runs), 3),
+        "first_status_max_s": round(max(r["first_status_s"] for r in runs), 3),
+        "status_ok": all(r["status_ok"] for r in runs),
+        "heavy_modules_loaded": loaded,
+        "budget_s": args.budget_s
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if report["first_status_median_s"] > args.budget_s:
+        failures.append(f"median time to first /status {report['first_status_median_s']}s > budget {args.budget_s}s")
+    if loaded:
+        failures.append(f"heavy modules imported at startup: {', '.join(loaded)}")
+    if not report["status_ok"]:
+        failures.append("/status did not return ok")
+    if failures:
+        print("Cold-start regression: " + "; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_detect_batching.py
+"""
+Throughput vs latency of the detector with and without micro-batching.
+
+    python -m benchmarks.bench_detect_batching --requests 64
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import synthetic_image, latency_summary
+
+from src.app.core.batching import MicroBatcher
+from src.app.core.detect import detect_batch_sync, _run_detection_batch
+from src.app.core.model_registry import model_registry
+from src.app.settings.setting import DETECTOR_ID, DEFAULT_THRESHOLD, DETECT_BATCH_WINDOW_MS, DETECT_MAX_BATCH_SIZE
+
+LABELS = ["person.", "shirt.", "pant.", "shoe."]
+
+
+async def run_clients(call, images, concurrency: int):
+    latencies = []
+    queue = list(images)
+
+    async def client():
+        while queue:
+            image = queue.pop()
+            start = time.perf_counter()
+            await call(image)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+async def main(args):
+    images = [synthetic_image(args.width, args.height, seed=i) for i in range(args.requests)]
+    model_registry.preload(warmup=True)
+    key = (DETECTOR_ID, tuple(LABELS), DEFAULT_THRESHOLD)
+
+    async def unbatched(image):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, detect_batch_sync, [image], LABELS, DEFAULT_THRESHOLD, DETECTOR_ID)
+
+    print(f"{'mode':<10}{'clients':>8}{'img/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'batch':>8}")
+    for concurrency in args.clients:
+        batcher = MicroBatcher(_run_detection_batch, args.window_ms, args.max_batch_size)
+        for mode, call in (("single", unbatched), ("batched", lambda image: batcher.submit(key, image))):
+            elapsed, latencies = await run_clients(call, images, concurrency)
+            summary = latency_summary(latencies)
+            batch = batcher.stats()["mean_batch_size"] if mode == "batched" else 1.0
+            print(f"{mode:<10}{concurrency:>8}{len(images) / elapsed:>10.2f}{summary['p50_ms']:>10.1f}{summary['p95_ms']:>10.1f}{batch:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=960)
+    parser.add_argument("--window-ms", type=float, default=DETECT_BATCH_WINDOW_MS)
+    parser.add_argument("--max-batch-size", type=int, default=DETECT_MAX_BATCH_SIZE)
+    asyncio.run(main(parser.parse_args()))
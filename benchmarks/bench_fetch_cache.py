@@ -0,0 +1,135 @@
+# benchmarks/bench_fetch_cache.py
+"""
+Image fetching against a local HTTP stand-in: cold downloads vs cached revalidation.
+
+The stand-in serves JPEGs with ETag/Last-Modified and a Pinterest-like pin
+page pointing at one of them through og:image. Reports latency and bytes
+sent by the server for a cold pass, a warm pass (conditional GETs answered
+with 304) and a pass without the cache.
+
+    python -m benchmarks.bench_fetch_cache --images 20 --size 2000x3000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import tempfile
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+from benchmarks.common import Timer, synthetic_image
+
+from src.app.utils.fetch import ImageFetcher
+from src.app.utils.fetch_cache import FetchCache
+
+
+class StandIn:
+    """
+    Threaded local HTTP server serving /img/<n>.jpg and /pin/<n> pages.
+    """
+
+    def __init__(self, images):
+        self.images = images
+        self.requests = {"full": 0, "not_modified": 0, "pages": 0}
+        self.bytes_sent = 0
+        self.last_modified = formatdate(usegmt=True)
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if parts[0] == "pin":
+                    standin.requests["pages"] += 1
+                    html = f'<html><head><meta property="og:image" content="/img/{parts[1]}.jpg"></head></html>'.encode()
+                    self._send(200, html, "text/html")
+                    return
+                if parts[0] != "img":
+                    self._send(404, b"", "text/plain")
+                    return
+                data = standin.images[int(parts[1].split(".")[0])]
+                etag = '"%s"' % hashlib.md5(data).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    standin.requests["not_modified"] += 1
+                    self._send(304, b"", "image/jpeg", etag)
+                    return
+                standin.requests["full"] += 1
+                self._send(200, data, "image/jpeg", etag)
+
+            def _send(self, status, body, content_type, etag=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                if etag:
+                    self.send_header("ETag", etag)
+                    self.send_header("Last-Modified", standin.last_modified)
+                if status != 304:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+                    standin.bytes_sent += len(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        self.requests = {key: 0 for key in self.requests}
+        self.bytes_sent = 0
+
+
+async def fetch_all(fetcher, urls):
+    with Timer() as timer:
+        results = await asyncio.gather(*(fetcher.fetch(url) for url in urls))
+    return timer.seconds, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--size", default="2000x3000", help="WIDTHxHEIGHT")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    images = []
+    for seed in range(args.images):
+        buffer = BytesIO()
+        synthetic_image(width, height, seed).save(buffer, "JPEG", quality=90)
+        images.append(buffer.getvalue())
+    standin = StandIn(images)
+    # "pinterest" in the path makes the fetcher treat these as pin pages
+    urls = [f"{standin.url}/img/{i}.jpg" for i in range(args.images)]
+    urls += [f"{standin.url}/pin/{i}?source=pinterest" for i in range(min(5, args.images))]
+
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FetchCache(max_bytes=4 * sum(map(len, images)), directory=directory)
+            fetcher = ImageFetcher(cache=cache)
+            report = {}
+            for name in ("cold", "warm"):
+                standin.reset()
+                seconds, results = await fetch_all(fetcher, urls)
+                assert all(r.data == images[int(r.url.rsplit("/", 1)[1].split(".")[0])] for r in results)
+                report[name] = {"ms": round(seconds * 1000, 2), "bytes_sent": standin.bytes_sent, **standin.requests}
+            report["cache"] = cache.stats()
+            await fetcher.aclose()
+
+            standin.reset()
+            uncached = ImageFetcher()
+            seconds, _ = await fetch_all(uncached, urls)
+            report["no_cache"] = {"ms": round(seconds * 1000, 2), "bytes_sent": standin.bytes_sent, **standin.requests}
+            await uncached.aclose()
+        print(json.dumps(report, indent=2))
+
+    asyncio.run(run())
+    standin.server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
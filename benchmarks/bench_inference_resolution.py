@@ -0,0 +1,164 @@
+# benchmarks/bench_inference_resolution.py
+"""
+Inference-resolution policy: latency and box-accuracy deltas vs full-resolution inference.
+
+Decode: full JPEG decode + resize vs reduced-scale (draft) decode + resize,
+with the mean absolute pixel difference between the two inference images.
+Pipeline (needs the models): detect + segment on the full image vs on the
+downscaled copy with outputs mapped back; reports per-image latency and, for
+boxes matched by label and IoU, the mean box IoU, mask IoU and score delta.
+
+    python -m benchmarks.bench_inference_resolution --size 6000x4000
+    python -m benchmarks.bench_inference_resolution --images a.jpg b.jpg
+    python -m benchmarks.bench_inference_resolution --skip-models
+"""
+
+import argparse
+import asyncio
+import io
+import json
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+from benchmarks.common import Timer, synthetic_image
+
+from app.utils.resolution import to_rgb, resize_for_inference, original_size, rescale_boxes, inference_size
+from app.utils.results import DetectionResult
+from app.settings.setting import INFERENCE_MAX_SIDE, INFERENCE_MAX_MEGAPIXELS
+
+LABELS = ["person.", "shirt.", "pant.", "shoe."]
+
+
+def box_iou(a: List[float], b: List[float]) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match(reference: List[DetectionResult], candidate: List[DetectionResult], min_iou: float = 0.5) -> Dict[str, float]:
+    """
+    Greedy same-label matching by box IoU; unmatched detections on either side are counted.
+    """
+    pairs = sorted(
+        ((box_iou(r.box.xyxy, c.box.xyxy), i, j)
+         for i, r in enumerate(reference) for j, c in enumerate(candidate) if r.label == c.label),
+        reverse=True
+    )
+    used_r, used_c, matched = set(), set(), []
+    for iou, i, j in pairs:
+        if iou < min_iou or i in used_r or j in used_c:
+            continue
+        used_r.add(i)
+        used_c.add(j)
+        matched.append((iou, reference[i], candidate[j]))
+    mask_ious = [r.mask.iou(c.mask) for _, r, c in matched if r.mask is not None and c.mask is not None]
+    return {
+        "matched": len(matched),
+        "missed": len(reference) - len(matched),
+        "extra": len(candidate) - len(matched),
+        "box_iou": float(np.mean([iou for iou, _, _ in matched])) if matched else None,
+        "mask_iou": float(np.mean(mask_ious)) if mask_ious else None,
+        "score_delta": float(np.mean([abs(r.score - c.score) for _, r, c in matched])) if matched else None
+    }
+
+
+def bench_decode(data: bytes, repeats: int) -> Dict[str, float]:
+    def full():
+        return resize_for_inference(to_rgb(Image.open(io.BytesIO(data)), draft=False))
+
+    def draft():
+        return resize_for_inference(to_rgb(Image.open(io.BytesIO(data)), draft=True))
+
+    report = {}
+    for name, decode in (("full", full), ("draft", draft)):
+        decode()
+        with Timer() as timer:
+            for _ in range(repeats):
+                image = decode()
+        report[f"{name}_decode_ms"] = round(timer.seconds * 1000 / repeats, 2)
+        report[f"{name}_inference_size"] = list(image.size)
+        if name == "full":
+            reference = np.asarray(image, dtype=np.int16)
+        else:
+            report["draft_mean_abs_pixel_diff"] = round(float(np.abs(reference - np.asarray(image, dtype=np.int16)).mean()), 3)
+    return report
+
+
+async def bench_pipeline(datas: List[bytes]) -> Dict[str, object]:
+    from src.app.core.detect import detect
+    from src.app.core.segment import segment
+    from src.app.core.model_registry import model_registry
+
+    model_registry.preload(warmup=True)
+    full_ms, policy_ms, matches = [], [], []
+    for index, data in enumerate(datas):
+        image = to_rgb(Image.open(io.BytesIO(data)), draft=False)
+        with Timer() as timer:
+            reference = await detect(image=image, labels=LABELS)
+            reference = await segment(image=image, detection_results=reference, image_key=f"full:{index}")
+        full_ms.append(timer.seconds * 1000)
+
+        with Timer() as timer:
+            image = to_rgb(Image.open(io.BytesIO(data)))
+            size = original_size(image)
+            small = resize_for_inference(image)
+            candidate = await detect(image=small, labels=LABELS)
+            rescale_boxes(candidate, small.size, size)
+            candidate = await segment(
+                image=small, detection_results=candidate, image_key=f"policy:{index}", original_size=size
+            )
+        policy_ms.append(timer.seconds * 1000)
+        matches.append(match(reference, candidate))
+
+    def mean(key):
+        values = [m[key] for m in matches if m[key] is not None]
+        return round(float(np.mean(values)), 4) if values else None
+
+    return {
+        "full_ms_mean": round(float(np.mean(full_ms)), 2),
+        "policy_ms_mean": round(float(np.mean(policy_ms)), 2),
+        "speedup": round(float(np.mean(full_ms) / np.mean(policy_ms)), 2),
+        "matched": sum(m["matched"] for m in matches),
+        "missed": sum(m["missed"] for m in matches),
+        "extra": sum(m["extra"] for m in matches),
+        "box_iou_mean": mean("box_iou"),
+        "mask_iou_mean": mean("mask_iou"),
+        "score_delta_mean": mean("score_delta")
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="6000x4000", help="WIDTHxHEIGHT of the synthetic JPEG")
+    parser.add_argument("--images", nargs="*", help="JPEG files to use instead of a synthetic image")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--skip-models", action="store_true", help="Only benchmark decoding")
+    args = parser.parse_args()
+
+    if args.images:
+        datas = [open(path, "rb").read() for path in args.images]
+    else:
+        width, height = (int(v) for v in args.size.split("x"))
+        buffer = io.BytesIO()
+        synthetic_image(width, height).save(buffer, "JPEG", quality=92)
+        datas = [buffer.getvalue()]
+
+    size = Image.open(io.BytesIO(datas[0])).size
+    report = {
+        "policy": {"max_side": INFERENCE_MAX_SIDE, "max_megapixels": INFERENCE_MAX_MEGAPIXELS},
+        "original_size": list(size),
+        "inference_size": list(inference_size(size)),
+        "decode": bench_decode(datas[0], args.repeats)
+    }
+    if not args.skip_models:
+        report["pipeline"] = asyncio.run(bench_pipeline(datas))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
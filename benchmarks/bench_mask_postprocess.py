@@ -0,0 +1,124 @@
+# benchmarks/bench_mask_postprocess.py
+"""
+Peak memory and latency of SAM mask post-processing: full-frame path vs low-res path.
+
+Every (mode, image size) pair runs in a fresh subprocess so peak RSS is not
+polluted by earlier runs. Also reports the mean mask IoU between the two modes.
+
+    python -m benchmarks.bench_mask_postprocess --sizes 1024x1536 3000x4000 4000x6000
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+
+PAD = 1024
+LOW_RES = 256
+
+
+def synthetic_logits(n: int, original_size, seed: int = 0):
+    """
+    [n, 3, 256, 256] SAM-like logits: one elliptical blob per mask inside the valid (unpadded) region.
+    """
+    import torch
+
+    orig_h, orig_w = original_size
+    scale = PAD / max(orig_h, orig_w)
+    valid_h, valid_w = orig_h * scale * LOW_RES / PAD, orig_w * scale * LOW_RES / PAD
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:LOW_RES, 0:LOW_RES].astype(np.float32)
+    logits = np.full((n, 3, LOW_RES, LOW_RES), -8.0, dtype=np.float32)
+    for i in range(n):
+        cx, cy = rng.uniform(0.2, 0.8) * valid_w, rng.uniform(0.2, 0.8) * valid_h
+        rx, ry = rng.uniform(0.05, 0.3) * valid_w, rng.uniform(0.05, 0.3) * valid_h
+        for k in range(3):
+            d = ((xx - cx) / (rx * (1 + 0.1 * k))) ** 2 + ((yy - cy) / (ry * (1 - 0.1 * k))) ** 2
+            logits[i, k] = 8.0 * (1.0 - d)
+    reshaped = (int(round(orig_h * scale)), int(round(orig_w * scale)))
+    return torch.from_numpy(logits), reshaped
+
+
+def full_postprocess(low_res, original_size, reshaped_input_size, polygon_refinement):
+    """
+    The original path: SamImageProcessor.post_process_masks followed by refine_masks.
+    """
+    import torch.nn.functional as F
+    from app.utils.image_ops import refine_masks
+
+    masks = F.interpolate(low_res, (PAD, PAD), mode="bilinear", align_corners=False)
+    masks = masks[..., :reshaped_input_size[0], :reshaped_input_size[1]]
+    masks = F.interpolate(masks, original_size, mode="bilinear", align_corners=False) > 0
+    return refine_masks(masks, polygon_refinement)
+
+
+def lowres_postprocess(low_res, original_size, reshaped_input_size, polygon_refinement):
+    from app.utils.image_ops import refine_low_res_masks
+
+    return refine_low_res_masks(low_res, original_size, reshaped_input_size, (PAD, PAD), polygon_refinement)
+
+
+def run_one(mode: str, width: int, height: int, n: int, polygon_refinement: bool) -> dict:
+    import torch
+
+    torch.set_num_threads(1)
+    original_size = (height, width)
+    low_res, reshaped = synthetic_logits(n, original_size)
+    fn = full_postprocess if mode == "full" else lowres_postprocess
+    fn(low_res[:1], original_size, reshaped, polygon_refinement)  # warm up imports / kernels
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    masks = fn(low_res, original_size, reshaped, polygon_refinement)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "seconds": elapsed,
+        "peak_delta_mb": (peak - baseline) / 1024.0,
+        "masks": [(m.box, m.bits.tobytes().hex(), m.shape) for m in masks],
+    }
+
+
+def mean_iou(a, b) -> float:
+    from app.utils.compact_mask import CompactMask
+
+    ious = []
+    for (box_a, bits_a, shape), (box_b, bits_b, _) in zip(a, b):
+        ma = CompactMask(shape=shape, box=tuple(box_a), bits=np.frombuffer(bytes.fromhex(bits_a), dtype=np.uint8))
+        mb = CompactMask(shape=shape, box=tuple(box_b), bits=np.frombuffer(bytes.fromhex(bits_b), dtype=np.uint8))
+        ious.append(ma.iou(mb))
+    return float(np.mean(ious)) if ious else 1.0
+
+
+def main(args):
+    if args.worker:
+        mode, width, height = args.worker
+        print(json.dumps(run_one(mode, int(width), int(height), args.masks, args.polygon_refinement)))
+        return
+
+    print(f"{'size':>12}{'mode':>8}{'ms':>10}{'peak MB':>10}{'IoU vs full':>13}")
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        results = {}
+        for mode in ("full", "lowres"):
+            cmd = [sys.executable, "-m", "benchmarks.bench_mask_postprocess", "--worker", mode, str(width), str(height),
+                   "--masks", str(args.masks)] + (["--polygon-refinement"] if args.polygon_refinement else [])
+            results[mode] = json.loads(subprocess.check_output(cmd).decode().strip().splitlines()[-1])
+        iou = mean_iou(results["full"]["masks"], results["lowres"]["masks"])
+        for mode in ("full", "lowres"):
+            r = results[mode]
+            print(f"{size:>12}{mode:>8}{r['seconds'] * 1000:>10.1f}{r['peak_delta_mb']:>10.1f}{iou if mode == 'lowres' else 1.0:>13.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", nargs="+", default=["1024x1536", "3000x4000", "4000x6000"])
+    parser.add_argument("--masks", type=int, default=20)
+    parser.add_argument("--polygon-refinement", action="store_true")
+    parser.add_argument("--worker", nargs=3, help=argparse.SUPPRESS)
+    main(parser.parse_args())
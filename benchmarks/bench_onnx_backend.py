@@ -0,0 +1,333 @@
+# benchmarks/bench_onnx_backend.py
+"""
+Parity and latency of the ONNX Runtime backend against torch.
+
+Each backend runs on the same fixed image set in a fresh subprocess (the
+first ONNX run also exports the graphs into ONNX_CACHE_DIR; the export is not
+timed). Reported per backend: detection, SAM encoder and SAM decoder latency
+and the end-to-end total. Parity against torch: max/mean absolute difference of
+the SAM image embeddings, and boxes matched by label and IoU with mean box IoU,
+mask IoU and score drift. Exits non-zero when parity is outside the tolerances.
+
+--graphs instead feeds identical preprocessed inputs to the torch modules and
+to the graphs exported from them (one subprocess per model): detector logits and boxes
+(and the detections post-processed from them) on images of several aspect
+ratios, SAM image embeddings, and decoder masks for several box counts. It
+needs no meaningful scores, so it also checks the export of checkpoints with
+random weights (e.g. when the hub is out of reach).
+
+    python -m benchmarks.bench_onnx_backend
+    python -m benchmarks.bench_onnx_backend --precision int8 --images a.jpg b.jpg
+    python -m benchmarks.bench_onnx_backend --graphs --detector ./gdino --segmenter ./sam
+"""
+
+import argparse
+import gc
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+from benchmarks.common import ROOT, latency_summary, synthetic_image
+from benchmarks.bench_precision import LABELS, load_images, drift
+
+# Graph parity images: the detector graph was traced at 4:3 landscape, so other aspect ratios exercise its dynamic axes
+GRAPH_SIZES = [(1024, 768), (768, 1024), (1280, 720), (640, 640)]
+
+
+def run_backend(backend: str, precision: str, paths: List[str], count: int, out: str, detector: str, segmenter: str) -> None:
+    """
+    Child process: set the backend before the app modules read it, then run the image set stage by stage.
+    """
+    import asyncio
+    import importlib
+
+    for name in ("src.app.settings.setting", "app.settings.setting"):
+        settings = importlib.import_module(name)
+        settings.INFERENCE_BACKEND = backend
+        settings.DETECTOR_PRECISION = precision
+        settings.SEGMENTER_PRECISION = precision
+        if detector:
+            settings.DETECTOR_ID = detector
+        if segmenter:
+            settings.SEGMENTER_ID = segmenter
+
+    from src.app.core.detect import detect
+    from src.app.core.segment import get_image_embedding, segment
+    from src.app.core.model_registry import model_registry
+    from src.app.settings.setting import SEGMENTER_ID
+
+    model_registry.preload(warmup=True)
+
+    async def run_all():
+        results, embeddings = [], []
+        stages: Dict[str, List[float]] = {"detect": [], "encoder": [], "decoder": [], "total": []}
+        for index, image in enumerate(load_images(paths, count)):
+            image_key = f"{backend}:{index}"
+            start = time.perf_counter()
+            detections = await detect(image=image, labels=LABELS)
+            detected = time.perf_counter()
+            _, embedding = get_image_embedding(image, SEGMENTER_ID, image_key=image_key)
+            encoded = time.perf_counter()
+            if detections:
+                detections = await segment(image=image, detection_results=detections, image_key=image_key)
+            end = time.perf_counter()
+            stages["detect"].append(detected - start)
+            stages["encoder"].append(encoded - detected)
+            stages["decoder"].append(end - encoded)
+            stages["total"].append(end - start)
+            results.append(detections)
+            embeddings.append(embedding.embeddings.float().numpy())
+        return results, embeddings, stages
+
+    results, embeddings, stages = asyncio.run(run_all())
+    with open(out, "wb") as f:
+        pickle.dump({
+            "detections": results,
+            "embeddings": embeddings,
+            "stages": stages,
+            "models": model_registry.status()["models"]
+        }, f)
+
+
+def _max_diff(reference, candidate) -> Dict[str, float]:
+    diff = (reference - candidate).abs().max().item()
+    scale = reference.abs().max().item()
+    return {"max_abs_diff": diff, "max_rel_diff": diff / scale if scale else 0.0}
+
+
+def _worst(rows: List[Dict[str, float]]) -> Dict[str, float]:
+    return {key: max(row[key] for row in rows) for key in rows[0]}
+
+
+def _graph_images(paths: List[str]) -> List[Any]:
+    from PIL import Image
+
+    return [Image.open(path).convert("RGB") for path in paths] or [
+        synthetic_image(width, height, seed=seed) for seed, (width, height) in enumerate(GRAPH_SIZES)
+    ]
+
+
+def detector_parity(paths: List[str], detector_id: str, threshold: float) -> Dict[str, Any]:
+    """
+    Detector logits, boxes and post-processed detections: torch module against its ONNX graph.
+    """
+    import torch
+    from transformers.pipelines import pipeline
+    from app.utils.results import DetectionResult
+    from benchmarks.bench_inference_resolution import match
+    from src.app.core.onnx_backend import _DETECTOR_INPUTS, onnx_detector
+
+    # Loaded like the ONNX backend loads it: the torch backend's text-feature cache must not be traced
+    object_detector = pipeline(model=detector_id, task="zero-shot-object-detection", device="cpu")
+    object_detector.model.eval()
+    detector_graph = onnx_detector(object_detector, detector_id)
+    chunks = [list(object_detector.preprocess({"image": image, "candidate_labels": LABELS})) for image in _graph_images(paths)]
+    outputs = {"torch": [], "onnx": []}
+    with torch.no_grad():
+        for backend in ("torch", "onnx"):
+            if backend == "onnx":
+                # Swapped in for the torch model like model_registry does for the ONNX backend;
+                # both copies of the detector do not fit together in a small box
+                object_detector.model = detector_graph
+                gc.collect()
+            for image_chunks in chunks:
+                rows = []
+                for chunk in image_chunks:
+                    result = object_detector.model(**{name: chunk[name] for name in _DETECTOR_INPUTS if name in chunk})
+                    meta = {key: chunk[key] for key in ("target_size", "candidate_label", "is_last")}
+                    rows.append({**meta, "logits": result.logits, "pred_boxes": result.pred_boxes})
+                outputs[backend].append(rows)
+
+    logits, boxes, matches = [], [], []
+    for reference, candidate in zip(outputs["torch"], outputs["onnx"]):
+        for expected, actual in zip(reference, candidate):
+            logits.append(_max_diff(expected["logits"], actual["logits"]))
+            boxes.append(_max_diff(expected["pred_boxes"], actual["pred_boxes"]))
+        detections = [
+            [DetectionResult.from_dict(r) for r in object_detector.postprocess(rows, threshold=threshold)]
+            for rows in (reference, candidate)
+        ]
+        matches.append(match(*detections))
+    return {
+        "logits": _worst(logits),
+        "pred_boxes": _worst(boxes),
+        "threshold": threshold,
+        "matched": sum(m["matched"] for m in matches),
+        "missed": sum(m["missed"] for m in matches),
+        "extra": sum(m["extra"] for m in matches),
+        "box_iou_mean": float(np.mean([m["box_iou"] for m in matches if m["box_iou"] is not None] or [1.0]))
+    }
+
+
+def sam_parity(paths: List[str], segmenter_id: str, box_counts: List[int]) -> Dict[str, Any]:
+    """
+    SAM image embeddings and decoder masks: torch modules against their ONNX graphs.
+    """
+    import torch
+    from transformers import AutoModelForMaskGeneration, AutoProcessor
+    from src.app.core.onnx_backend import onnx_sam
+
+    segmentator = AutoModelForMaskGeneration.from_pretrained(segmenter_id).eval()
+    processor = AutoProcessor.from_pretrained(segmenter_id)
+    sam_graph = onnx_sam(segmentator, segmenter_id)
+    rng = np.random.default_rng(0)
+    pixel_values = [processor(images=image, return_tensors="pt")["pixel_values"] for image in _graph_images(paths)]
+    prompts = []
+    for _ in pixel_values:
+        for count in box_counts:
+            xy = rng.uniform(0, 768, size=(1, count, 2))
+            prompts.append(torch.tensor(np.concatenate([xy, xy + rng.uniform(32, 256, size=(1, count, 2))], axis=-1), dtype=torch.float32))
+
+    outputs = {}
+    with torch.no_grad():
+        for backend in ("torch", "onnx"):
+            if backend == "onnx":
+                # Both copies of SAM's encoder do not fit together in a small box
+                segmentator = sam_graph
+                gc.collect()
+            embeddings, masks = [], []
+            for index, pixels in enumerate(pixel_values):
+                embeddings.append(segmentator.get_image_embeddings(pixels))
+                # Both decoders get the torch embedding, so the decoder is compared on its own
+                reference = outputs["torch"][0][index] if backend == "onnx" else embeddings[-1]
+                for input_boxes in prompts[index * len(box_counts):(index + 1) * len(box_counts)]:
+                    masks.append(segmentator(image_embeddings=reference, input_boxes=input_boxes, multimask_output=True).pred_masks)
+            outputs[backend] = (embeddings, masks)
+
+    (embeddings, masks), (graph_embeddings, graph_masks) = outputs["torch"], outputs["onnx"]
+    ious = []
+    for expected, actual in zip(masks, graph_masks):
+        a, b = expected > 0, actual > 0
+        union = (a | b).sum().item()
+        ious.append((a & b).sum().item() / union if union else 1.0)
+    return {
+        "encoder": _worst([_max_diff(r, c) for r, c in zip(embeddings, graph_embeddings)]),
+        "decoder": {
+            "box_counts": box_counts,
+            "mask_logit_max_abs_diff": max((r - c).abs().max().item() for r, c in zip(masks, graph_masks)),
+            "mask_iou_min": min(ious)
+        }
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "int8"], help="Precision for both backends")
+    parser.add_argument("--images", nargs="*", default=[], help="Image files (default: synthetic images)")
+    parser.add_argument("--count", type=int, default=8, help="Number of synthetic images")
+    parser.add_argument("--max-embedding-diff", type=float, default=1e-3, help="Tolerance on max |embedding diff| (fp32)")
+    parser.add_argument("--min-mask-iou", type=float, default=0.98, help="Tolerance on mean mask IoU")
+    parser.add_argument("--detector", default="", help="Detector id or local checkpoint directory (default: DETECTOR_ID)")
+    parser.add_argument("--segmenter", default="", help="SAM id or local checkpoint directory (default: SEGMENTER_ID)")
+    parser.add_argument("--graphs", action="store_true", help="Graph-level parity on identical inputs (no latency)")
+    parser.add_argument("--box-counts", type=int, nargs="+", default=[1, 3, 8], help="SAM decoder box counts (--graphs)")
+    parser.add_argument("--threshold", type=float, default=0.3, help="Detection threshold for box matching (--graphs)")
+    parser.add_argument("--max-rel-diff", type=float, default=1e-3, help="Tolerance on max relative output diff (--graphs)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--graph-child", choices=["detector", "sam"], help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_backend(args.child, args.precision, args.images, args.count, args.out, args.detector, args.segmenter)
+        return
+    if args.graph_child:
+        from src.app.settings.setting import DETECTOR_ID, SEGMENTER_ID
+
+        if args.graph_child == "detector":
+            report = detector_parity(args.images, args.detector or DETECTOR_ID, args.threshold)
+        else:
+            report = sam_parity(args.images, args.segmenter or SEGMENTER_ID, args.box_counts)
+        with open(args.out, "w") as f:
+            json.dump(report, f)
+        return
+
+    if args.graphs:
+        report = {"images": [list(image.size) for image in _graph_images(args.images)]}
+        with tempfile.TemporaryDirectory() as directory:
+            # A fresh process per model: the detector's freed memory is not handed back before SAM loads
+            for part in ("detector", "sam"):
+                out = os.path.join(directory, f"{part}.json")
+                command = [sys.executable, "-m", "benchmarks.bench_onnx_backend", "--graph-child", part, "--out", out,
+                           "--detector", args.detector, "--segmenter", args.segmenter, "--threshold", str(args.threshold),
+                           "--box-counts", *map(str, args.box_counts), "--images", *args.images]
+                result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+                if result.returncode != 0:
+                    sys.exit(f"Graph parity of the {part} failed:\n{result.stderr}")
+                with open(out) as f:
+                    report[part] = json.load(f)
+        print(json.dumps(report, indent=2))
+        detector, sam = report["detector"], report["sam"]
+        failures = [
+            f"{name} max relative diff {diff['max_rel_diff']:.2e} > {args.max_rel_diff:.0e}"
+            for name, diff in (("detector logits", detector["logits"]), ("detector pred_boxes", detector["pred_boxes"]),
+                               ("SAM embedding", sam["encoder"]))
+            if diff["max_rel_diff"] > args.max_rel_diff
+        ]
+        if detector["missed"] or detector["extra"]:
+            failures.append(f"{detector['missed']} missed / {detector['extra']} extra detections")
+        if sam["decoder"]["mask_iou_min"] < args.min_mask_iou:
+            failures.append(f"min mask IoU {sam['decoder']['mask_iou_min']:.4f} < {args.min_mask_iou}")
+        if failures:
+            sys.exit("Parity check failed: " + "; ".join(failures))
+        return
+
+    runs = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in ("torch", "onnx"):
+            out = os.path.join(directory, f"{backend}.pkl")
+            command = [sys.executable, "-m", "benchmarks.bench_onnx_backend", "--child", backend, "--out", out,
+                       "--precision", args.precision, "--count", str(args.count),
+                       "--detector", args.detector, "--segmenter", args.segmenter, "--images", *args.images]
+            result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+            if result.returncode != 0:
+                sys.exit(f"Backend {backend} failed:\n{result.stderr}")
+            with open(out, "rb") as f:
+                runs[backend] = pickle.load(f)
+
+    reference, candidate = runs["torch"], runs["onnx"]
+    if any(m.get("backend") != "onnx" for m in candidate["models"]):
+        sys.exit("ONNX backend was not used (are onnx and onnxruntime installed?)")
+    diffs = [np.abs(r - c) for r, c in zip(reference["embeddings"], candidate["embeddings"])]
+    parity = {
+        "embedding_max_abs_diff": float(max(d.max() for d in diffs)),
+        "embedding_mean_abs_diff": float(np.mean([d.mean() for d in diffs])),
+        **drift(reference["detections"], candidate["detections"])
+    }
+    latency = {
+        backend: {stage: latency_summary(values) for stage, values in run["stages"].items()}
+        for backend, run in runs.items()
+    }
+    report = {
+        "precision": args.precision,
+        "latency": latency,
+        "speedup_p50": {
+            stage: round(summary["p50_ms"] / latency["onnx"][stage]["p50_ms"], 2) if latency["onnx"][stage]["p50_ms"] else None
+            for stage, summary in latency["torch"].items()
+        },
+        "models": {backend: run["models"] for backend, run in runs.items()},
+        "parity": parity
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if args.precision == "fp32" and parity["embedding_max_abs_diff"] > args.max_embedding_diff:
+        failures.append(f"embedding max abs diff {parity['embedding_max_abs_diff']:.2e} > {args.max_embedding_diff:.0e}")
+    if parity["missed"] or parity["extra"]:
+        failures.append(f"{parity['missed']} missed / {parity['extra']} extra detections")
+    if parity["mask_iou_mean"] is not None and parity["mask_iou_mean"] < args.min_mask_iou:
+        failures.append(f"mean mask IoU {parity['mask_iou_mean']} < {args.min_mask_iou}")
+    if failures:
+        sys.exit("Parity check failed: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
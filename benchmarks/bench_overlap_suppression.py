@@ -0,0 +1,105 @@
+# benchmarks/bench_overlap_suppression.py
+"""
+Vectorised overlap suppression vs the original nested-loop remove_multilabel_same_area.
+
+Checks that both return the same detections for every generated case
+(exits non-zero otherwise), then times them.
+
+    python -m benchmarks.bench_overlap_suppression
+"""
+
+import argparse
+import sys
+import timeit
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+
+from app.services.detection_filter import compute_iou, remove_multilabel_same_area, remove_overlaps_batch
+from app.utils.results import BoundingBox, DetectionResult
+
+LABELS = ["shirt.", "pant.", "shoe.", "sandal.", "headscarf.", "watch.", "glasses.", "skirt.", "vest.", "hat."]
+
+
+def reference_remove_multilabel_same_area(detections, iou_threshold=0.4):
+    """
+    The original O(n^2) Python implementation, kept here as the parity oracle.
+    """
+    detections = sorted(detections, key=lambda d: d.score, reverse=True)
+    kept = []
+    used = set()
+    for i, det in enumerate(detections):
+        if i in used:
+            continue
+        group = [i]
+        for j in range(i + 1, len(detections)):
+            if j in used:
+                continue
+            if compute_iou(det.box.xyxy, detections[j].box.xyxy) > iou_threshold:
+                group.append(j)
+        kept.append(det)
+        for idx in group:
+            used.add(idx)
+    return kept
+
+
+def crowded_detections(n: int, seed: int, width: int = 4000, height: int = 6000):
+    """
+    Boxes clustered around a few centres so many of them overlap, with repeated scores for tie handling.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform([0, 0], [width, height], size=(max(1, n // 8), 2))
+    detections = []
+    for _ in range(n):
+        cx, cy = centres[rng.integers(len(centres))] + rng.normal(0, 60, size=2)
+        w, h = rng.uniform(40, 600, size=2)
+        box = BoundingBox(
+            xmin=int(cx - w / 2), ymin=int(cy - h / 2),
+            xmax=int(cx + w / 2), ymax=int(cy + h / 2)
+        )
+        score = round(float(rng.uniform(0.3, 1.0)), 2)
+        detections.append(DetectionResult(score=score, label=LABELS[rng.integers(len(LABELS))], box=box))
+    return detections
+
+
+def check_parity(cases: int) -> int:
+    failures = 0
+    for seed in range(cases):
+        detections = crowded_detections(n=int(np.random.default_rng(seed).integers(0, 300)), seed=seed)
+        for threshold in (0.0, 0.3, 0.5, 0.9):
+            expected = reference_remove_multilabel_same_area(detections, threshold)
+            actual = remove_multilabel_same_area(detections, threshold)
+            if [id(d) for d in expected] != [id(d) for d in actual]:
+                failures += 1
+                print(f"parity mismatch: seed={seed} threshold={threshold}")
+    return failures
+
+
+def main(args):
+    failures = check_parity(args.parity_cases)
+    print(f"parity: {args.parity_cases * 4 - failures}/{args.parity_cases * 4} cases identical")
+
+    print(f"{'boxes':>8}{'loop ms':>12}{'numpy ms':>12}{'speedup':>10}")
+    for n in args.sizes:
+        detections = crowded_detections(n, seed=n)
+        loop = min(timeit.repeat(lambda: reference_remove_multilabel_same_area(detections, 0.5), number=1, repeat=args.repeat))
+        vec = min(timeit.repeat(lambda: remove_multilabel_same_area(detections, 0.5), number=1, repeat=args.repeat))
+        print(f"{n:>8}{loop * 1000:>12.2f}{vec * 1000:>12.2f}{loop / vec:>10.1f}x")
+
+    batch = [crowded_detections(args.batch_boxes, seed=i) for i in range(args.batch_images)]
+    per_image = min(timeit.repeat(lambda: [remove_multilabel_same_area(d, 0.5) for d in batch], number=1, repeat=args.repeat))
+    batched = min(timeit.repeat(lambda: remove_overlaps_batch(batch, 0.5), number=1, repeat=args.repeat))
+    print(f"batch of {args.batch_images} x {args.batch_boxes}: per-image {per_image * 1000:.2f} ms, batched {batched * 1000:.2f} ms")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--parity-cases", type=int, default=50)
+    parser.add_argument("--batch-images", type=int, default=32)
+    parser.add_argument("--batch-boxes", type=int, default=200)
+    sys.exit(main(parser.parse_args()))
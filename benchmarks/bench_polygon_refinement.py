@@ -0,0 +1,88 @@
+# benchmarks/bench_polygon_refinement.py
+"""
+Polygon refinement: the original serial full-frame loop vs the pooled, box-cropped stage.
+
+Also checks that both produce the same refined masks (tolerance 0) and
+reports how many polygon points simplification removes.
+
+    python -m benchmarks.bench_polygon_refinement --size 3000x4000 --masks 8 16 32
+"""
+
+import argparse
+import json
+
+import cv2
+import numpy as np
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+from benchmarks.common import Timer
+
+from app.utils.compact_mask import CompactMask
+from app.utils.image_ops import mask_to_polygon, polygon_to_mask, refine_polygons
+
+
+def synthetic_masks(n: int, height: int, width: int, seed: int = 0):
+    """
+    Dense boolean masks: one noisy ellipse per mask, the shape SAM produces for clothing items.
+    """
+    rng = np.random.default_rng(seed)
+    masks = []
+    for _ in range(n):
+        mask = np.zeros((height, width), dtype=np.uint8)
+        center = (int(rng.uniform(0.2, 0.8) * width), int(rng.uniform(0.2, 0.8) * height))
+        axes = (int(rng.uniform(0.05, 0.2) * width), int(rng.uniform(0.05, 0.2) * height))
+        cv2.ellipse(mask, center, axes, float(rng.uniform(0, 180)), 0, 360, 1, -1)
+        x0, y0 = max(0, center[0] - axes[0]), max(0, center[1] - axes[1])
+        noise = rng.random((2 * axes[1], 2 * axes[0])) < 0.02
+        region = mask[y0:y0 + noise.shape[0], x0:x0 + noise.shape[1]]
+        region ^= noise[:region.shape[0], :region.shape[1]].astype(np.uint8)
+        masks.append(mask.astype(bool))
+    return masks
+
+
+def serial_reference(masks):
+    """
+    The original refine_masks loop: full-frame contour + fill, one mask at a time.
+    """
+    refined = []
+    for mask in masks:
+        polygon = mask_to_polygon(mask)
+        refined.append(polygon_to_mask(polygon, mask.shape) > 0)
+    return refined
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="3000x4000", help="WIDTHxHEIGHT")
+    parser.add_argument("--masks", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--tolerance", type=float, default=1.0)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    for n in args.masks:
+        dense = synthetic_masks(n, height, width)
+        compact = [CompactMask.from_dense(mask) for mask in dense]
+        refine_polygons(compact[:2])  # start the pool
+
+        with Timer() as serial:
+            expected = serial_reference(dense)
+        with Timer() as pooled:
+            refined, _ = refine_polygons(compact)
+        _, exact = refine_polygons(compact, 0.0)
+        _, simplified = refine_polygons(compact, args.tolerance)
+
+        identical = sum(np.array_equal(mask.to_dense(bool), ref) for mask, ref in zip(refined, expected))
+        print(json.dumps({
+            "size": args.size,
+            "masks": n,
+            "serial_full_frame_ms": round(serial.seconds * 1000, 2),
+            "pooled_crop_ms": round(pooled.seconds * 1000, 2),
+            "speedup": round(serial.seconds / pooled.seconds, 2),
+            "identical_masks": f"{identical}/{n}",
+            "polygon_points": sum(len(p) for p in exact),
+            "simplified_points": sum(len(p) for p in simplified)
+        }))
+
+
+if __name__ == "__main__":
+    main()
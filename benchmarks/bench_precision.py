@@ -0,0 +1,145 @@
+# benchmarks/bench_precision.py
+"""
+Accuracy/latency of the inference precision profiles against fp32.
+
+Each profile runs detect + segment on the same fixed image set in a fresh
+subprocess (so model memory and warm-up do not leak between profiles). Boxes
+are matched to the fp32 run by label and IoU, and the report gives mean box
+IoU, mask IoU and score drift, missed/extra detections, latency and model size.
+
+A profile is one precision for both models ("int8") or detector:segmenter ("int8:fp32").
+
+    python -m benchmarks.bench_precision --profiles fp32 bf16 int8 int8:fp32
+    python -m benchmarks.bench_precision --images a.jpg b.jpg c.jpg
+"""
+
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+from benchmarks.common import ROOT, latency_summary, synthetic_image
+from benchmarks.bench_inference_resolution import match
+
+LABELS = ["person.", "shirt.", "pant.", "shoe.", "hat."]
+
+
+def load_images(paths: List[str], count: int):
+    from PIL import Image
+
+    if paths:
+        return [Image.open(path).convert("RGB") for path in paths]
+    return [synthetic_image(1024, 768, seed=seed) for seed in range(count)]
+
+
+def run_profile(profile: str, paths: List[str], count: int, out: str) -> None:
+    """
+    Child process: set the precisions before the app modules read them, then run the image set.
+    """
+    import time
+    import asyncio
+    import importlib
+
+    detector_precision, _, segmenter_precision = profile.partition(":")
+    segmenter_precision = segmenter_precision or detector_precision
+    # The settings module is imported under both names; patch both before anything reads them
+    for name in ("src.app.settings.setting", "app.settings.setting"):
+        settings = importlib.import_module(name)
+        settings.DETECTOR_PRECISION = detector_precision
+        settings.SEGMENTER_PRECISION = segmenter_precision
+
+    from src.app.core.detect import detect
+    from src.app.core.segment import segment
+    from src.app.core.model_registry import model_registry
+
+    model_registry.preload(warmup=True)
+
+    async def run_all():
+        results, latencies = [], []
+        for index, image in enumerate(load_images(paths, count)):
+            start = time.perf_counter()
+            detections = await detect(image=image, labels=LABELS)
+            if detections:
+                detections = await segment(image=image, detection_results=detections, image_key=f"{profile}:{index}")
+            latencies.append(time.perf_counter() - start)
+            results.append(detections)
+        return results, latencies
+
+    results, latencies = asyncio.run(run_all())
+    with open(out, "wb") as f:
+        pickle.dump({
+            "detections": results,
+            "latencies": latencies,
+            "models": model_registry.status()["models"]
+        }, f)
+
+
+def drift(reference: List[list], candidate: List[list]) -> Dict[str, object]:
+    matches = [match(r, c) for r, c in zip(reference, candidate)]
+
+    def mean(key):
+        values = [m[key] for m in matches if m[key] is not None]
+        return round(float(np.mean(values)), 4) if values else None
+
+    return {
+        "matched": sum(m["matched"] for m in matches),
+        "missed": sum(m["missed"] for m in matches),
+        "extra": sum(m["extra"] for m in matches),
+        "box_iou_mean": mean("box_iou"),
+        "mask_iou_mean": mean("mask_iou"),
+        "score_delta_mean": mean("score_delta")
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--images", nargs="*", default=[], help="Image files (default: synthetic images)")
+    parser.add_argument("--count", type=int, default=8, help="Number of synthetic images")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_profile(args.child, args.images, args.count, args.out)
+        return
+
+    profiles = ["fp32"] + [p for p in args.profiles if p != "fp32"]
+    runs = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in profiles:
+            out = os.path.join(directory, f"{profile.replace(':', '_')}.pkl")
+            command = [sys.executable, "-m", "benchmarks.bench_precision", "--child", profile, "--out", out,
+                       "--count", str(args.count), "--images", *args.images]
+            result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"Profile {profile} failed:\n{result.stderr}", file=sys.stderr)
+                continue
+            with open(out, "rb") as f:
+                runs[profile] = pickle.load(f)
+
+    if "fp32" not in runs:
+        sys.exit("fp32 reference run failed")
+    reference = runs["fp32"]
+    base_p50 = latency_summary(reference["latencies"])["p50_ms"]
+    report = {}
+    for profile, run in runs.items():
+        latency = latency_summary(run["latencies"])
+        report[profile] = {
+            "latency": latency,
+            "speedup_p50": round(base_p50 / latency["p50_ms"], 2) if latency["p50_ms"] else None,
+            "models": {m["kind"]: {"precision": m["precision"], "resident_mb": m.get("resident_mb")} for m in run["models"]},
+            "drift_vs_fp32": drift(reference["detections"], run["detections"])
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/bench_render.py
+"""
+Artifact rendering: the old matplotlib savefig path vs the cv2 renderer, per output format.
+
+Also renders the same detections from several threads at once and checks
+every output is byte-identical (deterministic colors, no shared state).
+
+    python -m benchmarks.bench_render --size 3000x4000 --detections 12
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+from benchmarks.common import Timer, synthetic_image
+
+from app.utils.compact_mask import CompactMask
+from app.utils.plotting import encode_image, plot_detections, render
+from app.utils.results import BoundingBox, DetectionResult
+
+LABELS = ["person.", "shirt.", "pant.", "shoe.", "hat."]
+
+
+def synthetic_detections(n: int, width: int, height: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    detections = []
+    for i in range(n):
+        x0, y0 = int(rng.uniform(0, 0.7) * width), int(rng.uniform(0, 0.7) * height)
+        x1, y1 = x0 + int(rng.uniform(0.1, 0.3) * width), y0 + int(rng.uniform(0.1, 0.3) * height)
+        crop = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+        crop[(y1 - y0) // 4:3 * (y1 - y0) // 4, (x1 - x0) // 4:3 * (x1 - x0) // 4] = True
+        detections.append(DetectionResult(
+            score=float(rng.uniform(0.3, 0.9)),
+            label=LABELS[i % len(LABELS)],
+            box=BoundingBox(x0, y0, x1, y1),
+            mask=CompactMask.from_crop(crop, (x0, y0), (height, width))
+        ))
+    return detections
+
+
+def matplotlib_reference(image, detections, path):
+    """
+    The previous plot_detections: cv2 drawing pushed through plt.imshow/savefig.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import cv2
+
+    annotated = cv2.cvtColor(render(image, detections), cv2.COLOR_BGR2RGB)
+    plt.imshow(annotated)
+    plt.axis("off")
+    plt.savefig(path, bbox_inches="tight")
+    plt.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="3000x4000", help="WIDTHxHEIGHT")
+    parser.add_argument("--detections", type=int, default=12)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    image = synthetic_image(width, height)
+    detections = synthetic_detections(args.detections, width, height)
+    report = {"size": args.size, "detections": args.detections}
+
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            with Timer() as timer:
+                matplotlib_reference(image, detections, os.path.join(directory, "reference.png"))
+            report["matplotlib_png_ms"] = round(timer.seconds * 1000, 2)
+        except ImportError:
+            report["matplotlib_png_ms"] = None
+
+        for fmt in ("png", "webp", "jpg"):
+            path = os.path.join(directory, f"out.{fmt}")
+            plot_detections(image, detections, path)  # warm up the buffer
+            with Timer() as timer:
+                plot_detections(image, detections, path)
+            report[f"{fmt}_ms"] = round(timer.seconds * 1000, 2)
+            report[f"{fmt}_kb"] = round(os.path.getsize(path) / 1024, 1)
+
+    def render_png(_):
+        return encode_image(render(image, detections), "png")
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        outputs = list(pool.map(render_png, range(args.threads * 2)))
+    report["concurrent_outputs_identical"] = len(set(outputs)) == 1
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_s3_reader.py
+"""
+S3 reads against a local S3-compatible stand-in: single GET vs parallel ranged GETs, plus prefetch.
+
+Uses --endpoint if given (e.g. a local MinIO), otherwise starts moto's
+in-process server (pip install "moto[server]"). Checks every read returns
+the exact object bytes.
+
+    python -m benchmarks.bench_s3_reader --objects 8 --size-mb 2 24
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from io import BytesIO
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+from benchmarks.common import Timer, synthetic_image
+
+from src.app.utils.fetch_cache import FetchCache
+from src.app.utils.s3_reader import S3Reader
+
+BUCKET = "bench-images"
+
+
+def jpeg_of_size(size_bytes: int, seed: int) -> bytes:
+    """
+    A valid JPEG padded with trailing bytes to roughly size_bytes.
+    """
+    buffer = BytesIO()
+    synthetic_image(512, 512, seed).save(buffer, "JPEG")
+    data = buffer.getvalue()
+    return data + os.urandom(max(0, size_bytes - len(data)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", default=None)
+    parser.add_argument("--objects", type=int, default=8)
+    parser.add_argument("--size-mb", type=float, nargs="+", default=[2, 24])
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        import logging
+        from moto.server import ThreadedMotoServer
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(port=0, verbose=False)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint = f"http://{host}:{port}"
+
+    options = dict(endpoint_url=endpoint, access_key="bench", secret_key="bench", addressing_style="path")
+    client = S3Reader(**options).client
+    client.create_bucket(Bucket=BUCKET)
+
+    report = []
+    for size_mb in args.size_mb:
+        objects = {}
+        for i in range(args.objects):
+            key = f"{size_mb}mb/{i}.jpg"
+            objects[f"s3://{BUCKET}/{key}"] = data = jpeg_of_size(int(size_mb * 2**20), i)
+            client.put_object(Bucket=BUCKET, Key=key, Body=data)
+
+        single = S3Reader(**options, chunk_bytes=2**40)
+        ranged = S3Reader(**options, chunk_bytes=args.chunk_mb * 2**20)
+        row = {"size_mb": size_mb, "objects": args.objects}
+        for name, reader in (("single_get", single), ("ranged_get", ranged)):
+            with Timer() as timer:
+                for url, data in objects.items():
+                    assert reader.read(url) == data
+            row[f"{name}_ms"] = round(timer.seconds * 1000, 2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cached = S3Reader(**options, cache=FetchCache(2**34, directory))
+            with Timer() as timer:
+                errors = cached.prefetch(objects)
+            assert not any(errors.values()), errors
+            row["prefetch_ms"] = round(timer.seconds * 1000, 2)
+            with Timer() as timer:
+                for url, data in objects.items():
+                    assert cached.read(url) == data
+            row["revalidated_ms"] = round(timer.seconds * 1000, 2)
+            row["cache"] = cached.cache.stats()
+        report.append(row)
+
+    print(json.dumps(report, indent=2))
+    if server is not None:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
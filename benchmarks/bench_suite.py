@@ -0,0 +1,296 @@
+# benchmarks/bench_suite.py
+"""
+Offline benchmark suite: stub models, a generated image corpus, stored results.
+
+No network and no model weights: the detector and SAM are replaced by the
+deterministic stand-ins in benchmarks/stubs.py (optionally with simulated
+model time), and the corpus is generated for every resolution x crowd
+density. Reported:
+
+  stages  per-stage latency of the code around the models, per corpus image:
+          decode, image_digest, resize_for_inference, remove_multilabel_same_area,
+          plan_outfits, refine_polygons, group_outfits, plot_detections and
+          refine_masks (only when torch is installed)
+  e2e     /detect through the ASGI app at each concurrency level:
+          p50/p95/p99, throughput, rejected (429/503) and failed requests
+  memory  peak RSS after the stages and after the end-to-end runs
+
+The app runs in a temporary working directory (results/, .cache/) with the
+result cache off, so every request does the full work. The report is printed
+and stored under benchmarks/results/ for benchmarks/compare.py.
+
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --resolutions 1920x1080 --densities 1 8 --concurrency 1 8 32
+    python -m benchmarks.bench_suite --detector-ms 150 --sam-encoder-ms 400 --sam-decoder-ms 5 --name with-model-time
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+from benchmarks.common import ROOT, Timer, latency_summary
+from benchmarks.stubs import Scene, StubModels, corpus, encode, render_scene
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Applied to both names the settings module is imported under, before the app reads them
+SETTINGS = {
+    "RESULT_CACHE_ENABLED": False,
+    "PRELOAD_MODELS": False,
+    "WARMUP_MODELS": False,
+    "INFERENCE_PROCESSES": 0,
+    "DEBUG_MODE": False,
+}
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def git_revision() -> str:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True)
+        return result.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except OSError:
+        return "unknown"
+
+
+def bench_stages(scenes: List[Scene], payloads: Dict[int, bytes], repeat: int, polygon_refinement: bool, models: StubModels) -> Dict[str, Dict[str, Any]]:
+    from app.services.detection_filter import remove_multilabel_same_area
+    from src.app.utils.fetch import decode_image
+    from app.utils.image_ops import image_digest
+    from app.utils.plotting import plot_detections
+    from app.utils.resolution import original_size, resize_for_inference, rescale_boxes
+    from src.app.core.segment import refine_stage
+    from src.app.services.outfit_results import prepare_labels, plan_outfits, group_outfits, is_person
+    from src.app.settings.setting import DEFAULT_THRESHOLD, ARTIFACT_FORMAT
+
+    labels = prepare_labels(None)
+    stages: Dict[str, Dict[str, List[float]]] = {}
+
+    def record(stage: str, scene: Scene, seconds: float) -> None:
+        stages.setdefault(stage, {}).setdefault(scene.name, []).append(seconds)
+
+    with tempfile.TemporaryDirectory() as directory:
+        artifact = os.path.join(directory, f"render.{ARTIFACT_FORMAT}")
+        for scene in scenes:
+            for _ in range(repeat):
+                with Timer() as t:
+                    image = decode_image(payloads[scene.index])
+                record("decode", scene, t.seconds)
+                with Timer() as t:
+                    image_digest(image)
+                record("image_digest", scene, t.seconds)
+                with Timer() as t:
+                    inference_image = resize_for_inference(image)
+                record("resize_for_inference", scene, t.seconds)
+
+                size = original_size(image)
+                detections = models.detect_batch_sync([inference_image], labels, DEFAULT_THRESHOLD, "stub")[0]
+                rescale_boxes(detections, inference_image.size, size)
+
+                items = [d for d in detections if not is_person(d)]
+                with Timer() as t:
+                    remove_multilabel_same_area(items, iou_threshold=0.5)
+                record("remove_multilabel_same_area", scene, t.seconds)
+                with Timer() as t:
+                    targets = plan_outfits(detections, DEFAULT_THRESHOLD).to_segment()
+                record("plan_outfits", scene, t.seconds)
+
+                # Stub masks without refinement, so refinement is timed on its own
+                masks, _ = models.segment_boxes(inference_image, [d.box.xyxy for d in targets], "stub", False, None, size)
+                with Timer() as t:
+                    masks, polygons = refine_stage(masks, polygon_refinement)
+                record("refine_polygons", scene, t.seconds)
+                for detection, mask, polygon in zip(targets, masks, polygons):
+                    detection.mask, detection.polygon = mask, polygon
+
+                with Timer() as t:
+                    filtered, _, _ = group_outfits(detections, size, DEFAULT_THRESHOLD)
+                record("group_outfits", scene, t.seconds)
+                with Timer() as t:
+                    plot_detections(image.resize(size) if image.size != size else image, filtered, artifact)
+                record("plot_detections", scene, t.seconds)
+
+    refine_masks_stage(scenes, repeat, polygon_refinement, stages)
+    return {
+        stage: {name: latency_summary(values) for name, values in per_scene.items()}
+        for stage, per_scene in stages.items()
+    }
+
+
+def refine_masks_stage(scenes: List[Scene], repeat: int, polygon_refinement: bool, stages: Dict[str, Dict[str, List[float]]]) -> None:
+    """
+    refine_masks (full-frame SAM mask post-processing) on stub masks; needs torch.
+    """
+    try:
+        import torch
+    except ImportError:
+        stages["refine_masks"] = {}
+        return
+    from app.utils.image_ops import refine_masks
+
+    for scene in scenes:
+        # [n, 3, H, W] full-frame logits with each mask filling its box (the 3 candidates share memory)
+        n = min(len(scene.boxes), 8)
+        logits = torch.full((n, 1, scene.height, scene.width), -1.0)
+        for i, (_, _, box) in enumerate(scene.boxes[:n]):
+            x0, y0, x1, y1 = int(box[0] * scene.width), int(box[1] * scene.height), int(box[2] * scene.width), int(box[3] * scene.height)
+            logits[i, :, y0:y1, x0:x1] = 1.0
+        logits = logits.expand(-1, 3, -1, -1)
+        for _ in range(repeat):
+            with Timer() as t:
+                refine_masks(logits, polygon_refinement)
+            stages.setdefault("refine_masks", {}).setdefault(scene.name, []).append(t.seconds)
+
+
+async def bench_e2e(
+    scenes: List[Scene],
+    payloads: Dict[int, bytes],
+    concurrency: List[int],
+    requests: int,
+    polygon_refinement: bool,
+    render: bool
+) -> Dict[str, Dict[str, Any]]:
+    import httpx
+    import src.app.main as main
+    from src.app.services import outfit_results
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for workers in concurrency:
+            latencies: List[float] = []
+            rejected = failed = 0
+            jobs = iter(range(requests))
+
+            async def worker():
+                nonlocal rejected, failed
+                for job in jobs:
+                    scene = scenes[job % len(scenes)]
+                    start = time.perf_counter()
+                    response = await client.post(
+                        "/detect",
+                        files={"file": (f"{scene.name}.jpg", payloads[scene.index], "image/jpeg")},
+                        data={"polygon_refinement": str(polygon_refinement).lower(), "render": str(render).lower()}
+                    )
+                    elapsed = time.perf_counter() - start
+                    if response.status_code in (429, 503):
+                        rejected += 1
+                    elif response.status_code != 200 or response.json().get("status") != "completed":
+                        failed += 1
+                    else:
+                        latencies.append(elapsed)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(workers)))
+            wall = time.perf_counter() - start
+            # Background artifact writes belong to this run's cost
+            await asyncio.gather(*list(outfit_results._background_writes))
+            results[f"c{workers}"] = {
+                "concurrency": workers,
+                "requests": requests,
+                "completed": len(latencies),
+                "rejected": rejected,
+                "failed": failed,
+                "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+                "latency": latency_summary(latencies) if latencies else None
+            }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", nargs="+", default=["640x480", "1920x1080", "4000x3000"])
+    parser.add_argument("--densities", type=int, nargs="+", default=[1, 4, 12], help="People per image")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each stage per corpus image")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=48, help="/detect requests per concurrency level")
+    parser.add_argument("--no-polygon-refinement", action="store_true")
+    parser.add_argument("--no-render", action="store_true", help="Do not render annotated artifacts in the e2e runs")
+    parser.add_argument("--detector-ms", type=float, default=0.0, help="Simulated detector time per batch")
+    parser.add_argument("--sam-encoder-ms", type=float, default=0.0, help="Simulated SAM encoder time per image")
+    parser.add_argument("--sam-decoder-ms", type=float, default=0.0, help="Simulated SAM decoder time per box")
+    parser.add_argument("--skip-stages", action="store_true")
+    parser.add_argument("--skip-e2e", action="store_true")
+    parser.add_argument("--name", default="", help="Label for the stored result file")
+    parser.add_argument("--out", help="Result file (default: benchmarks/results/<time>_<revision>[_<name>].json)")
+    args = parser.parse_args()
+
+    for module in ("src.app.settings.setting", "app.settings.setting"):
+        settings = importlib.import_module(module)
+        for key, value in SETTINGS.items():
+            setattr(settings, key, value)
+
+    resolutions = [parse_size(value) for value in args.resolutions]
+    scenes = corpus(resolutions, args.densities)
+    payloads = {scene.index: encode(render_scene(scene)) for scene in scenes}
+    polygon_refinement = not args.no_polygon_refinement
+    revision = git_revision()
+    out = os.path.abspath(args.out) if args.out else os.path.join(
+        RESULTS_DIR,
+        f"{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}_{revision}{'_' + args.name if args.name else ''}.json"
+    )
+
+    # The app writes results/ and .cache/ relative to the working directory
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)
+    os.makedirs("results")
+
+    models = StubModels(scenes, args.detector_ms, args.sam_encoder_ms, args.sam_decoder_ms)
+    models.install()
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "name": args.name,
+            "revision": revision,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+            "args": vars(args),
+            "corpus": [{"name": scene.name, "boxes": len(scene.boxes), "jpeg_bytes": len(payloads[scene.index])} for scene in scenes]
+        },
+        "peak_rss_mb": {"start": peak_rss_mb()}
+    }
+    if not args.skip_stages:
+        report["stages"] = bench_stages(scenes, payloads, args.repeat, polygon_refinement, models)
+        report["peak_rss_mb"]["after_stages"] = peak_rss_mb()
+    if not args.skip_e2e:
+        report["e2e"] = asyncio.run(bench_e2e(
+            scenes, payloads, args.concurrency, args.requests, polygon_refinement, not args.no_render
+        ))
+        report["peak_rss_mb"]["after_e2e"] = peak_rss_mb()
+
+    from src.app.services.result_store import result_store
+    result_store.close()
+    os.chdir(ROOT)
+    workdir.cleanup()
+
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Stored in {os.path.relpath(out, ROOT)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
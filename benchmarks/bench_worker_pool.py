@@ -0,0 +1,99 @@
+# benchmarks/bench_worker_pool.py
+"""
+Throughput of the inference worker pool vs threads in one process, by worker count.
+
+For each N in --workers, the same jobs are run by N threads in this process
+and by a WorkerPool of N pinned processes (fed by N dispatching threads, as
+the API does). Workloads:
+
+  python  pure-Python CPU work, standing in for pre/post-processing under the GIL
+  model   detect_batch_sync on synthetic images (needs the models)
+
+    python -m benchmarks.bench_worker_pool --workload python --workers 1 2 4
+    python -m benchmarks.bench_worker_pool --workload model --jobs 32
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+from benchmarks.common import synthetic_image
+
+from src.app.core.worker_pool import WorkerPool
+
+LABELS = ["person.", "shirt.", "pant.", "shoe."]
+
+
+def python_job(n: int) -> int:
+    total = 0
+    for i in range(n):
+        total += (i * i) % 7
+    return total
+
+
+def model_job(seed: int) -> int:
+    from src.app.core.detect import detect_batch_sync
+    from src.app.settings.setting import DETECTOR_ID, DEFAULT_THRESHOLD
+
+    image = synthetic_image(800, 1200, seed=seed)
+    return len(detect_batch_sync([image], LABELS, DEFAULT_THRESHOLD, DETECTOR_ID)[0])
+
+
+def run(call: Callable[[int], object], jobs: List[int], workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(call, jobs))
+    return len(jobs) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", choices=["python", "model"], default="python")
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="Worker counts (default: 1, 2, 4, ... up to the core count)")
+    parser.add_argument("--jobs", type=int, default=64)
+    parser.add_argument("--size", type=int, default=2_000_000, help="Loop length of one python job")
+    args = parser.parse_args()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    counts = args.workers or sorted({min(cores, 2 ** i) for i in range(cores.bit_length() + 1)})
+    if args.workload == "python":
+        fn, jobs, preload = python_job, [args.size] * args.jobs, False
+    else:
+        from src.app.core.model_registry import model_registry
+        model_registry.preload(warmup=False)
+        fn, jobs, preload = model_job, list(range(args.jobs)), True
+
+    rows: List[Tuple[int, float, float]] = []
+    for n in counts:
+        threads = run(fn, jobs, n)
+        pool = WorkerPool(n, warmup=False)
+        pool.start(preload=preload)
+        try:
+            processes = run(lambda job: pool.call(fn, (job,)), jobs, n)
+        finally:
+            pool.stop()
+        rows.append((n, threads, processes))
+
+    base = rows[0][2]
+    print(json.dumps({
+        "workload": args.workload,
+        "cores": cores,
+        "jobs": args.jobs,
+        "results": [
+            {
+                "workers": n,
+                "threads_jobs_per_s": round(threads, 2),
+                "processes_jobs_per_s": round(processes, 2),
+                "process_scaling": round(processes / base, 2)
+            }
+            for n, threads, processes in rows
+        ]
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
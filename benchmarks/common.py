@@ -0,0 +1,47 @@
+# benchmarks/common.py
+
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+# The app imports itself both as `src.app` and `app`, so both roots must be importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "src")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """
+    Deterministic RGB image with a few solid blobs, so detectors have something to look at.
+    """
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 64, size=(height, width, 3), dtype=np.uint8)
+    for _ in range(6):
+        x0, y0 = rng.integers(0, width // 2), rng.integers(0, height // 2)
+        x1, y1 = x0 + rng.integers(width // 8, width // 2), y0 + rng.integers(height // 8, height // 2)
+        image[y0:y1, x0:x1] = rng.integers(64, 256, size=3, dtype=np.uint8)
+    return Image.fromarray(image)
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    values = np.asarray(latencies) * 1000.0
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(values.mean()), 2),
+    }
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
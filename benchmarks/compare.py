@@ -0,0 +1,87 @@
+# benchmarks/compare.py
+"""
+Compare two stored bench_suite runs.
+
+Prints every metric the runs share (stage and end-to-end latencies,
+throughput, peak RSS) with the change from base to head, and marks changes
+beyond --threshold percent as worse/better. With --fail-on-regression it
+exits non-zero when anything got worse by more than the threshold.
+
+    python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/head.json
+    python -m benchmarks.compare base.json head.json --threshold 10 --metric p95_ms --fail-on-regression
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, Tuple
+
+# metric path -> (value, higher is better)
+Metrics = Dict[str, Tuple[float, bool]]
+
+
+def flatten(report: dict, metric: str) -> Metrics:
+    metrics: Metrics = {}
+    for stage, per_scene in report.get("stages", {}).items():
+        for scene, summary in per_scene.items():
+            metrics[f"stages/{stage}/{scene}/{metric}"] = (summary[metric], False)
+    for level, run in report.get("e2e", {}).items():
+        for key, summary_metric in (("p50", "p50_ms"), ("p95", "p95_ms"), ("p99", "p99_ms")):
+            if run.get("latency"):
+                metrics[f"e2e/{level}/{key}_ms"] = (run["latency"][summary_metric], False)
+        if run.get("throughput_rps") is not None:
+            metrics[f"e2e/{level}/throughput_rps"] = (run["throughput_rps"], True)
+        metrics[f"e2e/{level}/rejected"] = (run["rejected"], False)
+        metrics[f"e2e/{level}/failed"] = (run["failed"], False)
+    for phase, value in report.get("peak_rss_mb", {}).items():
+        metrics[f"peak_rss_mb/{phase}"] = (value, False)
+    return metrics
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"], help="Stage latency statistic to compare")
+    parser.add_argument("--threshold", type=float, default=5.0, help="Percent change reported as worse/better")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base_report = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head_report = json.load(f)
+    base, head = flatten(base_report, args.metric), flatten(head_report, args.metric)
+
+    print(f"base: {base_report['meta']['revision']} {base_report['meta']['name']} ({base_report['meta']['created_at']})")
+    print(f"head: {head_report['meta']['revision']} {head_report['meta']['name']} ({head_report['meta']['created_at']})")
+
+    def workload(report: dict) -> dict:
+        return {k: v for k, v in report["meta"]["args"].items() if k not in ("name", "out")}
+
+    if workload(base_report) != workload(head_report):
+        print("warning: the runs used different arguments", file=sys.stderr)
+
+    regressions = 0
+    width = max((len(name) for name in base if name in head), default=0)
+    for name in sorted(set(base) & set(head)):
+        (old, higher_is_better), (new, _) = base[name], head[name]
+        if old:
+            change = (new - old) / old * 100.0
+        else:
+            change = 0.0 if new == old else float("inf")
+        worse = -change if higher_is_better else change
+        verdict = "worse" if worse > args.threshold else "better" if worse < -args.threshold else ""
+        if verdict == "worse":
+            regressions += 1
+        print(f"{name:<{width}}  {old:>10.2f}  {new:>10.2f}  {change:>+8.1f}%  {verdict}")
+
+    only = sorted(set(base) ^ set(head))
+    if only:
+        print(f"{len(only)} metrics only in one run (different corpus or stages)", file=sys.stderr)
+    if args.fail_on_regression and regressions:
+        sys.exit(f"{regressions} metrics regressed by more than {args.threshold}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# benchmarks/stubs.py
+"""
+Offline stand-ins for the detector and SAM, and the generated image corpus they understand.
+
+Each corpus image is a scene: a number of people (the crowd density) with
+outfit items inside them, some duplicate boxes for overlap suppression and
+some loose items that belong to nobody. The scene index is painted into the
+background colour, so the stub detector recovers the scene from any copy of
+the image (downscaled, JPEG-compressed) and returns its boxes in that copy's
+pixels. The stub segmenter returns full-resolution elliptical masks for the
+boxes, so everything downstream of the models handles real-sized outputs.
+
+install() swaps only the model calls (detect.detect_batch_sync and
+segment.segment_boxes); micro-batching, the inference executor, filtering,
+polygon refinement, rendering and the API handlers run as in production.
+"""
+
+import io
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+
+# Background colour channels step by this much per scene index digit (survives JPEG and resizing)
+_STEP = 16
+_ITEMS = [
+    # label, box inside the person box as (x0, y0, x1, y1) fractions
+    ("hat.", (0.25, 0.0, 0.75, 0.12)),
+    ("shirt.", (0.1, 0.15, 0.9, 0.5)),
+    ("pant.", (0.15, 0.45, 0.85, 0.88)),
+    ("shoe.", (0.1, 0.88, 0.45, 1.0)),
+    ("shoe.", (0.55, 0.88, 0.9, 1.0)),
+    ("watch.", (0.0, 0.45, 0.12, 0.52)),
+]
+# Labels the detector "confuses" with the shirt, giving same-area boxes for overlap suppression
+_DUPLICATES = ["vest.", "headscarf."]
+
+
+@dataclass
+class Scene:
+    index: int
+    width: int
+    height: int
+    persons: int
+    # (label, score, normalized xyxy)
+    boxes: List[Tuple[str, float, Tuple[float, float, float, float]]]
+
+    @property
+    def name(self) -> str:
+        return f"{self.width}x{self.height}_p{self.persons}"
+
+
+def make_scene(index: int, width: int, height: int, persons: int) -> Scene:
+    rng = np.random.default_rng(index)
+    boxes = []
+    aspect = width / height
+    for _ in range(persons):
+        h = rng.uniform(0.35, 0.9) if persons <= 4 else rng.uniform(0.15, 0.4)
+        w = min(0.9, h / 2.4 / aspect)
+        x0, y0 = rng.uniform(0, 1 - w), rng.uniform(0, 1 - h)
+        boxes.append(("person.", float(rng.uniform(0.6, 0.95)), (x0, y0, x0 + w, y0 + h)))
+        for label, (fx0, fy0, fx1, fy1) in _ITEMS:
+            if rng.random() < 0.85:
+                item = (x0 + fx0 * w, y0 + fy0 * h, x0 + fx1 * w, y0 + fy1 * h)
+                boxes.append((label, float(rng.uniform(0.3, 0.9)), item))
+        jitter = rng.uniform(-0.01, 0.01, size=4) * w
+        shirt = (x0 + 0.1 * w, y0 + 0.15 * h, x0 + 0.9 * w, y0 + 0.5 * h)
+        duplicate = tuple(float(np.clip(v + d, 0, 1)) for v, d in zip(shirt, jitter))
+        boxes.append((_DUPLICATES[int(rng.integers(len(_DUPLICATES)))], float(rng.uniform(0.3, 0.6)), duplicate))
+    # Loose items nobody wears: detected, but never part of a response
+    for _ in range(max(1, persons // 2)):
+        w, h = rng.uniform(0.03, 0.12), rng.uniform(0.03, 0.12)
+        x0, y0 = rng.uniform(0, 1 - w), rng.uniform(0, 1 - h)
+        label, _ = _ITEMS[int(rng.integers(len(_ITEMS)))]
+        boxes.append((label, float(rng.uniform(0.3, 0.7)), (x0, y0, x0 + w, y0 + h)))
+    return Scene(index, width, height, persons, boxes)
+
+
+def corpus(resolutions: List[Tuple[int, int]], densities: List[int]) -> List[Scene]:
+    scenes = []
+    for width, height in resolutions:
+        for persons in densities:
+            scenes.append(make_scene(len(scenes), width, height, persons))
+    return scenes
+
+
+def _background(index: int) -> Tuple[int, int, int]:
+    low, high = index % _STEP, index // _STEP
+    if high >= _STEP:
+        raise ValueError(f"At most {_STEP * _STEP} scenes")
+    return (low * _STEP + _STEP // 2, high * _STEP + _STEP // 2, 96)
+
+
+def scene_index(image: Image.Image) -> int:
+    r, g, _ = image.convert("RGB").getpixel((1, 1))
+    return int(r) // _STEP + _STEP * (int(g) // _STEP)
+
+
+def render_scene(scene: Scene) -> Image.Image:
+    """
+    The scene as an RGB image: flat scene-coded background, a textured block per box.
+    """
+    image = np.empty((scene.height, scene.width, 3), dtype=np.uint8)
+    image[:] = _background(scene.index)
+    rng = np.random.default_rng(scene.index)
+    scale = np.array([scene.width, scene.height, scene.width, scene.height])
+    for _, _, box in scene.boxes:
+        x0, y0, x1, y1 = (np.asarray(box) * scale).astype(int)
+        if x1 > x0 and y1 > y0:
+            noise = rng.integers(0, 48, size=(y1 - y0, x1 - x0, 1), dtype=np.uint8)
+            image[y0:y1, x0:x1] = rng.integers(96, 208, size=3, dtype=np.uint8) + noise
+    # The corner that encodes the scene stays flat (one JPEG block and then some)
+    image[:16, :16] = _background(scene.index)
+    return Image.fromarray(image)
+
+
+def encode(image: Image.Image, fmt: str = "JPEG", quality: int = 90) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=quality)
+    return buffer.getvalue()
+
+
+class StubModels:
+    """
+    Deterministic detector/segmenter stand-ins, with optional simulated model time (a sleep,
+    which like a real forward pass releases the GIL).
+    """
+
+    def __init__(self, scenes: List[Scene], detector_ms: float = 0.0, sam_encoder_ms: float = 0.0, sam_decoder_ms: float = 0.0):
+        self.scenes = {scene.index: scene for scene in scenes}
+        self.detector_ms = detector_ms
+        self.sam_encoder_ms = sam_encoder_ms
+        self.sam_decoder_ms = sam_decoder_ms
+
+    def detect_batch_sync(self, images: List[Image.Image], labels: List[str], threshold: float, model_id: str):
+        from app.utils.results import DetectionResult
+
+        time.sleep(self.detector_ms / 1000.0)
+        wanted = {label if label.endswith(".") else label + "." for label in labels}
+        results = []
+        for image in images:
+            scene = self.scenes[scene_index(image)]
+            width, height = image.size
+            results.append([
+                DetectionResult.from_dict({
+                    "score": score,
+                    "label": label,
+                    "box": {
+                        "xmin": int(box[0] * width), "ymin": int(box[1] * height),
+                        "xmax": int(box[2] * width), "ymax": int(box[3] * height)
+                    }
+                })
+                for label, score, box in scene.boxes
+                if label in wanted and score >= threshold
+            ])
+        return results
+
+    def segment_boxes(
+        self,
+        image: Image.Image,
+        boxes: List[List[float]],
+        model_id: str,
+        polygon_refinement: bool = False,
+        image_key: Optional[str] = None,
+        original_size: Optional[Tuple[int, int]] = None
+    ):
+        from app.utils.compact_mask import CompactMask
+        from src.app.core.segment import refine_stage
+
+        time.sleep((self.sam_encoder_ms + self.sam_decoder_ms * len(boxes)) / 1000.0)
+        width, height = original_size if original_size is not None else image.size
+        masks = []
+        for x0, y0, x1, y1 in boxes:
+            x0, y0 = max(0, int(x0)), max(0, int(y0))
+            x1, y1 = min(width, int(x1)), min(height, int(y1))
+            h, w = max(0, y1 - y0), max(0, x1 - x0)
+            yy, xx = np.ogrid[0:h, 0:w]
+            ellipse = ((xx - w / 2) / max(w / 2, 1)) ** 2 + ((yy - h / 2) / max(h / 2, 1)) ** 2 <= 1.0
+            masks.append(CompactMask.from_crop(ellipse, (x0, y0), (height, width)))
+        return refine_stage(masks, polygon_refinement)
+
+    def install(self) -> None:
+        import importlib
+
+        importlib.import_module("src.app.core.detect").detect_batch_sync = self.detect_batch_sync
+        importlib.import_module("src.app.core.segment").segment_boxes = self.segment_boxes
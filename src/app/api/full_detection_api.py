@@ -1,23 +1,39 @@
 # app/api/full_detection.py
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional
+import os, sys, json, platform, aiofiles, asyncio
 from datetime import datetime
-from PIL import Image
-import os, json, torch, platform, psutil, numpy as np, aiofiles, asyncio
-from io import BytesIO
 from src.app.utils.logger_utils import get_logger, debug_log
+from src.app.utils.lazy_import import lazy_module
 
 logger = get_logger(__name__)
 
-from src.app.services.segmentation_service import grounded_segmentation
-from app.utils.plotting import plot_detections
-from app.settings.setting import DEFAULT_THRESHOLD, DETECTOR_ID, SEGMENTER_ID
-from app.utils.image_ops import load_image
-from app.utils.postprocess import remove_multilabel_same_area, compute_iou
+psutil = lazy_module("psutil")
 
-router = APIRouter()
+from src.app.services.segmentation_service import grounded_segmentation, stream_grounded_segmentation
+from src.app.services import segmentation_service
+from app.settings.setting import DEFAULT_THRESHOLD, DETECTOR_ID, SEGMENTER_ID, RENDER_ARTIFACTS
+from app.utils.image_ops import load_image, image_digest
+from src.app.utils.fetch import decode_image
+from app.utils.resolution import original_size
+from src.app.core.model_registry import model_registry
+from src.app.core.warmup import warmup
+from src.app.core.detect import detection_batcher
+from src.app.core import prompt_cache
+from src.app.core.executor import inference_executor, InferenceRejected
+from src.app.core.worker_pool import worker_pool
+from src.app.core.segment import embedding_cache, reprompt_images, reprompt
+from src.app.services.result_cache import result_cache
+from src.app.services.result_store import result_store
+from src.app.utils.fetch_cache import fetch_cache
+from src.app.services.outfit_results import (
+    prepare_labels, group_outfits, new_artifact, save_artifacts,
+    normalize_box, detection_payload, mask_payload, sam_decodes_saved
+)
+from src.app.services.batch_pipeline import BatchItem, BatchOptions, run_batch
 
-DEFAULT_LABELS = ["shirt.", "pant.", "shoe.", "sandal.", "headscarf.", "watch.", "glasses.", "skirt.", "vest.", "hat."]
+router = APIRouter()
 
 @router.post("/detect")
 async def detect (
@@ -25,15 +41,15 @@ async def detect (
     file: Optional[UploadFile] = File(None),
     labels: Optional[str] = Form(None),
     threshold: Optional[float] = Form(DEFAULT_THRESHOLD),
-    polygon_refinement: Optional[bool] = Form(True)
+    polygon_refinement: Optional[bool] = Form(True),
+    bypass_cache: Optional[bool] = Form(False),
+    render: Optional[bool] = Form(RENDER_ARTIFACTS),
+    boxes_only: Optional[bool] = Form(False)
 ):
     try:
         debug_log("/detect request received", logger)
         # Handle labels
-        label_list = labels.split(",") if labels else DEFAULT_LABELS
-        if not any(l.lower() == "person" for l in label_list):
-            label_list = ["person"] + label_list
-        label_list = [label if label.endswith(".") else label + "." for label in label_list]
+        label_list = prepare_labels(labels)
 
         # Load image
         if image_url:
@@ -41,13 +57,15 @@ async def detect (
             input_type = "url"
             image_source = image_url
         elif file:
-            image_pil = Image.open(BytesIO(await file.read())).convert("RGB")
+            image_pil = await asyncio.to_thread(decode_image, await file.read())
             input_type = "file"
             image_source = file.filename
         else:
             raise HTTPException(status_code=400, detail="No image provided")
 
-        image_array = np.array(image_pil)
+        # Content hash doubles as the id for re-prompting this image later
+        result_id = image_digest(image_pil)
+        image_size = original_size(image_pil)
 
         # Handle threshold and polygon refinement
         threshold = threshold if threshold is not None else DEFAULT_THRESHOLD
@@ -60,79 +78,36 @@ async def detect (
             threshold=threshold,
             polygon_refinement=polygon_refinement,
             detector_id=DETECTOR_ID,
-            segmenter_id=SEGMENTER_ID
+            segmenter_id=SEGMENTER_ID,
+            image_key=result_id,
+            bypass_cache=bool(bypass_cache),
+            boxes_only=bool(boxes_only)
         )
         debug_log(f"Detection completed: {len(detections)} detections", logger)
 
-        # Filter by score threshold
-        detections = [d for d in detections if d.score >= threshold]
-
-        # Separate detections into persons and outfit items
-        persons = [d for d in detections if d.label.lower().strip().rstrip('.') == 'person']
-        items = [d for d in detections if d.label.lower().strip().rstrip('.') != 'person']
-
-        # Filter overlapping items (only keep highest score per area)
-        items = remove_multilabel_same_area(items, iou_threshold=0.5)
-
-        # Get image size
-        img_width, img_height = image_pil.size
-
-        def normalize_box(xmin, ymin, xmax, ymax):
-            x = xmin / img_width
-            y = ymin / img_height
-            w = (xmax - xmin) / img_width
-            h = (ymax - ymin) / img_height
-            return [round(x, 4), round(y, 4), round(w, 4), round(h, 4)]
-
-        # Build results
-        results = []
-        for idx, person in enumerate(persons, 1):
-            pxmin, pymin, pxmax, pymax = person.box.xyxy
-            outfits = []
-            for item in items:
-                ixmin, iymin, ixmax, iymax = item.box.xyxy
-                if (ixmin >= pxmin and iymin >= pymin and ixmax <= pxmax and iymax <= pymax):
-                    outfits.append({
-                        "text_prompt": item.label,
-                        "box": normalize_box(ixmin, iymin, ixmax, iymax),
-                        "confidence": round(item.score, 4),
-                        "iou_with_person": round(compute_iou([pxmin, pymin, pxmax, pymax], [ixmin, iymin, ixmax, iymax]), 4)
-                    })
-
-            results.append({
-                "person_id": idx,
-                "bounding_box": normalize_box(pxmin, pymin, pxmax, pymax),
-                "outfit": outfits
-            })
-
-        # Save results
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        results_dir = "results"
-        os.makedirs(results_dir, exist_ok=True)
-
-        image_filename = f"{results_dir}/detection_{timestamp}.png"
-        json_filename = f"{results_dir}/detection_{timestamp}.json"
-        
-        # Run plotting in thread pool
-        await asyncio.to_thread(plot_detections, image_pil, detections, image_filename)
+        detections, persons, results = group_outfits(detections, image_size, threshold)
+        artifact_id, saved_files = new_artifact(render=render is not False)
 
         response = {
+            "result_id": result_id,
+            "artifact_id": artifact_id,
             "input_type": input_type,
             "image_source": image_source,
             "status": "completed",
             "num_persons": len(persons),
             "total_detections": len(detections),
+            "sam_decodes_saved": sam_decodes_saved(detections),
             "results": results,
-            "saved_files": {
-                "image": image_filename,
-                "json": json_filename
-            }
+            "saved_files": saved_files
         }
 
-        # Run file writing in thread pool
-        await asyncio.to_thread(lambda: json.dump(response, open(json_filename, "w", encoding="utf-8"), indent=2))
+        # Rendering and file writing run in a worker thread, by default after the response is sent
+        await save_artifacts(image_pil, detections, response)
 
         return response
+    except InferenceRejected:
+        # Turned into 429/503 with Retry-After by the app's exception handler
+        raise
     except Exception as e:
         logger.error("Detection failed: %s", str(e))
         return {
@@ -141,6 +116,201 @@ async def detect (
             "error": str(e)
         }
 
+def _format_event(event: str, data: Dict[str, Any], fmt: str) -> str:
+    payload = json.dumps({"event": event, **data})
+    if fmt == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+@router.post("/detect/stream")
+async def detect_stream(
+    image_url: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    labels: Optional[str] = Form(None),
+    threshold: Optional[float] = Form(DEFAULT_THRESHOLD),
+    polygon_refinement: Optional[bool] = Form(True),
+    bypass_cache: Optional[bool] = Form(False),
+    render: Optional[bool] = Form(RENDER_ARTIFACTS),
+    boxes_only: Optional[bool] = Form(False),
+    format: str = Query("ndjson", description="ndjson or sse")
+):
+    """
+    Streaming /detect: boxes and person grouping first, then one mask event per detection,
+    then the saved artifact paths.
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    label_list = prepare_labels(labels)
+    threshold = threshold if threshold is not None else DEFAULT_THRESHOLD
+    polygon_refinement = polygon_refinement if polygon_refinement is not None else True
+    # Read the upload before the response starts, the request body is gone afterwards
+    file_bytes = await file.read() if file and not image_url else None
+    if not image_url and file_bytes is None:
+        raise HTTPException(status_code=400, detail="No image provided")
+    # The status code goes out with the first event, so refuse up front when inference is saturated
+    inference_executor.check()
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            if image_url:
+                image_pil = await load_image(image_url)
+                input_type, image_source = "url", image_url
+            else:
+                image_pil = await asyncio.to_thread(decode_image, file_bytes)
+                input_type, image_source = "file", file.filename
+            result_id = await asyncio.to_thread(image_digest, image_pil)
+            image_size = original_size(image_pil)
+
+            detections = []
+            stream = stream_grounded_segmentation(
+                image=image_pil,
+                labels=label_list,
+                threshold=threshold,
+                polygon_refinement=polygon_refinement,
+                detector_id=DETECTOR_ID,
+                segmenter_id=SEGMENTER_ID,
+                image_key=result_id,
+                bypass_cache=bool(bypass_cache),
+                boxes_only=bool(boxes_only)
+            )
+            async for kind, value in stream:
+                if kind == "detections":
+                    detections = value
+                    _, persons, results = group_outfits(detections, image_size, threshold)
+                    yield _format_event("boxes", {
+                        "result_id": result_id,
+                        "input_type": input_type,
+                        "image_source": image_source,
+                        "num_persons": len(persons),
+                        "total_detections": len(detections),
+                        "detections": [detection_payload(i, d, image_size) for i, d in enumerate(detections)],
+                        "results": results
+                    }, format)
+                else:
+                    idx, detection = value
+                    yield _format_event("mask", {"detection_id": idx, **mask_payload(detection.mask, detection.polygon)}, format)
+
+            detections, persons, results = group_outfits(detections, image_size, threshold)
+            artifact_id, saved_files = new_artifact(render=render is not False)
+            response = {
+                "result_id": result_id,
+                "artifact_id": artifact_id,
+                "input_type": input_type,
+                "image_source": image_source,
+                "status": "completed",
+                "num_persons": len(persons),
+                "total_detections": len(detections),
+                "sam_decodes_saved": sam_decodes_saved(detections),
+                "results": results,
+                "saved_files": saved_files
+            }
+            # The "saved" event promises the files exist, so wait for the write here
+            await save_artifacts(image_pil, detections, response, background=False)
+            yield _format_event("saved", {"artifact_id": artifact_id, "saved_files": saved_files}, format)
+            yield _format_event("done", {"status": "completed"}, format)
+        except InferenceRejected as e:
+            yield _format_event("error", {"status": "failed", "error": str(e), "retry_after": e.retry_after}, format)
+        except Exception as e:
+            logger.error("Streaming detection failed: %s", str(e))
+            yield _format_event("error", {"status": "failed", "error": str(e)}, format)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+@router.post("/detect/batch")
+async def detect_batch(
+    image_urls: Optional[List[str]] = Form(None),
+    s3_keys: Optional[List[str]] = Form(None),
+    files: Optional[List[UploadFile]] = File(None),
+    labels: Optional[str] = Form(None),
+    threshold: Optional[float] = Form(DEFAULT_THRESHOLD),
+    polygon_refinement: Optional[bool] = Form(True),
+    bypass_cache: Optional[bool] = Form(False),
+    render: Optional[bool] = Form(RENDER_ARTIFACTS),
+    boxes_only: Optional[bool] = Form(False)
+):
+    """
+    Detect outfits on many images in one call. Each item succeeds or fails on its own.
+    """
+    items = []
+    for url in image_urls or []:
+        items.append(BatchItem(index=len(items), input_type="url", image_source=url))
+    for key in s3_keys or []:
+        source = key if key.startswith("s3://") else f"s3://{key.lstrip('/')}"
+        items.append(BatchItem(index=len(items), input_type="s3", image_source=source))
+    for upload in files or []:
+        items.append(BatchItem(index=len(items), input_type="file", image_source=upload.filename, data=await upload.read()))
+    if not items:
+        raise HTTPException(status_code=400, detail="No images provided")
+
+    options = BatchOptions(
+        labels=prepare_labels(labels),
+        threshold=threshold if threshold is not None else DEFAULT_THRESHOLD,
+        polygon_refinement=polygon_refinement if polygon_refinement is not None else True,
+        bypass_cache=bool(bypass_cache),
+        render=render is not False,
+        boxes_only=bool(boxes_only)
+    )
+    debug_log(f"/detect/batch request received: {len(items)} items", logger)
+    results = await run_batch(items, options)
+    succeeded = sum(1 for r in results if r["status"] == "completed")
+
+    return {
+        "status": "completed" if succeeded == len(results) else "partial" if succeeded else "failed",
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "items": results
+    }
+
+@router.post("/segment/reprompt")
+async def segment_reprompt(
+    result_id: str = Form(...),
+    boxes: str = Form(..., description="JSON list of [xmin, ymin, xmax, ymax] boxes in pixels"),
+    labels: Optional[str] = Form(None),
+    polygon_refinement: Optional[bool] = Form(False)
+):
+    """
+    Re-segment an image from an earlier /detect call with new boxes, using its cached SAM embedding
+    (or encoding the image kept for result_id when SAM did not run on it).
+    """
+    try:
+        box_list = json.loads(boxes)
+        if not box_list or not all(len(box) == 4 for box in box_list):
+            raise HTTPException(status_code=400, detail="boxes must be a non-empty list of [xmin, ymin, xmax, ymax]")
+        label_list = labels.split(",") if labels else [None] * len(box_list)
+        if len(label_list) != len(box_list):
+            raise HTTPException(status_code=400, detail="labels must have one entry per box")
+
+        try:
+            (img_height, img_width), masks, polygons = await reprompt(result_id, box_list, bool(polygon_refinement), SEGMENTER_ID)
+        except KeyError:
+            return {
+                "result_id": result_id,
+                "status": "failed",
+                "error": "Unknown or expired result_id, run /detect on the image again (a cached result also renews it)."
+            }
+
+        segments = [
+            {"text_prompt": label, "box": normalize_box(box, (img_width, img_height)), **mask_payload(mask, polygon)}
+            for box, label, mask, polygon in zip(box_list, label_list, masks, polygons)
+        ]
+
+        return {
+            "result_id": result_id,
+            "status": "completed",
+            "segments": segments
+        }
+    except (HTTPException, InferenceRejected):
+        raise
+    except Exception as e:
+        logger.error("Re-prompt failed: %s", str(e))
+        return {
+            "result_id": result_id,
+            "status": "failed",
+            "error": str(e)
+        }
+
 @router.get("/results")
 async def get_specific_result(filename: str = Query(..., description="Filename of the image result to fetch")):
     results_dir = "results"
@@ -164,20 +334,85 @@ async def get_specific_result(filename: str = Query(..., description="Filename o
         "result": result_data
     }
 
+def _timestamp(value: Optional[str], name: str) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 date or datetime")
+
+@router.get("/results/search")
+async def search_results(
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    image_source: Optional[str] = Query(None, description="Exact image URL, S3 URL or uploaded filename"),
+    result_id: Optional[str] = Query(None, description="Image content digest"),
+    label: Optional[str] = Query(None, description="Only artifacts with a detection of this label"),
+    since: Optional[str] = Query(None, description="ISO 8601 date/datetime (inclusive)"),
+    until: Optional[str] = Query(None, description="ISO 8601 date/datetime (exclusive)")
+):
+    """
+    Newest-first page of saved results. Metadata comes from the result index; no JSON files are read.
+    """
+    total, items = await asyncio.to_thread(
+        result_store.query,
+        limit=limit,
+        offset=offset,
+        image_source=image_source,
+        result_id=result_id,
+        label=label,
+        since=_timestamp(since, "since"),
+        until=_timestamp(until, "until")
+    )
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + len(items) if offset + len(items) < total else None,
+        "items": items
+    }
+
+@router.get("/results/item")
+async def get_result_item(artifact_id: str = Query(..., description="artifact_id returned by /detect")):
+    record = await asyncio.to_thread(result_store.get, artifact_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Result not found.")
+    try:
+        async with aiofiles.open(record["json_url"].lstrip("/"), "r", encoding="utf-8") as f:
+            record["result"] = json.loads(await f.read())
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Result files were removed.")
+    return record
+
 @router.get("/status")
 def check_status():
     try:
-        # Check cuda
-        cuda_available = torch.cuda.is_available()
+        # torch is only touched once the warm-up has imported it, so /status never waits on it
+        torch = sys.modules.get("torch") if warmup.done else None
+        cuda_available = torch.cuda.is_available() if torch is not None else None
         cuda_device = torch.cuda.get_device_name(0) if cuda_available else None
 
         return {
             "status": "ok",
+            "ready": warmup.ready,
+            "warmup": warmup.status(),
             "cuda_available": cuda_available,
-            "device_name": cuda_device if cuda_available else "CPU",
-            "torch_version": torch.__version__,
+            "device_name": cuda_device if cuda_available else ("CPU" if torch is not None else None),
+            "torch_version": torch.__version__ if torch is not None else None,
             "platform": platform.system(),
-            "memory_usage_percent": psutil.virtual_memory().percent
+            "memory_usage_percent": psutil.virtual_memory().percent,
+            "model_registry": model_registry.status(),
+            "detection_batching": detection_batcher.stats(),
+            "inference_executor": inference_executor.stats(),
+            "inference_processes": worker_pool.stats() if worker_pool is not None else None,
+            "sam_embedding_cache": embedding_cache.stats(),
+            "reprompt_image_cache": reprompt_images.stats(),
+            "text_prompt_cache": prompt_cache.stats(),
+            "segmentation": segmentation_service.stats(),
+            "result_cache": result_cache.stats(),
+            "fetch_cache": fetch_cache.stats(),
+            "result_store": result_store.stats()
         }
     except Exception as e:
         return {
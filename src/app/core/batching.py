@@ -0,0 +1,92 @@
+# app/core/batching.py
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from src.app.utils.logger_utils import get_logger, debug_log
+
+logger = get_logger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collect requests that arrive within a short window and run them as one batch.
+
+    Requests are grouped by key; a group is flushed when it reaches
+    max_batch_size or when window_ms has passed since its first request.
+    run_batch(key, items) is executed in a worker thread (through
+    `await executor(run_batch, key, items)` when an executor is given) and must
+    return one result per item, in order. Each caller gets back its own result (or the
+    batch's exception).
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[Hashable, List[Any]], List[Any]],
+        window_ms: float,
+        max_batch_size: int,
+        name: str = "batcher",
+        executor: Optional[Callable[..., Awaitable[Any]]] = None
+    ):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.name = name
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._running: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        group = self._pending.setdefault(key, [])
+        group.append((item, future))
+
+        if len(group) >= self.max_batch_size:
+            self._flush(key)
+        elif len(group) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: Hashable) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        group = self._pending.pop(key, None)
+        if not group:
+            return
+        task = asyncio.ensure_future(self._run(key, group))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, key: Hashable, group: List[Tuple[Any, asyncio.Future]]) -> None:
+        items = [item for item, _ in group]
+        self.batches += 1
+        self.items += len(items)
+        debug_log(f"{self.name}: running batch of {len(items)}", logger)
+        loop = asyncio.get_running_loop()
+        try:
+            if self.executor is not None:
+                results = await self.executor(self.run_batch, key, items)
+            else:
+                results = await loop.run_in_executor(None, self.run_batch, key, items)
+        except Exception as e:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size
+        }
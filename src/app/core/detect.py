@@ -1,17 +1,129 @@
 # app/core/detect.py
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from PIL import Image
-import torch
-from transformers.pipelines import pipeline
-import logging
-import asyncio
 from src.app.utils.logger_utils import get_logger, debug_log
+from src.app.utils.lazy_import import lazy_module
 
 logger = get_logger(__name__)
 
+torch = lazy_module("torch")
+F = lazy_module("torch.nn.functional")
+
 from app.utils.results import DetectionResult
-from app.settings.setting import DETECTOR_ID, DEFAULT_THRESHOLD
+from app.settings.setting import DETECTOR_ID, DEFAULT_THRESHOLD, DETECT_BATCHING, DETECT_BATCH_WINDOW_MS, DETECT_MAX_BATCH_SIZE
+from src.app.core.model_registry import model_registry, default_precision, get_device, DETECTOR
+from src.app.core.precision import inference_context
+from src.app.core.batching import MicroBatcher
+from src.app.core.executor import inference_executor, InferenceRejected
+from src.app.core.prompt_cache import tokenize
+
+# Pipeline bookkeeping keys that are not model inputs
+_CHUNK_META = ("target_size", "candidate_label", "is_last")
+
+
+def _pad_stack(tensors: List["torch.Tensor"]) -> "torch.Tensor":
+    """
+    Zero-pad image tensors (bottom/right) to a common height/width and concatenate them.
+    """
+    max_h = max(t.shape[-2] for t in tensors)
+    max_w = max(t.shape[-1] for t in tensors)
+    padded = [F.pad(t, (0, max_w - t.shape[-1], 0, max_h - t.shape[-2])) for t in tensors]
+    return torch.cat(padded, dim=0)
+
+
+def _collate_chunks(chunks: List[Dict[str, Any]]) -> Dict[str, "torch.Tensor"]:
+    batch = {}
+    for key, value in chunks[0].items():
+        if key in _CHUNK_META or not isinstance(value, torch.Tensor):
+            continue
+        tensors = [chunk[key] for chunk in chunks]
+        if key in ("pixel_values", "pixel_mask"):
+            batch[key] = _pad_stack(tensors)
+        else:
+            batch[key] = torch.cat(tensors, dim=0)
+
+    # Padded pixels must be masked out if the processor didn't give us a mask
+    if "pixel_mask" not in batch and "pixel_values" in batch:
+        masks = [torch.ones((1,) + chunk["pixel_values"].shape[-2:], dtype=torch.long) for chunk in chunks]
+        batch["pixel_mask"] = _pad_stack(masks)
+    return batch
+
+
+def _preprocess(object_detector: Any, model_id: str, image: Image.Image, labels: List[str]) -> List[Dict[str, Any]]:
+    """
+    The pipeline's preprocess, one chunk per label, except that the image is
+    processed once (not once per label) and the labels' tokens come from the prompt cache.
+    """
+    image_features = object_detector.image_processor(image, return_tensors="pt")
+    torch_dtype = getattr(object_detector, "torch_dtype", None)
+    if torch_dtype is not None:
+        image_features = image_features.to(torch_dtype)
+    target_size = torch.tensor([[image.height, image.width]], dtype=torch.int32)
+    return [
+        {
+            "is_last": j == len(labels) - 1,
+            "target_size": target_size,
+            "candidate_label": label,
+            **tokenize(object_detector, model_id, label),
+            **image_features
+        }
+        for j, label in enumerate(labels)
+    ]
+
+
+def detect_batch_sync(
+    images: List[Image.Image],
+    labels: List[str],
+    threshold: float,
+    model_id: str
+) -> List[List[DetectionResult]]:
+    """
+    Run the zero-shot detector on several images that share one label set.
+
+    The pipeline runs one forward per candidate label; here each of those
+    forwards is done once for the whole batch instead of once per image.
+    """
+    object_detector = model_registry.get_detector(model_id)
+    processed_labels = [label if label.endswith(".") else label + "." for label in labels]
+    precision = default_precision(DETECTOR)
+
+    # chunks[i][j]: preprocessed inputs of image i for label j
+    chunks = [_preprocess(object_detector, model_id, image, processed_labels) for image in images]
+    outputs_per_image: List[List[Dict[str, Any]]] = [[] for _ in images]
+    with inference_context(precision, get_device()):
+        for j in range(len(processed_labels)):
+            label_chunks = [chunks[i][j] for i in range(len(images))]
+            batch = {k: v.to(object_detector.device) for k, v in _collate_chunks(label_chunks).items()}
+            outputs = object_detector.model(**batch)
+            for i, chunk in enumerate(label_chunks):
+                model_output = {k: chunk[k] for k in _CHUNK_META}
+                # Post-processing expects fp32 (bf16 autocast outputs are cast back)
+                model_output.update({
+                    k: v[i:i + 1].float() if v.is_floating_point() else v[i:i + 1]
+                    for k, v in outputs.items() if isinstance(v, torch.Tensor)
+                })
+                outputs_per_image[i].append(model_output)
+
+    return [
+        [DetectionResult.from_dict(r) for r in object_detector.postprocess(model_outputs, threshold=threshold)]
+        for model_outputs in outputs_per_image
+    ]
+
+
+def _run_detection_batch(key: Tuple[str, Tuple[str, ...], float], images: List[Image.Image]) -> List[List[DetectionResult]]:
+    model_id, labels, threshold = key
+    return detect_batch_sync(images, list(labels), threshold, model_id)
+
+
+detection_batcher = MicroBatcher(
+    _run_detection_batch,
+    window_ms=DETECT_BATCH_WINDOW_MS,
+    max_batch_size=DETECT_MAX_BATCH_SIZE,
+    name="detection_batcher",
+    executor=inference_executor.run
+)
+
 
 async def detect(
     image: Image.Image,
@@ -24,34 +136,19 @@ async def detect(
     """
     try:
         debug_log("Detection started", logger)
-        device = "cuda" if torch.cuda.is_available() else "cpu"
         model_id = detector_id if detector_id is not None else DETECTOR_ID
 
-        # Run the heavy computation in a thread pool to avoid blocking
-        loop = asyncio.get_event_loop()
-        
-        def _detect_sync():
-            object_detector = pipeline(
-                model=model_id,
-                task="zero-shot-object-detection",
-                device=device
-            )
-
-            processed_labels = [label if label.endswith(".") else label + "." for label in labels]
-
-            raw_results = object_detector(
-                image,
-                candidate_labels=processed_labels,
-                threshold=threshold
-            )
-
-            return [DetectionResult.from_dict(r) for r in raw_results]
-
-        # Execute the detection in a thread pool
-        results = await loop.run_in_executor(None, _detect_sync)
-        
+        if DETECT_BATCHING:
+            # Concurrent requests with the same labels/threshold share one forward pass
+            results = await detection_batcher.submit((model_id, tuple(labels), threshold), image)
+        else:
+            # Run the heavy computation on the inference pool to avoid blocking
+            results = (await inference_executor.run(detect_batch_sync, [image], labels, threshold, model_id))[0]
+
         debug_log(f"Detection completed: {len(results)} results", logger)
         return results
+    except InferenceRejected:
+        raise
     except Exception as e:
         logger.error("Detection error: %s", str(e))
         raise
@@ -0,0 +1,183 @@
+# app/core/executor.py
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+import numpy as np
+
+from src.app.utils.logger_utils import get_logger
+from src.app.settings.setting import INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, INFERENCE_QUEUE_DEADLINE_S
+
+logger = get_logger(__name__)
+
+
+class InferenceRejected(Exception):
+    """
+    The inference executor did not run a job: its queue was full (429) or the
+    job waited past its deadline (503). retry_after is a hint in seconds.
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Dedicated, bounded thread pool for model inference.
+
+    At most `workers` jobs run at once and at most `max_queue` more wait for a
+    worker; anything beyond that is rejected immediately instead of queueing
+    without limit. A job that has not started within `deadline_s` of being
+    submitted is dropped (a job that already started always runs to completion).
+    The default executor stays free for file I/O, decoding and rendering.
+
+    With a worker pool attached, the threads only dispatch jobs to the
+    inference processes and wait for their results.
+    """
+
+    def __init__(self, workers: int, max_queue: int, deadline_s: float, name: str = "inference"):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.deadline_s = deadline_s
+        self.name = name
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.worker_pool: Optional[Any] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._waits: Deque[float] = deque(maxlen=512)
+        self._service_ewma: Optional[float] = None
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            return self._pool
+
+    def attach(self, worker_pool: Any) -> None:
+        """
+        Send jobs to worker_pool.call(fn, args, route) instead of running them in this process.
+        """
+        with self._lock:
+            self.worker_pool = worker_pool
+            # One dispatching thread per process at least, or processes would sit idle
+            if worker_pool.processes <= self.workers:
+                return
+            self.workers = worker_pool.processes
+            # Requests that came in before the warm-up finished already created a smaller pool:
+            # replace it, jobs already submitted to it still run (and dispatch to the processes)
+            old_pool, self._pool = self._pool, None
+        if old_pool is not None:
+            old_pool.shutdown(wait=False)
+
+    def retry_after(self) -> int:
+        """
+        Seconds until the current backlog should have drained, from the recent mean job time.
+        """
+        service = self._service_ewma if self._service_ewma is not None else 1.0
+        return max(1, math.ceil(service * (self._queued + self._running) / self.workers))
+
+    def _on_done(self, future: Future) -> None:
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def _admit(self) -> None:
+        # Caller holds self._lock
+        if self._queued + self._running >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise InferenceRejected(f"Inference queue is full ({self._queued} waiting)", 429, self.retry_after())
+
+    def check(self) -> None:
+        """
+        Raise InferenceRejected now if a job submitted at this moment would be rejected.
+        For responses (like streams) whose status code is sent before any inference runs.
+        """
+        with self._lock:
+            self._admit()
+
+    async def run(self, fn: Callable[..., Any], *args: Any, route: Optional[Any] = None) -> Any:
+        """
+        Run fn(*args) on the inference pool. Raises InferenceRejected when overloaded.
+        route pins jobs with the same value to the same worker process (when there are processes).
+        """
+        with self._lock:
+            self._admit()
+            self._queued += 1
+        submitted = time.monotonic()
+
+        def job():
+            started = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._waits.append(started - submitted)
+            try:
+                worker_pool = self.worker_pool
+                if worker_pool is not None:
+                    return worker_pool.call(fn, args, route)
+                return fn(*args)
+            finally:
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    self._running -= 1
+                    self.completed += 1
+                    self._service_ewma = elapsed if self._service_ewma is None else 0.8 * self._service_ewma + 0.2 * elapsed
+
+        future = self._get_pool().submit(job)
+        future.add_done_callback(self._on_done)
+        wrapped = asyncio.wrap_future(future)
+        try:
+            if not self.deadline_s:
+                return await wrapped
+            try:
+                return await asyncio.wait_for(asyncio.shield(wrapped), timeout=self.deadline_s)
+            except asyncio.TimeoutError:
+                if not future.cancel():
+                    # Started before the deadline: let it finish
+                    return await wrapped
+                with self._lock:
+                    self.expired += 1
+                raise InferenceRejected(
+                    f"Inference did not start within {self.deadline_s:g}s", 503, self.retry_after()
+                )
+        except asyncio.CancelledError:
+            # The caller went away; drop the job if it has not started yet
+            future.cancel()
+            raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = np.asarray(self._waits) * 1000.0
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "wait_p50_ms": round(float(np.percentile(waits, 50)), 2) if waits.size else 0.0,
+                "wait_p95_ms": round(float(np.percentile(waits, 95)), 2) if waits.size else 0.0,
+                "mean_job_ms": round(self._service_ewma * 1000.0, 2) if self._service_ewma is not None else None,
+                "deadline_s": self.deadline_s
+            }
+
+
+inference_executor = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, INFERENCE_QUEUE_DEADLINE_S)
@@ -0,0 +1,291 @@
+# app/core/model_registry.py
+
+import importlib.util
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from src.app.utils.lazy_import import lazy_module
+from src.app.utils.logger_utils import get_logger, debug_log
+from src.app.core.precision import resolve_precision, apply_precision, inference_context
+from src.app.core.prompt_cache import cache_text_features
+from src.app.settings.setting import (
+    DETECTOR_ID, SEGMENTER_ID, MODEL_MEMORY_BUDGET_MB, DETECTOR_PRECISION, SEGMENTER_PRECISION, INFERENCE_BACKEND
+)
+
+logger = get_logger(__name__)
+
+torch = lazy_module("torch")
+
+DETECTOR = "detector"
+SEGMENTER = "segmenter"
+
+
+def get_device() -> str:
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def module_nbytes(module: "torch.nn.Module") -> int:
+    """
+    Resident size of a module's parameters and buffers in bytes.
+    """
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    # Dynamically quantized layers keep their int8 weights in packed params, not in parameters()
+    for submodule in module.modules():
+        packed = getattr(submodule, "_packed_params", None)
+        if packed is not None and hasattr(packed, "_weight_bias"):
+            for tensor in packed._weight_bias():
+                if tensor is not None:
+                    total += tensor.numel() * tensor.element_size()
+    return total
+
+
+@lru_cache(maxsize=None)
+def inference_backend() -> str:
+    """
+    The runtime models are loaded for: INFERENCE_BACKEND, or "torch" where ONNX Runtime cannot be used.
+    """
+    if INFERENCE_BACKEND not in ("torch", "onnx"):
+        raise ValueError(f"Unknown inference backend {INFERENCE_BACKEND!r}, expected 'torch' or 'onnx'")
+    if INFERENCE_BACKEND == "onnx":
+        missing = [name for name in ("onnx", "onnxruntime") if importlib.util.find_spec(name) is None]
+        if missing:
+            logger.warning("ONNX backend needs %s, using torch", " and ".join(missing))
+            return "torch"
+        if get_device() != "cpu":
+            logger.warning("ONNX backend only runs on CPU, using torch on %s", get_device())
+            return "torch"
+        logger.warning("ONNX backend is experimental: its parity with torch has not been checked on the real models")
+    return INFERENCE_BACKEND
+
+
+def _resolve(kind: str, precision: Optional[str]) -> str:
+    if precision is None:
+        precision = DETECTOR_PRECISION if kind == DETECTOR else SEGMENTER_PRECISION
+    precision = resolve_precision(precision, get_device())
+    # ONNX Runtime has no bf16 autocast; the graphs are exported in fp32
+    if precision == "bf16" and inference_backend() == "onnx":
+        return "fp32"
+    return precision
+
+
+def default_precision(kind: str) -> str:
+    """
+    Configured precision for a model kind, resolved to what this device and backend support.
+    """
+    return _resolve(kind, None)
+
+
+def _load_detector(model_id: str, precision: str) -> Tuple[Any, int]:
+    from transformers.pipelines import pipeline
+
+    object_detector = pipeline(
+        model=model_id,
+        task="zero-shot-object-detection",
+        device=get_device()
+    )
+    object_detector.model.eval()
+    if inference_backend() == "onnx":
+        from src.app.core.onnx_backend import onnx_detector
+
+        object_detector.model = onnx_detector(object_detector, model_id, precision)
+        return object_detector, object_detector.model.nbytes
+    object_detector.model = apply_precision(object_detector.model, precision)
+    # The ONNX graph contains the text encoder, so only the torch model serves it from the cache
+    cache_text_features(object_detector.model, model_id, precision)
+    return object_detector, module_nbytes(object_detector.model)
+
+
+def _load_segmenter(model_id: str, precision: str) -> Tuple[Any, int]:
+    from transformers import AutoModelForMaskGeneration, AutoProcessor
+
+    segmentator = AutoModelForMaskGeneration.from_pretrained(model_id).to(get_device())
+    segmentator.eval()
+    processor = AutoProcessor.from_pretrained(model_id)
+    if inference_backend() == "onnx":
+        from src.app.core.onnx_backend import onnx_sam
+
+        segmentator = onnx_sam(segmentator, model_id, precision)
+        return (segmentator, processor), segmentator.nbytes
+    segmentator = apply_precision(segmentator, precision)
+    return (segmentator, processor), module_nbytes(segmentator)
+
+
+def _warmup_detector(object_detector: Any, precision: str) -> None:
+    image = Image.new("RGB", (64, 64))
+    with inference_context(precision, get_device()):
+        object_detector(image, candidate_labels=["person."], threshold=1.0)
+
+
+def _warmup_segmenter(handle: Tuple[Any, Any], precision: str) -> None:
+    segmentator, processor = handle
+    image = Image.fromarray(np.zeros((64, 64, 3), dtype=np.uint8))
+    inputs = processor(images=image, input_boxes=[[[0, 0, 32, 32]]], return_tensors="pt").to(get_device())
+    with inference_context(precision, get_device()):
+        segmentator(**inputs)
+
+
+@dataclass
+class LoadedModel:
+    kind: str
+    model_id: str
+    precision: str
+    backend: str
+    handle: Any
+    nbytes: int
+    load_seconds: float
+    loaded_at: float
+    warmed: bool = False
+    hits: int = 0
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded detectors and segmenters.
+
+    Each (kind, model_id, precision) is loaded once and kept warm. When the resident
+    size of all models goes over the memory budget, the least recently used
+    models are dropped (the one just requested is always kept).
+    """
+
+    def __init__(self, memory_budget_bytes: int):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._models: "OrderedDict[Tuple[str, str, str], LoadedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._loading: set = set()
+        self._evictions = 0
+        self._loaders: Dict[str, Callable[[str, str], Tuple[Any, int]]] = {
+            DETECTOR: _load_detector,
+            SEGMENTER: _load_segmenter,
+        }
+        self._warmers: Dict[str, Callable[[Any, str], None]] = {
+            DETECTOR: _warmup_detector,
+            SEGMENTER: _warmup_segmenter,
+        }
+
+    def get(self, kind: str, model_id: str, precision: Optional[str] = None) -> Any:
+        precision = _resolve(kind, precision)
+        key = (kind, model_id, precision)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                entry.hits += 1
+                return entry.handle
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given model, the others wait for it
+        with key_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    entry.hits += 1
+                    return entry.handle
+                self._loading.add(key)
+
+            try:
+                debug_log(f"Loading {kind} {model_id} ({precision})", logger)
+                start = time.perf_counter()
+                handle, nbytes = self._loaders[kind](model_id, precision)
+                entry = LoadedModel(
+                    kind=kind,
+                    model_id=model_id,
+                    precision=precision,
+                    backend=inference_backend(),
+                    handle=handle,
+                    nbytes=nbytes,
+                    load_seconds=time.perf_counter() - start,
+                    loaded_at=time.time()
+                )
+                debug_log(f"Loaded {kind} {model_id} ({nbytes / 2**20:.1f} MB) in {entry.load_seconds:.2f}s", logger)
+            finally:
+                with self._lock:
+                    self._loading.discard(key)
+
+            with self._lock:
+                self._models[key] = entry
+                self._evict(keep=key)
+            return handle
+
+    def get_detector(self, detector_id: Optional[str] = None, precision: Optional[str] = None) -> Any:
+        return self.get(DETECTOR, detector_id if detector_id is not None else DETECTOR_ID, precision)
+
+    def get_segmenter(self, segmenter_id: Optional[str] = None, precision: Optional[str] = None) -> Tuple[Any, Any]:
+        return self.get(SEGMENTER, segmenter_id if segmenter_id is not None else SEGMENTER_ID, precision)
+
+    def _evict(self, keep: Tuple[str, str, str]) -> None:
+        evicted = False
+        while self.resident_bytes() > self.memory_budget_bytes and len(self._models) > 1:
+            key = next(k for k in self._models if k != keep)
+            entry = self._models.pop(key)
+            self._evictions += 1
+            evicted = True
+            logger.warning("Evicted %s %s (%.1f MB) to stay under model memory budget", entry.kind, entry.model_id, entry.nbytes / 2**20)
+        if evicted and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def resident_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._models.values())
+
+    def warmup(self, kind: str, model_id: str, precision: Optional[str] = None) -> None:
+        """
+        Run one tiny forward pass so lazy initialisation happens before real traffic.
+        """
+        precision = _resolve(kind, precision)
+        handle = self.get(kind, model_id, precision)
+        self._warmers[kind](handle, precision)
+        with self._lock:
+            entry = self._models.get((kind, model_id, precision))
+            if entry is not None:
+                entry.warmed = True
+
+    def preload(self, models: Optional[List[Tuple[str, str]]] = None, warmup: bool = True) -> None:
+        """
+        Load (and optionally warm up) models, by default the configured detector and segmenter.
+        """
+        if models is None:
+            models = [(DETECTOR, DETECTOR_ID), (SEGMENTER, SEGMENTER_ID)]
+        for kind, model_id in models:
+            if warmup:
+                self.warmup(kind, model_id)
+            else:
+                self.get(kind, model_id)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            models = [
+                {
+                    "kind": entry.kind,
+                    "model_id": entry.model_id,
+                    "precision": entry.precision,
+                    "backend": entry.backend,
+                    "state": "warm" if entry.warmed else "loaded",
+                    "resident_mb": round(entry.nbytes / 2**20, 1),
+                    "load_seconds": round(entry.load_seconds, 2),
+                    "hits": entry.hits
+                }
+                for entry in self._models.values()
+            ]
+            models += [
+                {"kind": kind, "model_id": model_id, "precision": precision, "state": "loading"}
+                for kind, model_id, precision in self._loading
+            ]
+            return {
+                "models": models,
+                "resident_mb": round(self.resident_bytes() / 2**20, 1),
+                "memory_budget_mb": round(self.memory_budget_bytes / 2**20, 1),
+                "evictions": self._evictions
+            }
+
+
+model_registry = ModelRegistry(memory_budget_bytes=MODEL_MEMORY_BUDGET_MB * 2**20)
@@ -0,0 +1,433 @@
+# app/core/onnx_backend.py
+"""
+ONNX Runtime backend for the detector and SAM (experimental).
+
+Models are still loaded with transformers (for the processors, the tokenizer
+and the pipeline's pre/post-processing), exported to ONNX once, cached under
+ONNX_CACHE_DIR, and then run on ONNX Runtime's CPU execution provider behind
+the same call interface the torch modules have, so detect.py and segment.py
+do not change. SAM is exported as two graphs: the image encoder and the
+prompt encoder + mask decoder.
+
+Only imported when INFERENCE_BACKEND is "onnx" (it imports transformers).
+Graph parity with torch is checked by benchmarks/bench_onnx_backend.py, so far
+only on randomly initialized checkpoints; the backend stays experimental
+until it has been run on the real models.
+"""
+
+import hashlib
+import inspect
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+import transformers
+from PIL import Image
+from torch.onnx import symbolic_helper, symbolic_opset9
+from transformers.utils import ModelOutput
+
+from src.app.utils.logger_utils import get_logger, debug_log
+from src.app.settings.setting import ONNX_CACHE_DIR, ONNX_INTRA_OP_THREADS
+
+logger = get_logger(__name__)
+
+OPSET = 17
+
+# The graphs are traced (dynamic_axes); newer torch defaults torch.onnx.export to the dynamo exporter
+_EXPORT_KWARGS = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+_DETECTOR_INPUTS = ["pixel_values", "pixel_mask", "input_ids", "token_type_ids", "attention_mask"]
+
+
+@dataclass
+class DetectorOutput(ModelOutput):
+    logits: Optional[torch.FloatTensor] = None
+    pred_boxes: Optional[torch.FloatTensor] = None
+
+
+@dataclass
+class SamOutput(ModelOutput):
+    iou_scores: Optional[torch.FloatTensor] = None
+    pred_masks: Optional[torch.FloatTensor] = None
+
+
+def graph_path(model_id: str, name: str, precision: str = "fp32") -> str:
+    """
+    Cache location of an exported graph; the transformers/torch versions are part of the
+    directory so an upgrade re-exports instead of reusing a graph traced from older code.
+    """
+    versions = hashlib.sha256(f"{transformers.__version__}:{torch.__version__}:{OPSET}".encode()).hexdigest()[:12]
+    slug = model_id.replace("/", "--")
+    suffix = "" if precision == "fp32" else f".{precision}"
+    return os.path.join(ONNX_CACHE_DIR, slug, versions, f"{name}{suffix}.onnx")
+
+
+def _atomic_export(path: str, export) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".onnx.tmp")
+    os.close(fd)
+    try:
+        export(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _quantized(path: str, model_id: str, name: str, precision: str) -> str:
+    """
+    The graph at path, dynamically quantized to int8 weights for the int8 profile (cached too).
+    """
+    if precision != "int8":
+        return path
+    target = graph_path(model_id, name, precision)
+    if not os.path.exists(target):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        debug_log(f"Quantizing {name} graph of {model_id} to int8", logger)
+        _atomic_export(target, lambda tmp: quantize_dynamic(path, tmp, weight_type=QuantType.QInt8))
+    return target
+
+
+class OnnxSession:
+    """
+    An ONNX Runtime session created on first use in each process.
+
+    ORT's thread pool does not survive fork, so sessions built before the
+    inference workers are forked would hang in the children.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    import onnxruntime as ort
+
+                    options = ort.SessionOptions()
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    # The arena grows in power-of-two steps and never shrinks: with dynamic input
+                    # sizes the SAM encoder went past 5 GB on its second run, without it stays under 4 GB
+                    options.enable_cpu_mem_arena = False
+                    threads = ONNX_INTRA_OP_THREADS or (
+                        len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else 0
+                    )
+                    options.intra_op_num_threads = threads
+                    self._session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+                    self._pid = os.getpid()
+        return self._session
+
+    @property
+    def input_names(self) -> List[str]:
+        return [i.name for i in self.session.get_inputs()]
+
+    def run(self, feeds: Dict[str, np.ndarray]) -> List[np.ndarray]:
+        return self.session.run(None, feeds)
+
+    @property
+    def nbytes(self) -> int:
+        return os.path.getsize(self.path)
+
+
+def _numpy(tensor: torch.Tensor) -> np.ndarray:
+    array = tensor.detach().cpu()
+    return (array.float() if array.is_floating_point() else array).numpy()
+
+
+def _isin_symbolic(g, elements, test_elements, assume_unique, invert):
+    # elements[..., None] == test_elements.flatten(), reduced with "any" over the last axis
+    flat = g.op("Reshape", test_elements, g.op("Constant", value_t=torch.tensor([-1])))
+    equal = g.op("Equal", g.op("Unsqueeze", elements, g.op("Constant", value_t=torch.tensor([-1]))), flat)
+    found = g.op("ReduceMax", g.op("Cast", equal, to_i=6), axes_i=[-1], keepdims_i=0)
+    found = g.op("Cast", found, to_i=9)
+    return g.op("Not", found) if symbolic_helper._maybe_get_const(invert, "b") else found
+
+
+def _cumulative_symbolic(reduce: str):
+    def symbolic(g, self, dim):
+        # values[..., i] = reduce(self[..., :i + 1]) over an (N, N) lower-triangular mask along dim
+        rank = symbolic_helper._get_tensor_rank(self)
+        dim = symbolic_helper._get_const(dim, "i", "dim") % rank
+        perm = [axis for axis in range(rank) if axis != dim] + [dim]
+        inverse = [perm.index(axis) for axis in range(rank)]
+        x = g.op("Transpose", self, perm_i=perm) if dim != rank - 1 else self
+
+        def constant(value):
+            return g.op("Constant", value_t=torch.tensor(value))
+
+        length = g.op("Gather", g.op("Shape", x), constant(-1), axis_i=0)
+        positions = g.op("Range", constant(0), length, constant(1))
+        # keep[i, j] = j <= i
+        keep = g.op("LessOrEqual", g.op("Unsqueeze", positions, constant([0])), g.op("Unsqueeze", positions, constant([1])))
+        rows = g.op("Unsqueeze", x, constant([-2]))
+        # Masked entries repeat self[..., 0], which every prefix already contains
+        first = g.op("Unsqueeze", g.op("Gather", x, constant(0), axis_i=-1), constant([-1, -2]))
+        values = g.op(reduce, g.op("Where", keep, rows, first), axes_i=[-1], keepdims_i=0)
+        # Like torch, the index of the last occurrence of the value within the prefix
+        hit = g.op("And", keep, g.op("Equal", rows, g.op("Unsqueeze", values, constant([-1]))))
+        indices = g.op("ReduceMax", g.op("Where", hit, positions, constant(-1)), axes_i=[-1], keepdims_i=0)
+        if dim != rank - 1:
+            values = g.op("Transpose", values, perm_i=inverse)
+            indices = g.op("Transpose", indices, perm_i=inverse)
+        return values, indices
+
+    return symbolic
+
+
+def _eye_symbolic(g, *args):
+    # aten::eye(n, [m,] dtype, layout, device, pin_memory): i == j, cast like zeros of dtype;
+    # the default symbolic's EyeLike has no bool kernel in onnxruntime
+    n, m = args[0], args[1] if len(args) == 6 else args[0]
+    dtype, layout, device = args[-4:-1]
+
+    def constant(value):
+        return g.op("Constant", value_t=torch.tensor(value))
+
+    rows = g.op("Range", constant(0), n, constant(1))
+    columns = g.op("Range", constant(0), m, constant(1))
+    eye = g.op("Equal", g.op("Unsqueeze", rows, constant([1])), g.op("Unsqueeze", columns, constant([0])))
+    return g.op("CastLike", eye, symbolic_opset9.zeros(g, constant([1]), dtype, layout, device))
+
+
+_symbolics_registered = False
+
+
+def _register_symbolics() -> None:
+    """
+    ONNX symbolics for ops the traced exporter lacks at OPSET: Grounding DINO finds its
+    special and delimiter tokens with torch.isin (Equal + ReduceMax instead) and builds its
+    text attention mask with torch.cummax / torch.cummin (masked ReduceMax / ReduceMin)
+    and a boolean torch.eye, whose EyeLike onnxruntime cannot run (Range + Equal instead).
+    """
+    global _symbolics_registered
+    if not _symbolics_registered:
+        torch.onnx.register_custom_op_symbolic("aten::isin", _isin_symbolic, OPSET)
+        torch.onnx.register_custom_op_symbolic("aten::cummax", _cumulative_symbolic("ReduceMax"), OPSET)
+        torch.onnx.register_custom_op_symbolic("aten::cummin", _cumulative_symbolic("ReduceMin"), OPSET)
+        torch.onnx.register_custom_op_symbolic("aten::eye", _eye_symbolic, OPSET)
+        _symbolics_registered = True
+
+
+class _DetectorGraph(torch.nn.Module):
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values, pixel_mask, input_ids, token_type_ids, attention_mask):
+        outputs = self.model(
+            pixel_values=pixel_values,
+            pixel_mask=pixel_mask,
+            input_ids=input_ids,
+            token_type_ids=token_type_ids,
+            attention_mask=attention_mask,
+            return_dict=True
+        )
+        return outputs.logits, outputs.pred_boxes
+
+
+def _backbone_stride(config: Any) -> int:
+    """
+    Multiple the detector's pixel inputs are padded to. Swin pads odd-sized feature maps
+    in Python branches, which the trace freezes at the export size; inputs padded to the
+    backbone's total stride never take them.
+    """
+    backbone = getattr(config, "backbone_config", None)
+    depths = getattr(backbone, "depths", None)
+    if not depths:
+        return 1
+    patch = backbone.patch_size if isinstance(backbone.patch_size, int) else backbone.patch_size[0]
+    return patch * 2 ** (len(depths) - 1)
+
+
+def _pad_pixels(inputs: Dict[str, Any], stride: int) -> Dict[str, Any]:
+    # Bottom/right padding is masked out, like the processor's own batch padding
+    height, width = inputs["pixel_values"].shape[-2:]
+    bottom, right = -height % stride, -width % stride
+    if not (bottom or right):
+        return inputs
+    return {
+        **inputs,
+        "pixel_values": torch.nn.functional.pad(inputs["pixel_values"], (0, right, 0, bottom)),
+        "pixel_mask": torch.nn.functional.pad(inputs["pixel_mask"], (0, right, 0, bottom))
+    }
+
+
+class OnnxDetector:
+    """
+    Stands in for the pipeline's torch model: model(**inputs) returns logits and pred_boxes.
+    """
+
+    def __init__(self, session: OnnxSession, config: Any):
+        self.session = session
+        self.config = config
+        self.device = torch.device("cpu")
+        self.dtype = torch.float32
+        self.stride = _backbone_stride(config)
+
+    def eval(self) -> "OnnxDetector":
+        return self
+
+    def __call__(self, **inputs: Any) -> DetectorOutput:
+        inputs = _pad_pixels(inputs, self.stride)
+        feeds = {name: _numpy(inputs[name]) for name in self.session.input_names if name in inputs}
+        logits, pred_boxes = self.session.run(feeds)
+        return DetectorOutput(logits=torch.from_numpy(logits), pred_boxes=torch.from_numpy(pred_boxes))
+
+    @property
+    def nbytes(self) -> int:
+        return self.session.nbytes
+
+
+def onnx_detector(object_detector: Any, model_id: str, precision: str = "fp32") -> OnnxDetector:
+    """
+    Export the pipeline's model (once) and return its ONNX Runtime replacement.
+    """
+    path = graph_path(model_id, "detector")
+    if not os.path.exists(path):
+        debug_log(f"Exporting detector {model_id} to ONNX", logger)
+        example = next(iter(object_detector.preprocess({"image": Image.new("RGB", (800, 600)), "candidate_labels": ["person."]})))
+        example = _pad_pixels(example, _backbone_stride(object_detector.model.config))
+        inputs = tuple(example[name] for name in _DETECTOR_INPUTS)
+        graph = _DetectorGraph(object_detector.model).eval()
+
+        def export(tmp: str) -> None:
+            _register_symbolics()
+            # Tracing does not accept inference-mode tensors, so only autograd is disabled
+            with torch.no_grad():
+                torch.onnx.export(
+                    graph, inputs, tmp,
+                    input_names=_DETECTOR_INPUTS,
+                    output_names=["logits", "pred_boxes"],
+                    dynamic_axes={
+                        "pixel_values": {0: "batch", 2: "height", 3: "width"},
+                        "pixel_mask": {0: "batch", 1: "height", 2: "width"},
+                        "input_ids": {0: "batch", 1: "sequence"},
+                        "token_type_ids": {0: "batch", 1: "sequence"},
+                        "attention_mask": {0: "batch", 1: "sequence"},
+                        "logits": {0: "batch"},
+                        "pred_boxes": {0: "batch"}
+                    },
+                    opset_version=OPSET,
+                    **_EXPORT_KWARGS
+                )
+
+        _atomic_export(path, export)
+    return OnnxDetector(OnnxSession(_quantized(path, model_id, "detector", precision)), object_detector.model.config)
+
+
+class _SamEncoderGraph(torch.nn.Module):
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model.get_image_embeddings(pixel_values)
+
+
+class _SamDecoderGraph(torch.nn.Module):
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image_embeddings, input_boxes):
+        outputs = self.model(image_embeddings=image_embeddings, input_boxes=input_boxes, multimask_output=True)
+        return outputs.iou_scores, outputs.pred_masks
+
+
+class OnnxSam:
+    """
+    Stands in for SamModel: get_image_embeddings() runs the encoder graph and
+    calling it runs the prompt encoder + mask decoder graph (multimask output, box prompts).
+    """
+
+    def __init__(self, encoder: OnnxSession, decoder: OnnxSession, config: Any):
+        self.encoder = encoder
+        self.decoder = decoder
+        self.config = config
+        self.device = torch.device("cpu")
+        self.dtype = torch.float32
+
+    def eval(self) -> "OnnxSam":
+        return self
+
+    def get_image_embeddings(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        return torch.from_numpy(self.encoder.run({"pixel_values": _numpy(pixel_values)})[0])
+
+    def __call__(
+        self,
+        pixel_values: Optional[torch.Tensor] = None,
+        input_boxes: Optional[torch.Tensor] = None,
+        image_embeddings: Optional[torch.Tensor] = None,
+        multimask_output: bool = True,
+        **_: Any
+    ) -> SamOutput:
+        if not multimask_output:
+            raise ValueError("The exported SAM decoder always returns multimask output")
+        if image_embeddings is None:
+            image_embeddings = self.get_image_embeddings(pixel_values)
+        iou_scores, pred_masks = self.decoder.run({
+            "image_embeddings": _numpy(image_embeddings),
+            "input_boxes": _numpy(input_boxes)
+        })
+        return SamOutput(iou_scores=torch.from_numpy(iou_scores), pred_masks=torch.from_numpy(pred_masks))
+
+    @property
+    def nbytes(self) -> int:
+        return self.encoder.nbytes + self.decoder.nbytes
+
+
+def onnx_sam(segmentator: torch.nn.Module, model_id: str, precision: str = "fp32") -> OnnxSam:
+    """
+    Export SAM's encoder and decoder (once) and return their ONNX Runtime replacement.
+    """
+    encoder_path = graph_path(model_id, "sam_encoder")
+    decoder_path = graph_path(model_id, "sam_decoder")
+    if not os.path.exists(encoder_path) or not os.path.exists(decoder_path):
+        debug_log(f"Exporting segmenter {model_id} to ONNX", logger)
+        pixel_values = torch.zeros(1, 3, 1024, 1024)
+        with torch.no_grad():
+            image_embeddings = segmentator.get_image_embeddings(pixel_values)
+        input_boxes = torch.tensor([[[0.0, 0.0, 512.0, 512.0], [256.0, 256.0, 768.0, 768.0]]])
+
+        def export_encoder(tmp: str) -> None:
+            with torch.no_grad():
+                torch.onnx.export(
+                    _SamEncoderGraph(segmentator).eval(), (pixel_values,), tmp,
+                    input_names=["pixel_values"],
+                    output_names=["image_embeddings"],
+                    opset_version=OPSET,
+                    **_EXPORT_KWARGS
+                )
+
+        def export_decoder(tmp: str) -> None:
+            with torch.no_grad():
+                torch.onnx.export(
+                    _SamDecoderGraph(segmentator).eval(), (image_embeddings, input_boxes), tmp,
+                    input_names=["image_embeddings", "input_boxes"],
+                    output_names=["iou_scores", "pred_masks"],
+                    dynamic_axes={
+                        "input_boxes": {1: "boxes"},
+                        "iou_scores": {1: "boxes"},
+                        "pred_masks": {1: "boxes"}
+                    },
+                    opset_version=OPSET,
+                    **_EXPORT_KWARGS
+                )
+
+        _atomic_export(encoder_path, export_encoder)
+        _atomic_export(decoder_path, export_decoder)
+    return OnnxSam(
+        OnnxSession(_quantized(encoder_path, model_id, "sam_encoder", precision)),
+        OnnxSession(_quantized(decoder_path, model_id, "sam_decoder", precision)),
+        segmentator.config
+    )
@@ -0,0 +1,64 @@
+# app/core/precision.py
+
+import contextlib
+from functools import lru_cache
+from typing import Any, Iterator
+
+from src.app.utils.lazy_import import lazy_module
+from src.app.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+torch = lazy_module("torch")
+
+# fp32: as trained; bf16: matmuls/convolutions autocast to bfloat16 (weights stay fp32);
+# int8: nn.Linear layers dynamically quantized to int8 (CPU only)
+PRECISIONS = ("fp32", "bf16", "int8")
+
+
+def bf16_supported(device: str) -> bool:
+    if device == "cuda":
+        return torch.cuda.is_bf16_supported()
+    try:
+        # True on CPUs with native bf16 (AVX512-BF16 / AMX); elsewhere autocast would only emulate it
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+@lru_cache(maxsize=None)
+def resolve_precision(precision: str, device: str) -> str:
+    """
+    The precision a model will actually run at on this device: unsupported profiles fall back to fp32.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {', '.join(PRECISIONS)}")
+    if precision == "bf16" and not bf16_supported(device):
+        logger.warning("bf16 is not supported on this %s, using fp32", device)
+        return "fp32"
+    if precision == "int8" and device != "cpu":
+        logger.warning("Dynamic int8 quantization only runs on CPU, using fp32 on %s", device)
+        return "fp32"
+    return precision
+
+
+def apply_precision(model: "torch.nn.Module", precision: str) -> "torch.nn.Module":
+    """
+    Convert a loaded (eval-mode) model for a resolved precision; fp32 and bf16 leave the weights as they are.
+    """
+    if precision == "int8":
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+@contextlib.contextmanager
+def inference_context(precision: str, device: str) -> Iterator[Any]:
+    """
+    No autograd bookkeeping, plus bf16 autocast for the bf16 profile.
+    """
+    with torch.inference_mode():
+        if precision == "bf16":
+            with torch.autocast(device_type=device, dtype=torch.bfloat16):
+                yield
+        else:
+            yield
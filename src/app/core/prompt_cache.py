@@ -0,0 +1,126 @@
+# app/core/prompt_cache.py
+
+import hashlib
+from typing import Any, Dict, Optional
+
+from src.app.utils.lru_cache import ByteLRUCache
+from src.app.utils.lazy_import import lazy_module
+from src.app.utils.logger_utils import get_logger, debug_log
+from src.app.settings.setting import TEXT_PROMPT_CACHE_MB
+
+logger = get_logger(__name__)
+
+torch = lazy_module("torch")
+
+
+def _tensors_nbytes(tensors: Any) -> int:
+    if isinstance(tensors, dict):
+        return sum(t.numel() * t.element_size() for t in tensors.values() if isinstance(t, torch.Tensor))
+    return tensors.numel() * tensors.element_size()
+
+
+# (model_id, label) -> tokenizer output for that label
+token_cache = ByteLRUCache(
+    max_bytes=TEXT_PROMPT_CACHE_MB * 2**20 // 4,
+    sizeof=_tensors_nbytes,
+    name="text_tokens"
+)
+
+# (model_id, precision, digest of one row of text encoder inputs) -> that row's text features
+text_feature_cache = ByteLRUCache(
+    max_bytes=TEXT_PROMPT_CACHE_MB * 2**20 - token_cache.max_bytes,
+    sizeof=_tensors_nbytes,
+    name="text_features"
+)
+
+
+def tokenize(object_detector: Any, model_id: str, label: str) -> Dict[str, "torch.Tensor"]:
+    """
+    Tokenizer output for one candidate label, as the pipeline's preprocess would produce it.
+    """
+    key = (model_id, label)
+    tokens = token_cache.get(key)
+    if tokens is None:
+        tokens = dict(object_detector.tokenizer(label, return_tensors="pt"))
+        token_cache.put(key, tokens)
+    return tokens
+
+
+def _row_digest(*tensors: Optional["torch.Tensor"]) -> str:
+    digest = hashlib.sha1()
+    for tensor in tensors:
+        if tensor is None:
+            digest.update(b"-")
+        else:
+            digest.update(str(tuple(tensor.shape)).encode())
+            digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cache_text_features(model: Any, model_id: str, precision: str) -> None:
+    """
+    Serve the detector's text encoder from text_feature_cache.
+
+    Grounding DINO encodes the prompt with a BERT text backbone that never
+    sees the image, so its output for a given label (token ids, attention
+    mask and position ids) can be reused across images; the image backbone
+    and the text-image fusion layers still run on every call. Rows of a
+    batch are looked up one by one and only the missing ones are encoded.
+    Models without a separate text backbone are left as they are.
+    """
+    backbone = getattr(getattr(model, "model", None), "text_backbone", None)
+    if backbone is None:
+        debug_log(f"{model_id} has no text backbone to cache", logger)
+        return
+    encode = backbone.forward
+
+    def forward(input_ids, attention_mask=None, token_type_ids=None, position_ids=None, *args, return_dict=None, **kwargs):
+        if args or kwargs:
+            return encode(input_ids, attention_mask, token_type_ids, position_ids, *args, return_dict=return_dict, **kwargs)
+
+        def row(tensor, i):
+            return tensor[i:i + 1] if tensor is not None else None
+
+        keys = [
+            (model_id, precision, _row_digest(
+                row(input_ids, i), row(attention_mask, i), row(token_type_ids, i), row(position_ids, i)
+            ))
+            for i in range(input_ids.shape[0])
+        ]
+        rows = [text_feature_cache.get(key) for key in keys]
+        # A batch usually repeats one label for every image: encode each distinct missing row once
+        missing: Dict[Any, int] = {}
+        for i, key in enumerate(keys):
+            if rows[i] is None:
+                missing.setdefault(key, i)
+        if missing:
+            index = torch.tensor(list(missing.values()), device=input_ids.device)
+
+            def select(tensor):
+                return tensor.index_select(0, index) if tensor is not None else None
+
+            outputs = encode(
+                select(input_ids), select(attention_mask), select(token_type_ids), select(position_ids),
+                return_dict=True
+            )
+            encoded = {}
+            for j, key in enumerate(missing):
+                encoded[key] = outputs.last_hidden_state[j:j + 1].clone()
+                text_feature_cache.put(key, encoded[key])
+            rows = [features if features is not None else encoded[key] for features, key in zip(rows, keys)]
+
+        from transformers.modeling_outputs import BaseModelOutput
+
+        last_hidden_state = torch.cat(rows, dim=0)
+        if return_dict is False:
+            return (last_hidden_state,)
+        return BaseModelOutput(last_hidden_state=last_hidden_state)
+
+    backbone.forward = forward
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "tokens": token_cache.stats(),
+        "text_features": text_feature_cache.stats()
+    }
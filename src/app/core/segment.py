@@ -1,55 +1,279 @@
 # app/core/segment.py
 
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from PIL import Image
-import torch
 import asyncio
-from transformers import AutoModelForMaskGeneration, AutoProcessor
 
-from app.utils.image_ops import refine_masks
-from app.utils.image_ops import get_boxes
+from app.utils.image_ops import refine_masks, refine_low_res_masks, refine_polygons
+from app.utils.image_ops import get_boxes, image_digest
 from app.utils.results import DetectionResult
-from app.settings.setting import SEGMENTER_ID
+from app.utils.compact_mask import CompactMask
+from app.settings.setting import (
+    SEGMENTER_ID, SAM_EMBEDDING_CACHE_MB, REPROMPT_IMAGE_CACHE_MB, MASK_POSTPROCESS, POLYGON_SIMPLIFY_TOLERANCE
+)
+from src.app.core.model_registry import model_registry, get_device, default_precision, SEGMENTER
+from src.app.core.precision import inference_context
+from src.app.core.executor import inference_executor
+from src.app.utils.lru_cache import ByteLRUCache
+from src.app.utils.lazy_import import lazy_module
+
+torch = lazy_module("torch")
+
+@dataclass
+class ImageEmbedding:
+    """
+    Output of the SAM vision encoder for one image, plus the sizes needed to place masks back on it.
+    """
+    embeddings: "torch.Tensor"
+    original_size: Tuple[int, int]
+    reshaped_input_size: Tuple[int, int]
+
+    @property
+    def nbytes(self) -> int:
+        return self.embeddings.numel() * self.embeddings.element_size()
+
+embedding_cache = ByteLRUCache(
+    max_bytes=SAM_EMBEDDING_CACHE_MB * 2**20,
+    sizeof=lambda entry: entry.nbytes,
+    name="sam_embeddings"
+)
+
+@dataclass
+class RepromptSource:
+    """
+    The (downscaled) image an earlier /detect ran inference on and the original size its boxes refer to.
+    """
+    image: Image.Image
+    original_size: Tuple[int, int]
+
+    @property
+    def nbytes(self) -> int:
+        return self.image.width * self.image.height * len(self.image.getbands())
+
+# Kept by image key so a re-prompt can re-encode an image SAM never saw or whose embedding was evicted
+reprompt_images = ByteLRUCache(
+    max_bytes=REPROMPT_IMAGE_CACHE_MB * 2**20,
+    sizeof=lambda entry: entry.nbytes,
+    name="reprompt_images"
+)
+
+def remember_image(image_key: str, image: Image.Image, original_size: Tuple[int, int]) -> None:
+    """
+    Make image_key re-promptable: store the inference-size image and the original (width, height).
+    """
+    reprompt_images.put(image_key, RepromptSource(image, original_size))
+
+def _scale_boxes(boxes: List[List[float]], embedding: ImageEmbedding) -> "torch.Tensor":
+    """
+    Map xyxy boxes from original image coordinates to the resized SAM input, like SamProcessor does.
+    """
+    old_h, old_w = embedding.original_size
+    new_h, new_w = embedding.reshaped_input_size
+    scale = torch.tensor([new_w / old_w, new_h / old_h, new_w / old_w, new_h / old_h], dtype=torch.float32)
+    return torch.tensor([boxes], dtype=torch.float32) * scale
+
+def get_image_embedding(
+    image: Image.Image,
+    model_id: str,
+    image_key: Optional[str] = None,
+    original_size: Optional[Tuple[int, int]] = None
+) -> Tuple[str, ImageEmbedding]:
+    """
+    Return the SAM image embedding for an image, running the vision encoder only on a cache miss.
+
+    original_size (width, height) is the frame boxes and masks live in when
+    image is a downscaled copy: the encoder sees the copy, but boxes are mapped
+    from, and masks upsampled straight to, the original size.
+    """
+    image_key = image_key if image_key is not None else image_digest(image)
+    embedding = embedding_cache.get((model_id, image_key))
+    if embedding is None:
+        segmentator, processor = model_registry.get_segmenter(model_id)
+        inputs = processor(images=image, return_tensors="pt").to(get_device())
+        with inference_context(default_precision(SEGMENTER), get_device()):
+            embeddings = segmentator.get_image_embeddings(inputs["pixel_values"])
+        embedding = ImageEmbedding(
+            embeddings=embeddings,
+            original_size=(
+                (original_size[1], original_size[0]) if original_size is not None
+                else tuple(int(v) for v in inputs["original_sizes"][0])
+            ),
+            reshaped_input_size=tuple(int(v) for v in inputs["reshaped_input_sizes"][0])
+        )
+        embedding_cache.put((model_id, image_key), embedding)
+    return image_key, embedding
+
+def predict_low_res_masks(embedding: ImageEmbedding, boxes: List[List[float]], model_id: str) -> "torch.Tensor":
+    """
+    Run only the SAM prompt encoder + mask decoder for a set of xyxy boxes.
+    Returns the low-res mask logits, [n_boxes, 3, 256, 256].
+    """
+    segmentator, _ = model_registry.get_segmenter(model_id)
+    device = get_device()
+    with inference_context(default_precision(SEGMENTER), device):
+        outputs = segmentator(
+            image_embeddings=embedding.embeddings,
+            input_boxes=_scale_boxes(boxes, embedding).to(device),
+            multimask_output=True
+        )
+    # Mask post-processing runs in fp32 whatever precision the decoder used
+    return outputs.pred_masks[0].float()
+
+def postprocess_masks(
+    low_res_masks: "torch.Tensor",
+    embedding: ImageEmbedding,
+    model_id: str,
+    polygon_refinement: bool = False
+) -> List[CompactMask]:
+    """
+    Turn low-res logits into compact masks at the original image size.
+    MASK_POSTPROCESS "lowres" resamples only each mask's window; "full" upsamples whole frames first.
+    """
+    _, processor = model_registry.get_segmenter(model_id)
+    if MASK_POSTPROCESS == "lowres":
+        pad_size = getattr(processor.image_processor, "pad_size", None) or {"height": 1024, "width": 1024}
+        return refine_low_res_masks(
+            low_res_masks,
+            original_size=embedding.original_size,
+            reshaped_input_size=embedding.reshaped_input_size,
+            pad_size=(pad_size["height"], pad_size["width"]),
+            polygon_refinement=polygon_refinement
+        )
+    masks = processor.post_process_masks(
+        masks=low_res_masks[None],
+        original_sizes=torch.tensor([embedding.original_size]),
+        reshaped_input_sizes=torch.tensor([embedding.reshaped_input_size])
+    )[0]
+    return refine_masks(masks, polygon_refinement)
+
+Polygon = List[List[int]]
+
+def refine_stage(
+    masks: List[CompactMask],
+    polygon_refinement: bool = False
+) -> Tuple[List[CompactMask], List[Optional[Polygon]]]:
+    """
+    Polygon refinement of decoded masks on the refinement worker pool.
+    Without refinement the masks pass through and no polygons are produced.
+    """
+    if not polygon_refinement:
+        return masks, [None] * len(masks)
+    return refine_polygons(masks, POLYGON_SIMPLIFY_TOLERANCE)
+
+def decode_masks(
+    embedding: ImageEmbedding,
+    boxes: List[List[float]],
+    model_id: str,
+    polygon_refinement: bool = False
+) -> Tuple[List[CompactMask], List[Optional[Polygon]]]:
+    masks = postprocess_masks(predict_low_res_masks(embedding, boxes, model_id), embedding, model_id)
+    return refine_stage(masks, polygon_refinement)
+
+def segment_boxes(
+    image: Image.Image,
+    boxes: List[List[float]],
+    model_id: str,
+    polygon_refinement: bool = False,
+    image_key: Optional[str] = None,
+    original_size: Optional[Tuple[int, int]] = None
+) -> Tuple[List[CompactMask], List[Optional[Polygon]]]:
+    _, embedding = get_image_embedding(image, model_id, image_key, original_size)
+    return decode_masks(embedding, boxes, model_id, polygon_refinement)
+
+def reprompt_boxes(
+    image_key: str,
+    boxes: List[List[float]],
+    model_id: str,
+    polygon_refinement: bool = False,
+    source: Optional[RepromptSource] = None
+) -> Tuple[Tuple[int, int], List[CompactMask], List[Optional[Polygon]]]:
+    embedding = embedding_cache.get((model_id, image_key))
+    if embedding is None:
+        if source is None:
+            raise KeyError(image_key)
+        # SAM was skipped for this image (cached result, no person, boxes only) or the embedding was evicted
+        _, embedding = get_image_embedding(source.image, model_id, image_key, source.original_size)
+    masks, polygons = decode_masks(embedding, boxes, model_id, polygon_refinement)
+    return embedding.original_size, masks, polygons
 
 async def segment(
     image: Image.Image,
     detection_results: List[DetectionResult],
     polygon_refinement: bool = False,
-    segmenter_id: Optional[str] = None
+    segmenter_id: Optional[str] = None,
+    image_key: Optional[str] = None,
+    original_size: Optional[Tuple[int, int]] = None
 ) -> List[DetectionResult]:
     """
     Use Segment Anything (SAM) to generate masks given an image + a set of bounding boxes.
+    The image embedding is cached by content hash (image_key), so re-segmenting
+    the same image only runs the mask decoder. When image is a downscaled copy,
+    boxes and masks are in original_size coordinates (see get_image_embedding).
     """
-    device = "cuda" if torch.cuda.is_available() else "cpu"
     model_id = segmenter_id if segmenter_id is not None else SEGMENTER_ID
+    boxes = get_boxes(detection_results)[0]
 
-    # Run the heavy computation in a thread pool to avoid blocking
+    # Execute the segmentation on the inference pool; routing by image_key keeps
+    # a worker process's embedding cache warm for this image
+    masks, polygons = await inference_executor.run(
+        segment_boxes, image, boxes, model_id, polygon_refinement, image_key, original_size, route=image_key
+    )
+    for detection_result, mask, polygon in zip(detection_results, masks, polygons):
+        detection_result.mask = mask
+        detection_result.polygon = polygon
+    return detection_results
+
+async def iter_segment(
+    image: Image.Image,
+    detection_results: List[DetectionResult],
+    polygon_refinement: bool = False,
+    segmenter_id: Optional[str] = None,
+    image_key: Optional[str] = None,
+    original_size: Optional[Tuple[int, int]] = None
+) -> AsyncIterator[Tuple[int, DetectionResult]]:
+    """
+    Like segment(), but yields (index, detection) as soon as each mask is refined.
+    With inference worker processes the masks are decoded together in a worker and then yielded.
+    """
+    model_id = segmenter_id if segmenter_id is not None else SEGMENTER_ID
+    if not detection_results:
+        return
+    if inference_executor.worker_pool is not None:
+        await segment(image, detection_results, polygon_refinement, model_id, image_key, original_size)
+        for idx, detection_result in enumerate(detection_results):
+            yield idx, detection_result
+        return
     loop = asyncio.get_event_loop()
-    
-    def _segment_sync():
-        segmentator = AutoModelForMaskGeneration.from_pretrained(model_id).to(device)
-        processor = AutoProcessor.from_pretrained(model_id)
-
-        boxes = get_boxes(detection_results)
-        inputs = processor(
-            images=image,
-            input_boxes=boxes,
-            return_tensors="pt"
-        ).to(device)
-
-        outputs = segmentator(**inputs)
-        masks = processor.post_process_masks(
-            masks=outputs.pred_masks,
-            original_sizes=inputs.original_sizes,
-            reshaped_input_sizes=inputs.reshaped_input_sizes
-        )[0]
-
-        masks = refine_masks(masks, polygon_refinement)
-
-        for detection_result, mask in zip(detection_results, masks):
-            detection_result.mask = mask
-
-        return detection_results
-
-    # Execute the segmentation in a thread pool
-    return await loop.run_in_executor(None, _segment_sync)
+
+    def _predict_sync():
+        _, embedding = get_image_embedding(image, model_id, image_key, original_size)
+        return embedding, predict_low_res_masks(embedding, get_boxes(detection_results)[0], model_id)
+
+    def _postprocess_sync(idx: int):
+        masks = postprocess_masks(low_res_masks[idx:idx + 1], embedding, model_id)
+        return refine_stage(masks, polygon_refinement)
+
+    embedding, low_res_masks = await inference_executor.run(_predict_sync)
+    for idx, detection_result in enumerate(detection_results):
+        masks, polygons = await loop.run_in_executor(None, _postprocess_sync, idx)
+        detection_result.mask, detection_result.polygon = masks[0], polygons[0]
+        yield idx, detection_result
+
+async def reprompt(
+    image_key: str,
+    boxes: List[List[float]],
+    polygon_refinement: bool = False,
+    segmenter_id: Optional[str] = None
+) -> Tuple[Tuple[int, int], List[CompactMask], List[Optional[Polygon]]]:
+    """
+    Segment new boxes on a previously seen image using its cached embedding, or
+    by encoding the image remembered for it when there is no embedding.
+    Returns the image size, the masks and their refined polygons (None without refinement).
+    Raises KeyError if neither the embedding nor the image is (still) cached.
+    """
+    model_id = segmenter_id if segmenter_id is not None else SEGMENTER_ID
+    source = reprompt_images.get(image_key)
+    return await inference_executor.run(
+        reprompt_boxes, image_key, boxes, model_id, polygon_refinement, source, route=image_key
+    )
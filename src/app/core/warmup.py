@@ -0,0 +1,92 @@
+# app/core/warmup.py
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from src.app.core.model_registry import model_registry
+from src.app.core.executor import inference_executor
+from src.app.core.worker_pool import WorkerPool, worker_pool
+from src.app.utils.lazy_import import import_modules
+from src.app.utils.logger_utils import get_logger, debug_log
+from src.app.settings.setting import PRELOAD_MODELS, WARMUP_MODELS
+
+logger = get_logger(__name__)
+
+# Imported in the background after startup instead of at import time
+HEAVY_MODULES = ["torch", "transformers", "cv2"]
+
+
+class Warmup:
+    """
+    Background start-up work: heavy imports, then loading (and warming) the default models,
+    or starting the inference worker processes when there are any.
+
+    The app serves /status as soon as it is imported; this reports when the
+    expensive parts are done so load balancers can hold traffic until ready.
+    """
+
+    def __init__(self, modules: List[str], preload: bool, warmup_models: bool, workers: Optional[WorkerPool] = None):
+        self.modules = modules
+        self.preload = preload
+        self.warmup_models = warmup_models
+        self.workers = workers
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.steps: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("ready", "failed")
+
+    def run(self) -> None:
+        self.state = "running"
+        try:
+            start = time.perf_counter()
+            failed = import_modules(self.modules)
+            if failed:
+                logger.warning("Warm-up could not import: %s", ", ".join(failed))
+            self.steps["imports"] = time.perf_counter() - start
+            if self.workers is not None:
+                # Start the fork server (which loads the weights), fork the inference processes from it
+                # (they warm up themselves), then route jobs to them
+                start = time.perf_counter()
+                self.workers.start(preload=True)
+                inference_executor.attach(self.workers)
+                self.steps["workers"] = time.perf_counter() - start
+            elif self.preload:
+                start = time.perf_counter()
+                model_registry.preload(None, self.warmup_models)
+                self.steps["models"] = time.perf_counter() - start
+            self.state = "ready"
+            debug_log(f"Warm-up finished in {sum(self.steps.values()):.2f}s", logger)
+        except Exception as e:
+            logger.error("Warm-up failed: %s", str(e))
+            self.error = str(e)
+            self.state = "failed"
+
+    def start(self) -> None:
+        """
+        Run the warm-up in a worker thread without blocking the event loop.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(asyncio.to_thread(self.run))
+
+    async def wait(self) -> None:
+        if self._task is not None:
+            await self._task
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "seconds": {name: round(seconds, 2) for name, seconds in self.steps.items()},
+            "error": self.error
+        }
+
+
+warmup = Warmup(HEAVY_MODULES, preload=PRELOAD_MODELS, warmup_models=WARMUP_MODELS, workers=worker_pool)
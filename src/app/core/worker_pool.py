@@ -0,0 +1,263 @@
+# app/core/worker_pool.py
+
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.app.core.model_registry import model_registry
+from src.app.utils.lazy_import import lazy_module
+from src.app.utils.logger_utils import get_logger, debug_log
+from src.app.settings.setting import INFERENCE_PROCESSES, INFERENCE_THREADS_PER_PROCESS, WARMUP_MODELS
+
+logger = get_logger(__name__)
+
+torch = lazy_module("torch")
+
+# Imported by the fork server before it forks any worker (see worker_preload.py)
+PRELOAD_MODULE = "src.app.core.worker_preload"
+
+# How often the collector checks that every worker process is still alive
+_LIVENESS_INTERVAL_S = 1.0
+
+
+def core_slices(processes: int, cores: Optional[Sequence[int]] = None) -> List[List[int]]:
+    """
+    Split the CPU cores this process may use into `processes` contiguous slices
+    (cores are shared round-robin if there are more processes than cores).
+    """
+    if cores is None:
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    cores = list(cores)
+    n = max(1, processes)
+    return [cores[i * len(cores) // n:(i + 1) * len(cores) // n] or [cores[i % len(cores)]] for i in range(n)]
+
+
+def _worker_main(index: int, cores: List[int], threads: int, warmup: bool, jobs, results) -> None:
+    """
+    Body of an inference process: pin to its cores, size torch's thread pool to them, then run jobs.
+    """
+    try:
+        os.sched_setaffinity(0, cores)
+    except (AttributeError, OSError):
+        pass
+    if "torch" in sys.modules:
+        torch.set_num_threads(threads or len(cores))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+    if warmup:
+        # The fork server loaded the weights (or, if that failed, this loads them); then the first forward passes
+        try:
+            model_registry.preload(None, warmup=True)
+        except Exception as e:
+            logger.error("Warm-up in inference process %d failed: %s", index, str(e))
+    results.put((None, index, True, b""))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, payload = job
+        try:
+            fn, args = pickle.loads(payload)
+            result, ok = pickle.dumps(fn(*args), protocol=pickle.HIGHEST_PROTOCOL), True
+        except BaseException as e:
+            try:
+                result = pickle.dumps(e, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                result = pickle.dumps(RuntimeError(f"{type(e).__name__}: {e}"))
+            ok = False
+        results.put((job_id, index, ok, result))
+
+
+@dataclass
+class _Worker:
+    index: int
+    cores: List[int]
+    process: Any
+    jobs: Any
+    ready: threading.Event = field(default_factory=threading.Event)
+    inflight: int = 0
+    completed: int = 0
+    restarts: int = 0
+
+
+class WorkerPool:
+    """
+    N inference processes forked from a fork server that has loaded the models.
+
+    The fork server is a fresh, single-threaded interpreter (started with
+    fork+exec, so none of the API process's threads or locks come along). It
+    loads the model weights once and every child, restarted ones included, is
+    forked from it and shares them copy-on-write (inference never writes to
+    them). The API process itself does not load the models. Each child is pinned to its
+    own slice of cores with torch's intra-op threads sized to that slice, so
+    concurrent requests neither oversubscribe cores nor serialize on one GIL.
+
+    call(fn, args, route) blocks the calling thread until a child has run
+    fn(*args); fn must be a module-level function and args/results picklable.
+    Jobs with the same route go to the same child (so per-process caches such
+    as SAM embeddings stay warm); other jobs go to the least busy child.
+    """
+
+    def __init__(self, processes: int, threads_per_process: int = 0, warmup: bool = True):
+        self.processes = max(1, processes)
+        self.threads_per_process = threads_per_process
+        self.warmup = warmup
+        self._context = multiprocessing.get_context("forkserver")
+        self._workers: List[_Worker] = []
+        self._pending: Dict[int, Tuple[int, Future]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._results = None
+        self._collector: Optional[threading.Thread] = None
+        self._stopping = False
+
+    @property
+    def started(self) -> bool:
+        return self._collector is not None
+
+    def start(self, preload: bool = True, timeout: Optional[float] = None) -> None:
+        """
+        Start the fork server (loading the default models in it when preload), fork the
+        workers from it and wait until they are ready.
+        """
+        if self.started:
+            return
+        if preload:
+            # Only takes effect if this interpreter's fork server is not running yet
+            self._context.set_forkserver_preload([PRELOAD_MODULE])
+        self._results = self._context.Queue()
+        for index, cores in enumerate(core_slices(self.processes)):
+            self._workers.append(self._spawn(index, cores))
+        self._collector = threading.Thread(target=self._collect, name="inference-results", daemon=True)
+        self._collector.start()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for index in range(len(self._workers)):
+            # Re-read the list: a worker that died during start-up is replaced by the collector
+            while not self._workers[index].ready.wait(_LIVENESS_INTERVAL_S):
+                if deadline is not None and time.monotonic() > deadline:
+                    logger.warning("Inference process %d is not ready after %.0fs", index, timeout)
+                    break
+        debug_log(f"Started {self.processes} inference processes: {[w.cores for w in self._workers]}", logger)
+
+    def _spawn(self, index: int, cores: List[int], restarts: int = 0) -> _Worker:
+        jobs = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, cores, self.threads_per_process, self.warmup, jobs, self._results),
+            name=f"inference-{index}",
+            daemon=True
+        )
+        process.start()
+        return _Worker(index=index, cores=cores, process=process, jobs=jobs, restarts=restarts)
+
+    def call(self, fn: Callable[..., Any], args: Tuple[Any, ...] = (), route: Optional[Any] = None) -> Any:
+        payload = pickle.dumps((fn, args), protocol=pickle.HIGHEST_PROTOCOL)
+        future: Future = Future()
+        with self._lock:
+            if not self.started or self._stopping:
+                raise RuntimeError("Inference worker pool is not running")
+            if route is not None:
+                worker = self._workers[zlib.crc32(str(route).encode()) % len(self._workers)]
+            else:
+                worker = min(self._workers, key=lambda w: w.inflight)
+            job_id = next(self._ids)
+            self._pending[job_id] = (worker.index, future)
+            worker.inflight += 1
+        worker.jobs.put((job_id, payload))
+        return future.result()
+
+    def _collect(self) -> None:
+        last_check = time.monotonic()
+        while not self._stopping:
+            try:
+                job_id, index, ok, payload = self._results.get(timeout=_LIVENESS_INTERVAL_S)
+            except queue.Empty:
+                job_id = index = None
+            except (EOFError, OSError):
+                break
+            if index is not None:
+                if job_id is None:
+                    self._workers[index].ready.set()
+                else:
+                    with self._lock:
+                        # Jobs of a process that was replaced were already failed
+                        _, future = self._pending.pop(job_id, (index, None))
+                        if future is not None:
+                            worker = self._workers[index]
+                            worker.inflight -= 1
+                            worker.completed += 1
+                    if future is not None:
+                        value = pickle.loads(payload)
+                        if ok:
+                            future.set_result(value)
+                        else:
+                            future.set_exception(value)
+            if time.monotonic() - last_check >= _LIVENESS_INTERVAL_S:
+                last_check = time.monotonic()
+                self._replace_dead_workers()
+
+    def _replace_dead_workers(self) -> None:
+        for worker in list(self._workers):
+            if self._stopping or worker.process.is_alive():
+                continue
+            logger.error("Inference process %d exited with code %s, restarting it", worker.index, worker.process.exitcode)
+            with self._lock:
+                lost = [job_id for job_id, (index, _) in self._pending.items() if index == worker.index]
+                futures = [self._pending.pop(job_id)[1] for job_id in lost]
+                self._workers[worker.index] = self._spawn(worker.index, worker.cores, worker.restarts + 1)
+            for future in futures:
+                future.set_exception(RuntimeError(f"Inference process {worker.index} exited"))
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if not self.started:
+            return
+        self._stopping = True
+        for worker in self._workers:
+            worker.jobs.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        with self._lock:
+            futures = [future for _, future in self._pending.values()]
+            self._pending.clear()
+        for future in futures:
+            future.set_exception(RuntimeError("Inference worker pool stopped"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "started": self.started,
+                "workers": [
+                    {
+                        "pid": worker.process.pid,
+                        "alive": worker.process.is_alive(),
+                        "ready": worker.ready.is_set(),
+                        "cores": worker.cores,
+                        "inflight": worker.inflight,
+                        "completed": worker.completed,
+                        "restarts": worker.restarts
+                    }
+                    for worker in self._workers
+                ]
+            }
+
+
+# None unless INFERENCE_PROCESSES > 0; started by the background warm-up
+worker_pool = (
+    WorkerPool(INFERENCE_PROCESSES, INFERENCE_THREADS_PER_PROCESS, warmup=WARMUP_MODELS)
+    if INFERENCE_PROCESSES > 0 else None
+)
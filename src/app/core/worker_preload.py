@@ -0,0 +1,24 @@
+# app/core/worker_preload.py
+"""
+Imported by the inference worker pool's fork server, before it forks any worker.
+
+Loads the default models there so every worker shares the weights
+copy-on-write. torch runs with one intra-op thread while loading: the fork
+server must not start threads, or the workers forked from it could inherit
+locks held by threads that do not exist in them.
+"""
+
+from src.app.core.model_registry import model_registry
+from src.app.utils.lazy_import import lazy_module
+from src.app.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+torch = lazy_module("torch")
+
+try:
+    torch.set_num_threads(1)
+    model_registry.preload(None, warmup=False)
+except Exception as e:
+    # The workers load the models themselves on first use
+    logger.error("Loading the models in the inference fork server failed: %s", str(e))
@@ -1,15 +1,14 @@
 import os
-import matplotlib
-matplotlib.use('Agg')  # Set non-GUI backend for matplotlib
-
 from src.app.utils.tensorflow_config import suppress_tensorflow_warnings
 
 # Suppress TensorFlow warnings early
 suppress_tensorflow_warnings()
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 import logging
+import asyncio
 # Import setting to control debug mode
 from src.app.settings.setting import DEBUG_MODE
 
@@ -28,6 +27,11 @@ else:
 
 # Import router from app.api
 from src.app.api.full_detection_api import router as full_detection_api
+from src.app.core.warmup import warmup
+from src.app.utils.fetch import image_fetcher
+from src.app.services.result_store import result_store
+from src.app.core.executor import inference_executor, InferenceRejected
+from src.app.core.worker_pool import worker_pool
 
 app = FastAPI(
     title="Outfit Detection API",
@@ -35,6 +39,34 @@ app = FastAPI(
     version="1.0"
 )
 
+@app.on_event("startup")
+async def start_warmup():
+    # Heavy imports and model loading run in the background; /status reports when they are done
+    warmup.start()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await image_fetcher.aclose()
+
+@app.on_event("shutdown")
+async def flush_result_index():
+    await asyncio.to_thread(result_store.close)
+
+@app.on_event("shutdown")
+async def stop_inference_executor():
+    inference_executor.shutdown()
+    if worker_pool is not None:
+        await asyncio.to_thread(worker_pool.stop)
+
+@app.exception_handler(InferenceRejected)
+async def inference_rejected(request: Request, exc: InferenceRejected):
+    # Overload is reported as 429 (queue full) or 503 (queue deadline passed) so clients back off
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"status": "failed", "error": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Register router
 app.include_router(full_detection_api)
 
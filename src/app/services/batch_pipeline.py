@@ -0,0 +1,184 @@
+# app/services/batch_pipeline.py
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from PIL import Image
+
+from src.app.services.segmentation_service import grounded_segmentation
+from src.app.services.outfit_results import group_outfits, new_artifact, write_artifacts, sam_decodes_saved
+from src.app.utils.logger_utils import get_logger, debug_log
+from app.utils.image_ops import image_digest
+from src.app.utils.s3_reader import s3_reader
+from src.app.utils.fetch import image_fetcher, decode_image
+from app.utils.resolution import original_size
+from app.settings.setting import (
+    DETECTOR_ID, SEGMENTER_ID, BATCH_QUEUE_SIZE, RENDER_ARTIFACTS,
+    BATCH_FETCH_WORKERS, BATCH_DECODE_WORKERS, BATCH_INFER_WORKERS, BATCH_PERSIST_WORKERS
+)
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class BatchItem:
+    index: int
+    input_type: str
+    image_source: str
+    data: Optional[bytes] = None
+    image: Optional[Image.Image] = None
+    result_id: Optional[str] = None
+    detections: List[Any] = field(default_factory=list)
+    response: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    failed_stage: Optional[str] = None
+
+
+@dataclass
+class BatchOptions:
+    labels: List[str]
+    threshold: float
+    polygon_refinement: bool
+    bypass_cache: bool = False
+    render: bool = RENDER_ARTIFACTS
+    boxes_only: bool = False
+
+
+async def _fetch(item: BatchItem, options: BatchOptions) -> None:
+    if item.data is not None:
+        return
+    if item.image_source.startswith("s3://"):
+        item.data = await s3_reader.read_async(item.image_source)
+    else:
+        item.data = (await image_fetcher.fetch(item.image_source)).data
+
+
+def _decode_sync(item: BatchItem) -> None:
+    item.image = decode_image(item.data)
+    item.data = None
+    item.result_id = image_digest(item.image)
+
+
+async def _decode(item: BatchItem, options: BatchOptions) -> None:
+    await asyncio.to_thread(_decode_sync, item)
+
+
+async def _infer(item: BatchItem, options: BatchOptions) -> None:
+    _, detections = await grounded_segmentation(
+        image=item.image,
+        labels=options.labels,
+        threshold=options.threshold,
+        polygon_refinement=options.polygon_refinement,
+        detector_id=DETECTOR_ID,
+        segmenter_id=SEGMENTER_ID,
+        image_key=item.result_id,
+        bypass_cache=options.bypass_cache,
+        boxes_only=options.boxes_only
+    )
+    item.detections, persons, results = group_outfits(detections, original_size(item.image), options.threshold)
+    item.response = {
+        "result_id": item.result_id,
+        "input_type": item.input_type,
+        "image_source": item.image_source,
+        "status": "completed",
+        "num_persons": len(persons),
+        "total_detections": len(item.detections),
+        "sam_decodes_saved": sam_decodes_saved(item.detections),
+        "results": results
+    }
+
+
+async def _persist(item: BatchItem, options: BatchOptions) -> None:
+    item.response["artifact_id"], item.response["saved_files"] = new_artifact(options.render)
+    await asyncio.to_thread(write_artifacts, item.image, item.detections, item.response)
+    # Nothing downstream needs the pixels or masks any more
+    item.image = None
+    item.detections = []
+
+
+Stage = Callable[[BatchItem, BatchOptions], Awaitable[None]]
+
+
+async def _run_stage(
+    name: str,
+    handler: Stage,
+    workers: int,
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue,
+    options: BatchOptions
+) -> None:
+    """
+    Run `workers` copies of a stage; items that already failed pass straight through.
+    """
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is None:
+                break
+            if item.error is None:
+                try:
+                    await handler(item, options)
+                except Exception as e:
+                    logger.error("Batch item %d failed in %s: %s", item.index, name, str(e))
+                    item.error = str(e)
+                    item.failed_stage = name
+                    item.image = None
+            await outbox.put(item)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+
+async def run_batch(items: List[BatchItem], options: BatchOptions) -> List[Dict[str, Any]]:
+    """
+    Run items through fetch -> decode -> detect/segment -> persist.
+
+    Every stage has its own worker group and the stages are joined by
+    bounded queues, so downloads, inference and file writes of different
+    images overlap. A failure only affects its own item.
+    """
+    stages = [
+        ("fetch", _fetch, BATCH_FETCH_WORKERS),
+        ("decode", _decode, BATCH_DECODE_WORKERS),
+        ("infer", _infer, BATCH_INFER_WORKERS),
+        ("persist", _persist, BATCH_PERSIST_WORKERS),
+    ]
+    queues = [asyncio.Queue(maxsize=BATCH_QUEUE_SIZE) for _ in range(len(stages) + 1)]
+
+    async def run_stage(i: int) -> None:
+        name, handler, workers = stages[i]
+        await _run_stage(name, handler, workers, queues[i], queues[i + 1], options)
+        # Tell the next stage's workers (or the collector) that no more items are coming
+        next_workers = stages[i + 1][2] if i + 1 < len(stages) else 1
+        for _ in range(next_workers):
+            await queues[i + 1].put(None)
+
+    async def feed() -> None:
+        for item in items:
+            await queues[0].put(item)
+        for _ in range(stages[0][2]):
+            await queues[0].put(None)
+
+    async def collect() -> List[BatchItem]:
+        done = []
+        while True:
+            item = await queues[-1].get()
+            if item is None:
+                return done
+            done.append(item)
+
+    debug_log(f"Batch of {len(items)} items started", logger)
+    results = await asyncio.gather(feed(), collect(), *(run_stage(i) for i in range(len(stages))))
+    finished = sorted(results[1], key=lambda item: item.index)
+
+    return [
+        {"index": item.index, **item.response} if item.error is None else {
+            "index": item.index,
+            "input_type": item.input_type,
+            "image_source": item.image_source,
+            "status": "failed",
+            "stage": item.failed_stage,
+            "error": item.error
+        }
+        for item in finished
+    ]
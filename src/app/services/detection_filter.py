@@ -1,5 +1,7 @@
-from typing import List
+from typing import List, Sequence
+import numpy as np
 from app.utils.results import DetectionResult
+from app.utils.box_ops import batched_nms, soft_nms
 
 # app/services/detection_filter.py
 def compute_iou(boxA: list, boxB: list) -> float:
@@ -23,30 +25,59 @@ def compute_iou(boxA: list, boxB: list) -> float:
         return 0.0
     return interArea / union
 
+def _as_arrays(detections: Sequence[DetectionResult]):
+    boxes = np.array([d.box.xyxy for d in detections], dtype=np.float64).reshape(-1, 4)
+    scores = np.array([d.score for d in detections], dtype=np.float64)
+    labels = np.array([d.label.lower().strip().rstrip('.') for d in detections])
+    return boxes, scores, labels
+
+def remove_overlaps_batch(
+    detections_per_image: Sequence[Sequence[DetectionResult]],
+    iou_threshold: float = 0.4,
+    class_aware: bool = False
+) -> List[List[DetectionResult]]:
+    """
+    remove_multilabel_same_area for many images in one vectorised pass.
+    With class_aware=True only detections of the same label suppress each other.
+    """
+    arrays = [_as_arrays(detections) for detections in detections_per_image]
+    keeps = batched_nms(
+        [boxes for boxes, _, _ in arrays],
+        [scores for _, scores, _ in arrays],
+        iou_threshold,
+        [labels for _, _, labels in arrays] if class_aware else None
+    )
+    return [[detections[i] for i in keep] for detections, keep in zip(detections_per_image, keeps)]
+
 def remove_multilabel_same_area(
-    detections: List[DetectionResult], iou_threshold: float = 0.4
+    detections: List[DetectionResult], iou_threshold: float = 0.4, class_aware: bool = False
 ) -> List[DetectionResult]:
     """
     Untuk setiap area overlap tinggi (IoU > threshold), hanya simpan deteksi dengan skor tertinggi (apapun labelnya).
+    Hasil diurutkan dari skor tertinggi. class_aware=True: hanya label yang sama yang saling menekan.
     """
-    detections = sorted(detections, key=lambda d: d.score, reverse=True)
-    kept = []
-    used = set()
-
-    for i, det in enumerate(detections):
-        if i in used:
-            continue
-        group = [i]
-        for j in range(i + 1, len(detections)):
-            if j in used:
-                continue
-            iou = compute_iou(det.box.xyxy, detections[j].box.xyxy)
-            if iou > iou_threshold:
-                group.append(j)
-        # Pilih deteksi dengan skor tertinggi di grup (sudah urut, jadi ambil deteksi pertama)
-        kept.append(det)
-        # Tandai semua di grup sebagai sudah diproses
-        for idx in group:
-            used.add(idx)
-    return kept
+    if not detections:
+        return []
+    return remove_overlaps_batch([detections], iou_threshold, class_aware)[0]
 
+def soft_suppress_overlaps(
+    detections: List[DetectionResult],
+    iou_threshold: float = 0.4,
+    sigma: float = 0.5,
+    method: str = "gaussian",
+    score_threshold: float = 0.001,
+    class_aware: bool = False
+) -> List[DetectionResult]:
+    """
+    Soft-NMS: overlapping detections are kept with a decayed score instead of dropped.
+    Returns new DetectionResult objects, highest (decayed) score first.
+    """
+    if not detections:
+        return []
+    boxes, scores, labels = _as_arrays(detections)
+    keep, new_scores = soft_nms(boxes, scores, iou_threshold, sigma, method, score_threshold, labels if class_aware else None)
+    return [
+        DetectionResult(score=float(score), label=detections[i].label, box=detections[i].box, mask=detections[i].mask,
+                        polygon=detections[i].polygon)
+        for i, score in zip(keep, new_scores)
+    ]
@@ -0,0 +1,193 @@
+# app/services/outfit_results.py
+
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.services.detection_filter import remove_multilabel_same_area
+from app.services.person_assignment import Assignment, assign_items, normalize_boxes
+from app.utils.plotting import plot_detections
+from app.utils.image_ops import compact_mask_to_polygon
+from app.utils.resolution import original_size
+from app.utils.compact_mask import CompactMask
+from app.utils.results import DetectionResult
+from app.settings.setting import RENDER_ARTIFACTS, ARTIFACTS_IN_BACKGROUND
+from src.app.services.result_store import result_store
+from src.app.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_LABELS = ["shirt.", "pant.", "shoe.", "sandal.", "headscarf.", "watch.", "glasses.", "skirt.", "vest.", "hat."]
+
+def prepare_labels(labels: Optional[str]) -> List[str]:
+    """
+    Parse the comma-separated labels form field, always including "person" and a trailing '.'.
+    """
+    label_list = labels.split(",") if labels else DEFAULT_LABELS
+    if not any(l.lower() == "person" for l in label_list):
+        label_list = ["person"] + label_list
+    return [label if label.endswith(".") else label + "." for label in label_list]
+
+def normalize_box(xyxy: List[float], image_size: Tuple[int, int]) -> List[float]:
+    """
+    Pixel [xmin, ymin, xmax, ymax] to [x, y, w, h] relative to the image size.
+    """
+    xmin, ymin, xmax, ymax = xyxy
+    img_width, img_height = image_size
+    x = xmin / img_width
+    y = ymin / img_height
+    w = (xmax - xmin) / img_width
+    h = (ymax - ymin) / img_height
+    return [round(x, 4), round(y, 4), round(w, 4), round(h, 4)]
+
+def detection_payload(detection_id: int, detection: DetectionResult, image_size: Tuple[int, int]) -> Dict[str, Any]:
+    return {
+        "detection_id": detection_id,
+        "text_prompt": detection.label,
+        "box": normalize_box(detection.box.xyxy, image_size),
+        "confidence": round(detection.score, 4)
+    }
+
+def mask_payload(mask: Optional[CompactMask], polygon: Optional[List[List[int]]] = None) -> Dict[str, Any]:
+    """
+    Mask area and outer polygon (pixel coordinates) for a response.
+    Uses the polygon from refinement when there is one, otherwise traces the mask.
+    """
+    if mask is None or not mask.any():
+        return {"mask_area": 0, "polygon": []}
+    return {"mask_area": mask.area, "polygon": polygon if polygon is not None else compact_mask_to_polygon(mask)}
+
+def is_person(detection: DetectionResult) -> bool:
+    return detection.label.lower().strip().rstrip('.') == 'person'
+
+@dataclass
+class OutfitPlan:
+    detections: List[DetectionResult]  # score-filtered
+    persons: List[DetectionResult]
+    items: List[DetectionResult]  # score-filtered and deduplicated
+    assignment: Assignment
+
+    def to_segment(self) -> List[DetectionResult]:
+        """
+        The persons and the items assigned to one of them: the only detections whose masks end up in a response.
+        """
+        return self.persons + [self.items[i] for i in np.flatnonzero(self.assignment.person_index >= 0)]
+
+def plan_outfits(detections: List[DetectionResult], threshold: float) -> OutfitPlan:
+    """
+    Score filtering, item deduplication and person assignment; needs boxes only, so it can run before SAM.
+    """
+    # Filter by score threshold
+    detections = [d for d in detections if d.score >= threshold]
+
+    # Separate detections into persons and outfit items
+    persons = [d for d in detections if is_person(d)]
+    items = [d for d in detections if not is_person(d)]
+
+    # Filter overlapping items (only keep highest score per area)
+    items = remove_multilabel_same_area(items, iou_threshold=0.5)
+
+    # Assign every item to its best-overlapping person in one vectorised step
+    person_boxes = np.array([p.box.xyxy for p in persons], dtype=np.float64).reshape(-1, 4)
+    item_boxes = np.array([i.box.xyxy for i in items], dtype=np.float64).reshape(-1, 4)
+    return OutfitPlan(detections, persons, items, assign_items(person_boxes, item_boxes))
+
+def group_outfits(
+    detections: List[DetectionResult],
+    image_size: Tuple[int, int],
+    threshold: float
+) -> Tuple[List[DetectionResult], List[DetectionResult], List[Dict[str, Any]]]:
+    """
+    Filter detections and group outfit items under the person box that covers most of them.
+
+    Returns the score-filtered detections, the person detections and the
+    per-person results as sent in the /detect response. "polygon" holds the
+    refined outline in pixels, or None when polygon refinement was off.
+    """
+    plan = plan_outfits(detections, threshold)
+    persons, items, assignment = plan.persons, plan.items, plan.assignment
+    person_norm = normalize_boxes(np.array([p.box.xyxy for p in persons], dtype=np.float64), image_size).tolist()
+    item_norm = normalize_boxes(np.array([i.box.xyxy for i in items], dtype=np.float64), image_size).tolist()
+
+    # Build results
+    results = []
+    for idx, person in enumerate(persons):
+        outfits = []
+        for i in np.flatnonzero(assignment.person_index == idx):
+            item = items[i]
+            outfits.append({
+                "text_prompt": item.label,
+                "box": item_norm[i],
+                "confidence": round(item.score, 4),
+                "iou_with_person": round(float(assignment.iou[i]), 4),
+                "overlap_with_person": round(float(assignment.overlap[i]), 4),
+                "polygon": item.polygon
+            })
+
+        results.append({
+            "person_id": idx + 1,
+            "bounding_box": person_norm[idx],
+            "polygon": person.polygon,
+            "outfit": outfits
+        })
+
+    return plan.detections, persons, results
+
+def sam_decodes_saved(detections: List[DetectionResult]) -> int:
+    """
+    Detections that were never sent to SAM because no response would use their mask.
+    """
+    return sum(1 for d in detections if d.mask is None)
+
+def new_artifact(render: bool = RENDER_ARTIFACTS) -> Tuple[str, Dict[str, str]]:
+    """
+    A fresh artifact id and its image/json paths under results/ (no image path when render is off).
+    """
+    artifact_id = result_store.new_id()
+    return artifact_id, result_store.paths(artifact_id, render)
+
+def write_artifacts(image: Image.Image, detections: List[DetectionResult], response: Dict[str, Any]) -> None:
+    """
+    Save the annotated image (if requested) and the JSON response to the paths in response["saved_files"],
+    then queue the artifact's row for the result index.
+    """
+    saved_files = response["saved_files"]
+    if "image" in saved_files:
+        size = original_size(image)
+        if image.size != size:
+            # Decoded at reduced scale; detections are in original coordinates
+            image = image.resize(size, Image.BILINEAR)
+        plot_detections(image, detections, saved_files["image"])
+    with open(saved_files["json"], "w", encoding="utf-8") as f:
+        json.dump(response, f, indent=2)
+    labels = sorted({d.label for d in detections})
+    result_store.record(response["artifact_id"], response, labels)
+
+# Keep references to background artifact writes so they are not garbage collected
+_background_writes: Set[asyncio.Task] = set()
+
+def _write_artifacts_logged(image: Image.Image, detections: List[DetectionResult], response: Dict[str, Any]) -> None:
+    try:
+        write_artifacts(image, detections, response)
+    except Exception as e:
+        logger.error("Writing artifacts %s failed: %s", response["saved_files"], str(e))
+
+async def save_artifacts(
+    image: Image.Image,
+    detections: List[DetectionResult],
+    response: Dict[str, Any],
+    background: bool = ARTIFACTS_IN_BACKGROUND
+) -> None:
+    """
+    Write artifacts in a worker thread; with background=True return at once and let the write finish later.
+    """
+    if not background:
+        await asyncio.to_thread(write_artifacts, image, detections, response)
+        return
+    task = asyncio.create_task(asyncio.to_thread(_write_artifacts_logged, image, detections, response))
+    _background_writes.add(task)
+    task.add_done_callback(_background_writes.discard)
@@ -0,0 +1,77 @@
+# app/services/person_assignment.py
+
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+from app.utils.box_ops import box_areas, iou_matrix
+from app.settings.setting import OUTFIT_MIN_OVERLAP
+
+
+class Assignment(NamedTuple):
+    # Per item: index of the person it belongs to (-1 if none), the fraction
+    # of the item's area inside that person box, and their IoU
+    person_index: np.ndarray
+    overlap: np.ndarray
+    iou: np.ndarray
+
+
+def containment_matrix(person_boxes: np.ndarray, item_boxes: np.ndarray) -> np.ndarray:
+    """
+    [P, I] fraction of each item's area that lies inside each person box.
+    """
+    person_boxes = np.asarray(person_boxes, dtype=np.float64).reshape(-1, 4)
+    item_boxes = np.asarray(item_boxes, dtype=np.float64).reshape(-1, 4)
+    p = person_boxes[:, None, :]
+    i = item_boxes[None, :, :]
+    inter_w = np.maximum(0, np.minimum(p[..., 2], i[..., 2]) - np.maximum(p[..., 0], i[..., 0]))
+    inter_h = np.maximum(0, np.minimum(p[..., 3], i[..., 3]) - np.maximum(p[..., 1], i[..., 1]))
+    inter = inter_w * inter_h
+    item_area = np.broadcast_to(box_areas(item_boxes)[None, :], inter.shape)
+    return np.divide(inter, item_area, out=np.zeros_like(inter), where=item_area > 0)
+
+
+def assign_items(
+    person_boxes: np.ndarray,
+    item_boxes: np.ndarray,
+    min_overlap: float = OUTFIT_MIN_OVERLAP
+) -> Assignment:
+    """
+    Assign every item to the person box that covers the largest share of it.
+
+    An item is assigned only if at least min_overlap of its area is inside
+    that person (1.0 = strict containment). Ties go to the person with the
+    higher IoU, then to the earlier person.
+    """
+    person_boxes = np.asarray(person_boxes, dtype=np.float64).reshape(-1, 4)
+    item_boxes = np.asarray(item_boxes, dtype=np.float64).reshape(-1, 4)
+    n_items = len(item_boxes)
+    if len(person_boxes) == 0 or n_items == 0:
+        empty = np.zeros(n_items)
+        return Assignment(np.full(n_items, -1, dtype=np.int64), empty, empty.copy())
+
+    overlap = containment_matrix(person_boxes, item_boxes)
+    ious = iou_matrix(person_boxes, item_boxes)
+
+    best_overlap = overlap.max(axis=0)
+    candidates = overlap == best_overlap[None, :]
+    best = np.argmax(np.where(candidates, ious, -1.0), axis=0)
+
+    columns = np.arange(n_items)
+    assigned = best_overlap >= min_overlap
+    return Assignment(
+        person_index=np.where(assigned, best, -1),
+        overlap=np.where(assigned, best_overlap, 0.0),
+        iou=np.where(assigned, ious[best, columns], 0.0)
+    )
+
+
+def normalize_boxes(boxes: np.ndarray, image_size: Tuple[int, int], decimals: int = 4) -> np.ndarray:
+    """
+    [N, 4] pixel xyxy boxes to [x, y, w, h] relative to the image size.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    img_width, img_height = image_size
+    scale = np.array([img_width, img_height, img_width, img_height], dtype=np.float64)
+    xywh = np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1) / scale
+    return np.round(xywh, decimals)
@@ -0,0 +1,199 @@
+# app/services/result_cache.py
+
+import copy
+import hashlib
+import json
+import os
+import pickle
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.results import DetectionResult
+from app.settings.setting import RESULT_CACHE_MEMORY_MB, RESULT_CACHE_DISK_MB, RESULT_CACHE_DIR
+from src.app.utils.lru_cache import ByteLRUCache
+from src.app.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def _detections_nbytes(detections: List[DetectionResult]) -> int:
+    # Masks dominate; count a small fixed overhead for the rest of each detection
+    return sum(256 + (d.mask.nbytes if d.mask is not None else 0) for d in detections)
+
+
+def normalize_labels(labels: List[str]) -> List[str]:
+    """
+    Canonical label list for cache keys: lower-case, trailing '.', no duplicates, sorted.
+    """
+    normalized = set()
+    for label in labels:
+        label = label.strip().lower()
+        normalized.add(label if label.endswith(".") else label + ".")
+    return sorted(normalized)
+
+
+class ResultCache:
+    """
+    Two-tier (memory + disk) cache of grounded_segmentation outputs.
+
+    The memory tier is a byte-bounded LRU. The disk tier stores one
+    compressed pickle per key and drops the least recently used files once
+    the directory grows past its byte budget.
+    """
+
+    def __init__(self, memory_bytes: int, disk_bytes: int, directory: str):
+        self.memory = ByteLRUCache(memory_bytes, sizeof=_detections_nbytes, name="results")
+        self.disk_bytes = disk_bytes
+        self.directory = directory
+        self._disk_lock = threading.Lock()
+        self._disk_usage: Optional[int] = None
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.disk_evictions = 0
+
+    @staticmethod
+    def make_key(
+        image_key: str,
+        labels: List[str],
+        threshold: float,
+        polygon_refinement: bool,
+        detector_id: str,
+        segmenter_id: str,
+        polygon_tolerance: float = 0.0,
+        inference_limits: Tuple[int, float] = (0, 0.0),
+        precisions: Tuple[str, str] = ("fp32", "fp32"),
+        backend: str = "torch",
+        boxes_only: bool = False,
+        outfit_min_overlap: float = 0.0
+    ) -> str:
+        payload = json.dumps({
+            "backend": backend,
+            "boxes_only": bool(boxes_only),
+            "outfit_min_overlap": round(float(outfit_min_overlap), 6),
+            "inference_limits": list(inference_limits),
+            "precisions": list(precisions),
+            "image": image_key,
+            "labels": normalize_labels(labels),
+            "threshold": round(float(threshold), 6),
+            "polygon_refinement": bool(polygon_refinement),
+            "polygon_tolerance": round(float(polygon_tolerance), 6),
+            "detector_id": detector_id,
+            "segmenter_id": segmenter_id
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pkl.z")
+
+    def get(self, key: str) -> Optional[List[DetectionResult]]:
+        detections = self.memory.get(key)
+        if detections is None:
+            detections = self._get_disk(key)
+            if detections is not None:
+                self.memory.put(key, detections)
+        if detections is None:
+            return None
+        # Callers may mutate detections, never hand out the cached objects
+        return [copy.copy(d) for d in detections]
+
+    def _get_disk(self, key: str) -> Optional[List[DetectionResult]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                detections = pickle.loads(zlib.decompress(f.read()))
+            os.utime(path)
+            self.disk_hits += 1
+            return detections
+        except FileNotFoundError:
+            self.disk_misses += 1
+            return None
+        except Exception as e:
+            logger.warning("Dropping unreadable result cache entry %s: %s", path, str(e))
+            self.disk_misses += 1
+            self._remove(path)
+            return None
+
+    def put(self, key: str, detections: List[DetectionResult]) -> None:
+        self.memory.put(key, [copy.copy(d) for d in detections])
+
+    def put_disk(self, key: str, detections: List[DetectionResult]) -> None:
+        path = self._path(key)
+        data = zlib.compress(pickle.dumps(detections, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            # An overwritten entry (e.g. a refresh) must not be counted twice
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write result cache entry %s: %s", path, str(e))
+            self._remove(tmp_path)
+            return
+        with self._disk_lock:
+            self._disk_usage = self._scan_disk() if self._disk_usage is None else self._disk_usage + len(data) - replaced
+            if self._disk_usage > self.disk_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _evict_disk(self) -> None:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        # Evict down to 90% of the budget so we don't rescan on every write
+        target = self.disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+            self.disk_evictions += 1
+        self._disk_usage = total
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk": {
+                "size_mb": round((self._disk_usage or 0) / 2**20, 2),
+                "max_size_mb": round(self.disk_bytes / 2**20, 2),
+                "hits": self.disk_hits,
+                "misses": self.disk_misses,
+                "evictions": self.disk_evictions
+            }
+        }
+
+
+result_cache = ResultCache(
+    memory_bytes=RESULT_CACHE_MEMORY_MB * 2**20,
+    disk_bytes=RESULT_CACHE_DISK_MB * 2**20,
+    directory=RESULT_CACHE_DIR
+)
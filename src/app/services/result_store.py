@@ -0,0 +1,298 @@
+# app/services/result_store.py
+
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.settings.setting import (
+    ARTIFACT_FORMAT, RESULT_STORE_DB, RESULT_RETENTION_DAYS, RESULT_STORE_MAX_MB,
+    RESULT_STORE_FLUSH_MS, RESULT_STORE_BATCH_SIZE
+)
+from src.app.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+RESULTS_DIR = "results"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    input_type TEXT,
+    image_source TEXT,
+    result_id TEXT,
+    labels TEXT,
+    num_persons INTEGER,
+    total_detections INTEGER,
+    image_path TEXT,
+    json_path TEXT,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS artifacts_created_at ON artifacts (created_at);
+CREATE INDEX IF NOT EXISTS artifacts_image_source ON artifacts (image_source);
+CREATE INDEX IF NOT EXISTS artifacts_result_id ON artifacts (result_id);
+"""
+
+_COLUMNS = (
+    "id", "created_at", "input_type", "image_source", "result_id", "labels",
+    "num_persons", "total_detections", "image_path", "json_path", "bytes"
+)
+
+# Run retention/size eviction at most this often
+_EVICT_INTERVAL_S = 60.0
+
+
+class ResultStore:
+    """
+    Index of the artifacts written under results/.
+
+    Artifact ids are a timestamp plus a random suffix, so concurrent
+    requests never share file names. Each written artifact is recorded in a
+    SQLite table (source, labels, time, counts, paths, bytes) by a single
+    writer thread that commits in batches; queries read that table and never
+    open the JSON files. The writer also drops artifacts older than
+    retention_days and the oldest ones once the total exceeds max_bytes.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        db_path: str,
+        retention_days: float,
+        max_bytes: int,
+        flush_ms: int,
+        batch_size: int
+    ):
+        self.directory = directory
+        self.db_path = db_path
+        self.retention_seconds = retention_days * 86400
+        self.max_bytes = max_bytes
+        self.flush_seconds = flush_ms / 1000.0
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._last_eviction = 0.0
+        self.indexed = 0
+        self.evicted = 0
+
+    @staticmethod
+    def new_id() -> str:
+        return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    def paths(self, artifact_id: str, render: bool = True) -> Dict[str, str]:
+        """
+        Image/json paths for an artifact id (no image path when render is off).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        stem = f"{self.directory}/detection_{artifact_id}"
+        paths = {"json": f"{stem}.json"}
+        if render:
+            paths = {"image": f"{stem}.{ARTIFACT_FORMAT}", **paths}
+        return paths
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        # WAL lets queries read while the writer commits
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _ensure_writer(self) -> None:
+        with self._start_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run_writer, name="result-store", daemon=True)
+                self._writer.start()
+
+    def record(self, artifact_id: str, response: Dict[str, Any], labels: List[str]) -> None:
+        """
+        Queue the index row for an artifact whose files have been written.
+        """
+        saved_files = response.get("saved_files", {})
+        size = 0
+        for path in saved_files.values():
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        self._queue.put({
+            "id": artifact_id,
+            "created_at": time.time(),
+            "input_type": response.get("input_type"),
+            "image_source": response.get("image_source"),
+            "result_id": response.get("result_id"),
+            "labels": json.dumps(labels),
+            "num_persons": response.get("num_persons"),
+            "total_detections": response.get("total_detections"),
+            "image_path": saved_files.get("image"),
+            "json_path": saved_files.get("json"),
+            "bytes": size
+        })
+        self._ensure_writer()
+
+    def _run_writer(self) -> None:
+        connection = self._connect()
+        connection.executescript(_SCHEMA)
+        stopping = False
+        while not stopping:
+            rows = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # None is the shutdown sentinel from close()
+            stopping = None in rows
+            rows = [row for row in rows if row is not None]
+            try:
+                with connection:
+                    connection.executemany(
+                        f"INSERT OR REPLACE INTO artifacts ({', '.join(_COLUMNS)}) "
+                        f"VALUES ({', '.join(':' + c for c in _COLUMNS)})",
+                        rows
+                    )
+                self.indexed += len(rows)
+                if time.monotonic() - self._last_eviction > _EVICT_INTERVAL_S:
+                    self._evict(connection)
+            except Exception as e:
+                logger.error("Result index write failed (%d rows): %s", len(rows), str(e))
+        connection.close()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Write any queued rows and stop the writer thread.
+        """
+        with self._start_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None and writer.is_alive():
+            self._queue.put(None)
+            writer.join(timeout)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        self._last_eviction = time.monotonic()
+        cutoff = time.time() - self.retention_seconds
+        doomed = connection.execute(
+            "SELECT id, image_path, json_path FROM artifacts WHERE created_at < ?", (cutoff,)
+        ).fetchall()
+        total = connection.execute(
+            "SELECT COALESCE(SUM(bytes), 0) FROM artifacts WHERE created_at >= ?", (cutoff,)
+        ).fetchone()[0]
+        if total > self.max_bytes:
+            # Oldest first, down to 90% of the budget so we don't evict on every flush
+            target = self.max_bytes * 0.9
+            for row in connection.execute(
+                "SELECT id, image_path, json_path, bytes FROM artifacts WHERE created_at >= ? ORDER BY created_at",
+                (cutoff,)
+            ):
+                if total <= target:
+                    break
+                doomed.append(row)
+                total -= row["bytes"]
+        for row in doomed:
+            for path in (row["image_path"], row["json_path"]):
+                if path:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        with connection:
+            connection.executemany("DELETE FROM artifacts WHERE id = ?", [(row["id"],) for row in doomed])
+        self.evicted += len(doomed)
+        if doomed:
+            logger.info("Evicted %d result artifacts", len(doomed))
+
+    def query(
+        self,
+        limit: int = 20,
+        offset: int = 0,
+        image_source: Optional[str] = None,
+        result_id: Optional[str] = None,
+        label: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Newest-first page of artifact metadata matching the filters, plus the total match count.
+        """
+        where, params = [], []
+        if image_source is not None:
+            where.append("image_source = ?")
+            params.append(image_source)
+        if result_id is not None:
+            where.append("result_id = ?")
+            params.append(result_id)
+        if label is not None:
+            label = label.strip()
+            # Match the label as a whole JSON string; %, _ and \ in it are literal, not wildcards
+            quoted = json.dumps(label if label.endswith(".") else label + ".")
+            where.append("labels LIKE ? ESCAPE '\\'")
+            params.append("%" + re.sub(r"([\\%_])", r"\\\1", quoted) + "%")
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            params.append(until)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        connection = self._connect()
+        try:
+            connection.executescript(_SCHEMA)
+            total = connection.execute(f"SELECT COUNT(*) FROM artifacts {clause}", params).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT * FROM artifacts {clause} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        finally:
+            connection.close()
+        return total, [self._row(row) for row in rows]
+
+    def get(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+        connection = self._connect()
+        try:
+            connection.executescript(_SCHEMA)
+            row = connection.execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+        finally:
+            connection.close()
+        return self._row(row) if row is not None else None
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["labels"] = json.loads(record["labels"] or "[]")
+        record["created_at"] = datetime.fromtimestamp(record["created_at"]).isoformat(timespec="seconds")
+        image_path = record.pop("image_path")
+        record["image_url"] = f"/{image_path}" if image_path else None
+        record["json_url"] = f"/{record.pop('json_path')}"
+        return record
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "indexed": self.indexed,
+            "pending": self._queue.qsize(),
+            "evicted": self.evicted,
+            "retention_days": round(self.retention_seconds / 86400, 2),
+            "max_size_mb": round(self.max_bytes / 2**20, 2)
+        }
+
+
+result_store = ResultStore(
+    directory=RESULTS_DIR,
+    db_path=RESULT_STORE_DB,
+    retention_days=RESULT_RETENTION_DAYS,
+    max_bytes=RESULT_STORE_MAX_MB * 2**20,
+    flush_ms=RESULT_STORE_FLUSH_MS,
+    batch_size=RESULT_STORE_BATCH_SIZE
+)
@@ -1,15 +1,76 @@
 # app/services/segmentation_service.py
 
-from typing import List, Optional, Tuple, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple, Union
 from PIL import Image
 import numpy as np
 import asyncio
 
 from src.app.core.detect import detect
-from src.app.core.segment import segment
-from app.utils.image_ops import load_image
+from src.app.core.segment import segment, iter_segment, remember_image, reprompt_images
+from src.app.services.result_cache import result_cache
+from src.app.services.outfit_results import plan_outfits
+from app.utils.image_ops import load_image, image_digest
+from app.utils.resolution import original_size, resize_for_inference, rescale_boxes
 from app.utils.results import DetectionResult
-from app.settings.setting import DEFAULT_THRESHOLD, DETECTOR_ID, SEGMENTER_ID
+from app.settings.setting import (
+    DEFAULT_THRESHOLD, DETECTOR_ID, SEGMENTER_ID, RESULT_CACHE_ENABLED, POLYGON_SIMPLIFY_TOLERANCE,
+    INFERENCE_MAX_SIDE, INFERENCE_MAX_MEGAPIXELS, DETECTOR_PRECISION, SEGMENTER_PRECISION,
+    INFERENCE_BACKEND, OUTFIT_MIN_OVERLAP
+)
+
+# Keep references to fire-and-forget cache writes so they are not garbage collected
+_background_tasks: Set[asyncio.Task] = set()
+
+# Boxes sent to SAM vs. boxes it was spared by filtering first (fresh runs only)
+_sam_counts = {"sam_decodes": 0, "sam_decodes_saved": 0}
+
+def _cache_key(image_key: str, labels: List[str], threshold: float, polygon_refinement: bool,
+               detector_id: Optional[str], segmenter_id: Optional[str], boxes_only: bool) -> str:
+    return result_cache.make_key(
+        image_key, labels, threshold, polygon_refinement,
+        detector_id if detector_id is not None else DETECTOR_ID,
+        segmenter_id if segmenter_id is not None else SEGMENTER_ID,
+        POLYGON_SIMPLIFY_TOLERANCE if polygon_refinement else 0.0,
+        (INFERENCE_MAX_SIDE, INFERENCE_MAX_MEGAPIXELS),
+        (DETECTOR_PRECISION, SEGMENTER_PRECISION),
+        INFERENCE_BACKEND,
+        boxes_only,
+        OUTFIT_MIN_OVERLAP
+    )
+
+def _segmentation_targets(detections: List[DetectionResult], threshold: float, boxes_only: bool) -> List[DetectionResult]:
+    """
+    The detections worth a SAM decode: persons and the items assigned to them (none for boxes only).
+    Without a person there are no outfit results, so nothing is segmented.
+    """
+    targets = [] if boxes_only else plan_outfits(detections, threshold).to_segment()
+    _sam_counts["sam_decodes"] += len(targets)
+    _sam_counts["sam_decodes_saved"] += len(detections) - len(targets)
+    return targets
+
+def stats() -> Dict[str, Any]:
+    total = _sam_counts["sam_decodes"] + _sam_counts["sam_decodes_saved"]
+    return {
+        **_sam_counts,
+        "saved_ratio": round(_sam_counts["sam_decodes_saved"] / total, 4) if total else 0.0
+    }
+
+async def _remember(image_key: str, image: Image.Image, inference_image: Optional[Image.Image] = None) -> None:
+    """
+    Keep the inference-size image so /segment/reprompt works for image_key even where SAM did
+    not run. A cached result has no inference image at hand; it is resized only if not kept yet.
+    """
+    if inference_image is None:
+        if reprompt_images.get(image_key) is not None:
+            return
+        inference_image = await asyncio.to_thread(resize_for_inference, image)
+    remember_image(image_key, inference_image, original_size(image))
+
+def _store(cache_key: str, detections: List[DetectionResult]) -> None:
+    result_cache.put(cache_key, detections)
+    task = asyncio.create_task(asyncio.to_thread(result_cache.put_disk, cache_key, detections))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 async def grounded_segmentation(
     image: Union[Image.Image, str],
@@ -17,29 +78,116 @@ async def grounded_segmentation(
     threshold: float = DEFAULT_THRESHOLD,
     polygon_refinement: bool = False,
     detector_id: Optional[str] = None,
-    segmenter_id: Optional[str] = None
+    segmenter_id: Optional[str] = None,
+    image_key: Optional[str] = None,
+    bypass_cache: bool = False,
+    boxes_only: bool = False
 ) -> Tuple[np.ndarray, List[DetectionResult]]:
     """
-    Pipeline: Load image, detect objects, and segment masks.
+    Pipeline: Load image, detect objects, filter them, and segment masks.
+    Score filtering, deduplication and person assignment run on the boxes
+    first, so SAM only decodes masks a response will use; the other
+    detections keep mask None (all of them with boxes_only). The inference image
+    is kept under image_key either way, so the image can be re-prompted later.
+    Results are cached by image content + parameters; bypass_cache forces a fresh run (and refreshes the cache).
     """
     if isinstance(image, str):
         image_pil = await load_image(image)
     else:
         image_pil = image
 
-    # Run detection and segmentation concurrently
+    image_key = image_key if image_key is not None else await asyncio.to_thread(image_digest, image_pil)
+    cache_key = None
+    if RESULT_CACHE_ENABLED:
+        cache_key = _cache_key(image_key, labels, threshold, polygon_refinement, detector_id, segmenter_id, boxes_only)
+        if not bypass_cache:
+            cached = await asyncio.to_thread(result_cache.get, cache_key)
+            if cached is not None:
+                await _remember(image_key, image_pil)
+                return np.array(image_pil), cached
+
+    # Both models run on the downscaled copy; boxes and masks come back in original coordinates
+    size = original_size(image_pil)
+    inference_image = await asyncio.to_thread(resize_for_inference, image_pil)
     detections = await detect(
-        image=image_pil,
+        image=inference_image,
         labels=labels,
         threshold=threshold,
         detector_id=detector_id
     )
+    rescale_boxes(detections, inference_image.size, size)
+    await _remember(image_key, image_pil, inference_image)
 
-    detections = await segment(
-        image=image_pil,
-        detection_results=detections,
-        polygon_refinement=polygon_refinement,
-        segmenter_id=segmenter_id
+    targets = _segmentation_targets(detections, threshold, boxes_only)
+    if targets:
+        # Masks are set on the detection objects themselves
+        await segment(
+            image=inference_image,
+            detection_results=targets,
+            polygon_refinement=polygon_refinement,
+            segmenter_id=segmenter_id,
+            image_key=image_key,
+            original_size=size
+        )
+
+    if cache_key is not None:
+        _store(cache_key, detections)
+
+    return np.array(image_pil), detections
+
+async def stream_grounded_segmentation(
+    image: Image.Image,
+    labels: List[str],
+    threshold: float = DEFAULT_THRESHOLD,
+    polygon_refinement: bool = False,
+    detector_id: Optional[str] = None,
+    segmenter_id: Optional[str] = None,
+    image_key: Optional[str] = None,
+    bypass_cache: bool = False,
+    boxes_only: bool = False
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Same pipeline as grounded_segmentation, but yields partial results as they become ready:
+    ("detections", detections) right after detection, then ("mask", (index, detection)) per
+    segmented detection (index into detections).
+    """
+    image_key = image_key if image_key is not None else await asyncio.to_thread(image_digest, image)
+    cache_key = None
+    if RESULT_CACHE_ENABLED:
+        cache_key = _cache_key(image_key, labels, threshold, polygon_refinement, detector_id, segmenter_id, boxes_only)
+        if not bypass_cache:
+            cached = await asyncio.to_thread(result_cache.get, cache_key)
+            if cached is not None:
+                await _remember(image_key, image)
+                yield "detections", cached
+                for idx, detection in enumerate(cached):
+                    if detection.mask is not None:
+                        yield "mask", (idx, detection)
+                return
+
+    size = original_size(image)
+    inference_image = await asyncio.to_thread(resize_for_inference, image)
+    detections = await detect(
+        image=inference_image,
+        labels=labels,
+        threshold=threshold,
+        detector_id=detector_id
     )
+    rescale_boxes(detections, inference_image.size, size)
+    await _remember(image_key, image, inference_image)
+    targets = _segmentation_targets(detections, threshold, boxes_only)
+    yield "detections", detections
+
+    positions = {id(detection): idx for idx, detection in enumerate(detections)}
+    async for _, detection in iter_segment(
+        image=inference_image,
+        detection_results=targets,
+        polygon_refinement=polygon_refinement,
+        segmenter_id=segmenter_id,
+        image_key=image_key,
+        original_size=size
+    ):
+        yield "mask", (positions[id(detection)], detection)
 
-    return np.array(image), detections
+    if cache_key is not None:
+        _store(cache_key, detections)
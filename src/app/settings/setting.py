@@ -6,3 +6,129 @@ SEGMENTER_ID="facebook/sam-vit-base"
 
 # Debug mode setting - set to True to show logging info, False to hide logging
 DEBUG_MODE = True
+
+
+# Model registry: loaded models stay warm until their total size exceeds this budget (least recently used are dropped first)
+MODEL_MEMORY_BUDGET_MB = 4096
+# Load the default detector/segmenter when the API starts, and run one warm-up pass on each
+PRELOAD_MODELS = True
+WARMUP_MODELS = True
+
+# Micro-batching for the detector: concurrent /detect calls with the same labels and threshold
+# that arrive within the window are run as one batched forward pass
+DETECT_BATCHING = True
+DETECT_BATCH_WINDOW_MS = 10
+DETECT_MAX_BATCH_SIZE = 8
+
+# Byte budget for cached SAM image embeddings (one embedding is ~4 MB for sam-vit-base)
+SAM_EMBEDDING_CACHE_MB = 512
+# Byte budget for the inference-size images /detect has seen, so /segment/reprompt can re-encode an
+# image whose SAM embedding was never computed (result-cache hit, no person, boxes only) or was evicted
+REPROMPT_IMAGE_CACHE_MB = 256
+
+# Byte budget for cached detector text prompts: tokenized labels and the text encoder's features
+# for them (a few KB per label), so repeated label sets only run the image branch and fusion layers
+TEXT_PROMPT_CACHE_MB = 64
+
+# Cache of full detect+segment results keyed by image content, labels, threshold, refinement and model ids
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_MEMORY_MB = 256
+RESULT_CACHE_DISK_MB = 2048
+RESULT_CACHE_DIR = ".cache/results"
+
+# /detect/batch pipeline: worker count per stage and the size of the queues between stages
+BATCH_FETCH_WORKERS = 8
+BATCH_DECODE_WORKERS = 2
+BATCH_INFER_WORKERS = 4
+BATCH_PERSIST_WORKERS = 2
+BATCH_QUEUE_SIZE = 8
+
+# An outfit item belongs to a person when at least this fraction of its box lies inside the person box
+# (1.0 = strict containment; lower values keep items that stick slightly outside)
+OUTFIT_MIN_OVERLAP = 0.8
+
+# SAM mask post-processing: "lowres" merges and thresholds masks at the model's 256x256 output and
+# upsamples only each mask's window; "full" upsamples every mask to the full frame first (original path)
+MASK_POSTPROCESS = "lowres"
+
+# Polygon refinement runs on a thread pool of this size (0 = one worker per CPU core)
+POLYGON_WORKERS = 0
+# Douglas-Peucker tolerance in pixels for polygons returned in responses (0 = exact contours)
+POLYGON_SIMPLIFY_TOLERANCE = 1.0
+
+# Image URL fetching: one pooled client (HTTP/2 when the h2 package is installed), at most
+# FETCH_PER_HOST_LIMIT concurrent requests per host, bodies larger than FETCH_MAX_BYTES are rejected
+FETCH_TIMEOUT = 120  # seconds
+FETCH_MAX_BYTES = 50 * 2**20
+FETCH_MAX_CONNECTIONS = 64
+FETCH_PER_HOST_LIMIT = 8
+FETCH_HTTP2 = True
+
+# On-disk cache of fetched images keyed by URL; repeat fetches are conditional GETs (ETag/Last-Modified)
+FETCH_CACHE_ENABLED = True
+FETCH_CACHE_MB = 1024
+FETCH_CACHE_DIR = ".cache/fetch"
+
+# S3 reads (endpoint and credentials come from the S3_ENDPOINT / S3_ACCESS_KEY / S3_SECRET_KEY env vars).
+# Objects are read in S3_RANGE_CHUNK_MB ranged GETs, up to S3_RANGE_CONCURRENCY of them in parallel per object
+S3_ADDRESSING_STYLE = "virtual"
+S3_MAX_POOL_CONNECTIONS = 32
+S3_RANGE_CHUNK_MB = 8
+S3_RANGE_CONCURRENCY = 8
+S3_PREFETCH_CONCURRENCY = 16
+
+# Annotated result images: format (png, webp or jpg), quality for webp/jpg, zlib level for png
+RENDER_ARTIFACTS = True
+ARTIFACT_FORMAT = "png"
+ARTIFACT_QUALITY = 90
+ARTIFACT_PNG_COMPRESSION = 3
+MASK_OVERLAY_ALPHA = 0.4
+# Write /detect artifacts after the response is sent instead of before
+ARTIFACTS_IN_BACKGROUND = True
+
+# SQLite index of the artifacts in results/, written in batches by a background thread (the database
+# lives outside results/ so the static mount does not serve it).
+# Artifacts older than RESULT_RETENTION_DAYS, and the oldest beyond RESULT_STORE_MAX_MB, are deleted
+RESULT_STORE_DB = ".cache/result_index.sqlite3"
+RESULT_RETENTION_DAYS = 30
+RESULT_STORE_MAX_MB = 10240
+RESULT_STORE_FLUSH_MS = 200
+RESULT_STORE_BATCH_SIZE = 64
+
+# Inference resolution: detection and segmentation run on a copy scaled down until the long side is at
+# most INFERENCE_MAX_SIDE and the area at most INFERENCE_MAX_MEGAPIXELS (0 disables a limit); boxes and
+# masks are returned in original image coordinates. With INFERENCE_DRAFT_DECODE, large JPEGs are decoded
+# at reduced scale in the first place (annotated artifacts are then rendered from that decode)
+INFERENCE_MAX_SIDE = 2048
+INFERENCE_MAX_MEGAPIXELS = 4.0
+INFERENCE_DRAFT_DECODE = True
+
+# Model inference runs on its own bounded thread pool: INFERENCE_WORKERS jobs at a time, up to
+# INFERENCE_QUEUE_SIZE more waiting. Requests beyond that get 429, and jobs that have not started
+# within INFERENCE_QUEUE_DEADLINE_S seconds get 503 (both with Retry-After; 0 = no deadline)
+INFERENCE_WORKERS = 2
+INFERENCE_QUEUE_SIZE = 16
+INFERENCE_QUEUE_DEADLINE_S = 30.0
+
+# CPU inference in worker processes: 0 keeps inference in the API process (threads). With N > 0 the
+# models are loaded once in a single-threaded fork server and N processes are forked from it that share
+# the weights (settings changed at runtime do not reach it); each is pinned to its own slice of cores
+# with INFERENCE_THREADS_PER_PROCESS torch threads (0 = one per core in its slice)
+INFERENCE_PROCESSES = 0
+INFERENCE_THREADS_PER_PROCESS = 0
+
+# Inference precision per model: "fp32", "bf16" (autocast; falls back to fp32 where the CPU/GPU lacks
+# native bf16) or "int8" (dynamically quantized nn.Linear layers, CPU only)
+DETECTOR_PRECISION = "fp32"
+SEGMENTER_PRECISION = "fp32"
+
+# Inference runtime: "torch", or (experimental) "onnx" to export the detector and SAM (encoder and decoder) to ONNX
+# once, cache the graphs in ONNX_CACHE_DIR and run them on ONNX Runtime's CPU provider (needs the
+# onnx and onnxruntime packages; falls back to torch without them or on GPU). With "onnx", int8 is
+# ONNX Runtime dynamic quantization and bf16 runs as fp32. ONNX_INTRA_OP_THREADS = 0 uses every
+# core the process may run on. Parity of the exported graphs has only been checked on randomly
+# initialized checkpoints (benchmarks/bench_onnx_backend.py --graphs); run the parity benchmark on
+# the real models before relying on it
+INFERENCE_BACKEND = "torch"
+ONNX_CACHE_DIR = ".cache/onnx"
+ONNX_INTRA_OP_THREADS = 0
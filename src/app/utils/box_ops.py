@@ -0,0 +1,136 @@
+# app/utils/box_ops.py
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def box_areas(boxes: np.ndarray) -> np.ndarray:
+    """
+    Areas of [N, 4] xyxy boxes; inverted boxes count as empty.
+    """
+    return np.maximum(0, boxes[..., 2] - boxes[..., 0]) * np.maximum(0, boxes[..., 3] - boxes[..., 1])
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise IoU between [..., N, 4] and [..., M, 4] xyxy boxes, shape [..., N, M].
+
+    Same arithmetic as detection_filter.compute_iou, so results match it exactly.
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float64)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64)
+    a = boxes_a[..., :, None, :]
+    b = boxes_b[..., None, :, :]
+    inter_w = np.maximum(0, np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]))
+    inter_h = np.maximum(0, np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]))
+    inter = inter_w * inter_h
+    union = box_areas(boxes_a)[..., :, None] + box_areas(boxes_b)[..., None, :] - inter
+    valid = (inter > 0) & (union > 0)
+    return np.divide(inter, union, out=np.zeros_like(inter), where=valid)
+
+
+def _pad(arrays: Sequence[np.ndarray], width: int, fill: float) -> np.ndarray:
+    out = np.full((len(arrays), width) + arrays[0].shape[1:], fill, dtype=np.float64)
+    for i, array in enumerate(arrays):
+        out[i, :len(array)] = array
+    return out
+
+
+def batched_nms(
+    boxes: Sequence[np.ndarray],
+    scores: Sequence[np.ndarray],
+    iou_threshold: float,
+    labels: Optional[Sequence[np.ndarray]] = None
+) -> List[np.ndarray]:
+    """
+    Greedy NMS over many images at once.
+
+    Boxes are visited in descending score order (ties keep input order); a
+    box is kept unless a kept, higher-scoring box overlaps it with
+    IoU > iou_threshold. With labels, only boxes of the same label suppress
+    each other (class-aware NMS). The greedy pass is vectorised across the
+    batch, so it costs max(N) steps instead of sum(N).
+
+    Returns, per image, the kept indices in descending score order.
+    """
+    counts = [len(s) for s in scores]
+    n_max = max(counts, default=0)
+    if n_max == 0:
+        return [np.zeros(0, dtype=np.int64) for _ in counts]
+
+    orders = [np.argsort(-np.asarray(s, dtype=np.float64), kind="stable") for s in scores]
+    sorted_boxes = [np.asarray(b, dtype=np.float64).reshape(-1, 4)[o] for b, o in zip(boxes, orders)]
+    padded = _pad([b if len(b) else np.zeros((0, 4)) for b in sorted_boxes], n_max, 0.0)
+    valid = np.arange(n_max)[None, :] < np.asarray(counts)[:, None]
+
+    overlaps = iou_matrix(padded, padded) > iou_threshold
+    if labels is not None:
+        codes = [np.unique(np.asarray(l), return_inverse=True)[1].reshape(-1)[o] for l, o in zip(labels, orders)]
+        padded_labels = _pad([c.astype(np.float64) for c in codes], n_max, -1.0)
+        overlaps &= padded_labels[:, :, None] == padded_labels[:, None, :]
+
+    keep = np.zeros((len(counts), n_max), dtype=bool)
+    suppressed = ~valid
+    for i in range(n_max):
+        active = ~suppressed[:, i]
+        keep[:, i] = active
+        suppressed |= active[:, None] & overlaps[:, i, :]
+
+    return [order[np.flatnonzero(k[:n])] for order, k, n in zip(orders, keep, counts)]
+
+
+def nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float,
+    labels: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Greedy NMS for one image (class-aware if labels are given). See batched_nms.
+    """
+    return batched_nms([boxes], [scores], iou_threshold, None if labels is None else [labels])[0]
+
+
+def soft_nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float = 0.5,
+    sigma: float = 0.5,
+    method: str = "gaussian",
+    score_threshold: float = 0.001,
+    labels: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Soft-NMS (Bodla et al. 2017): overlapping boxes get their score decayed instead of dropped.
+
+    method "gaussian" decays by exp(-iou^2 / sigma); "linear" by (1 - iou)
+    for boxes with IoU > iou_threshold. Boxes whose score falls below
+    score_threshold are dropped. Returns kept indices and their decayed
+    scores, in the order they were selected.
+    """
+    if method not in ("gaussian", "linear"):
+        raise ValueError(f"Unknown soft-NMS method: {method}")
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).copy()
+    ious = iou_matrix(boxes, boxes)
+    if labels is not None:
+        labels = np.asarray(labels)
+        ious = np.where(labels[:, None] == labels[None, :], ious, 0.0)
+
+    remaining = np.flatnonzero(scores >= score_threshold)
+    keep, kept_scores = [], []
+    while remaining.size:
+        top = remaining[np.argmax(scores[remaining])]
+        keep.append(top)
+        kept_scores.append(scores[top])
+        remaining = remaining[remaining != top]
+        overlap = ious[top, remaining]
+        if method == "gaussian":
+            decay = np.exp(-(overlap ** 2) / sigma)
+        else:
+            decay = np.where(overlap > iou_threshold, 1.0 - overlap, 1.0)
+        scores[remaining] *= decay
+        remaining = remaining[scores[remaining] >= score_threshold]
+
+    return np.asarray(keep, dtype=np.int64), np.asarray(kept_scores, dtype=np.float64)
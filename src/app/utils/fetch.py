@@ -0,0 +1,270 @@
+# app/utils/fetch.py
+
+import asyncio
+import importlib.util
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import httpx
+from PIL import Image
+
+from src.app.settings.setting import (
+    FETCH_TIMEOUT, FETCH_MAX_BYTES, FETCH_MAX_CONNECTIONS, FETCH_PER_HOST_LIMIT, FETCH_HTTP2,
+    FETCH_CACHE_ENABLED
+)
+from src.app.utils.fetch_cache import CachedFetch, FetchCache, fetch_cache
+from src.app.utils.logger_utils import get_logger
+from src.app.utils.resolution import to_rgb
+
+logger = get_logger(__name__)
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Referer': 'https://www.google.com/'
+}
+
+# Leading bytes of the image formats PIL can decode for us
+MAGIC_BYTES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+]
+SNIFF_BYTES = 16
+# Pinterest pages are parsed for their og:image; no need to read more HTML than this
+MAX_HTML_BYTES = 2 * 2**20
+
+
+class FetchError(ValueError):
+    """
+    The URL could not be fetched or does not point to an image.
+    """
+
+
+@dataclass
+class FetchedImage:
+    data: bytes
+    url: str            # final URL after redirects / Pinterest resolution
+    content_type: str   # sniffed from the bytes, not taken from the headers
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """
+    Image MIME type from the first bytes of a file, or None if it is not a known image format.
+    """
+    if len(head) >= 12 and head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for magic, content_type in MAGIC_BYTES:
+        if head.startswith(magic):
+            return content_type
+    return None
+
+
+def is_pinterest(url: str) -> bool:
+    return 'pin.it' in url or 'pinterest' in url
+
+
+def pinterest_image_url(html: str, page_url: str) -> Optional[str]:
+    """
+    Image URL of a Pinterest pin page: its og:image, or the main <img> as a fallback.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    og_image = soup.find('meta', property='og:image')
+    if og_image and og_image.get('content'):
+        return urljoin(page_url, str(og_image.get('content')))
+    for img in soup.find_all('img'):
+        img_src = img.get('src')
+        img_class = img.get('class')
+        if img_src and img_class and 'mainImage' in img_class:
+            return urljoin(page_url, str(img_src))
+    return None
+
+
+class ImageFetcher:
+    """
+    Shared, connection-pooled HTTP client for image URLs.
+
+    One streaming GET per image: the body is read into memory up to
+    max_bytes, the format is sniffed from the first bytes and the result is
+    decoded once, from memory. Requests to the same host are capped at
+    per_host_limit so one slow CDN cannot take every pooled connection.
+    HTTP/2 is used when the h2 package is installed. With a FetchCache,
+    repeat fetches are conditional GETs and Pinterest pins skip their HTML
+    page; pass transport to point the client at a local stand-in server.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = FETCH_MAX_BYTES,
+        max_connections: int = FETCH_MAX_CONNECTIONS,
+        per_host_limit: int = FETCH_PER_HOST_LIMIT,
+        timeout: float = FETCH_TIMEOUT,
+        http2: bool = FETCH_HTTP2,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        cache: Optional[FetchCache] = None
+    ):
+        self.max_bytes = max_bytes
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.transport = transport
+        self.cache = cache
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                follow_redirects=True,
+                timeout=self.timeout,
+                headers=HEADERS,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                transport=self.transport
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def _get(self, url: str, allow_html: bool = False, headers: Optional[Dict[str, str]] = None):
+        """
+        One streaming GET. Returns (response, body, sniffed content type).
+
+        The body is capped at max_bytes. If the first bytes are not an image
+        the download stops there, unless allow_html, in which case up to
+        MAX_HTML_BYTES of the page are read and the content type is None.
+        A 304 answer to a conditional request comes back with an empty body.
+        """
+        async with self._host_limit(url):
+            async with self.client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304:
+                    return response, b"", None
+                response.raise_for_status()
+                length = response.headers.get("content-length")
+                body = bytearray()
+                content_type, limit = None, self.max_bytes
+                async for chunk in response.aiter_bytes():
+                    sniffed = len(body) >= SNIFF_BYTES
+                    body.extend(chunk)
+                    if not sniffed and len(body) >= SNIFF_BYTES:
+                        content_type = sniff_image_type(bytes(body[:SNIFF_BYTES]))
+                        if content_type is None:
+                            if not allow_html:
+                                break
+                            limit = MAX_HTML_BYTES
+                        elif length is not None and length.isdigit() and int(length) > self.max_bytes:
+                            raise FetchError(f"Image too large: {url} ({length} bytes, limit {self.max_bytes})")
+                    if len(body) > limit:
+                        if content_type is None:
+                            break
+                        raise FetchError(f"Image too large: {url} (limit {self.max_bytes} bytes)")
+                if len(body) < SNIFF_BYTES:
+                    content_type = sniff_image_type(bytes(body))
+        return response, bytes(body[:limit]), content_type
+
+    async def _download(self, url: str, allow_html: bool = False) -> Tuple[Optional[FetchedImage], httpx.Response, bytes]:
+        """
+        GET an image through the fetch cache: cached URLs are revalidated with a conditional request.
+        Returns the image (None if the URL served something else), the response and the raw body.
+        """
+        cached = await asyncio.to_thread(self.cache.get, url) if self.cache is not None else None
+        response, body, content_type = await self._get(url, allow_html, cached.validators if cached else None)
+        if response.status_code == 304 and cached is not None:
+            self.cache.hits += 1
+            await asyncio.to_thread(self.cache.touch, url)
+            return FetchedImage(data=cached.data, url=cached.url, content_type=cached.content_type), response, b""
+        if content_type is None:
+            return None, response, body
+        fetched = FetchedImage(data=body, url=str(response.url), content_type=content_type)
+        if self.cache is not None:
+            self.cache.misses += 1
+            entry = CachedFetch(
+                data=body,
+                url=fetched.url,
+                content_type=content_type,
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified")
+            )
+            if entry.validators:
+                await asyncio.to_thread(self.cache.put, url, entry)
+        return fetched, response, body
+
+    async def _resolve_pinterest(self, url: str) -> Optional[FetchedImage]:
+        """
+        Fetch a pin through its remembered og:image URL, skipping the HTML page.
+        """
+        target = await asyncio.to_thread(self.cache.get_alias, url)
+        if target is None:
+            return None
+        try:
+            fetched, _, _ = await self._download(target)
+        except (FetchError, httpx.HTTPError):
+            fetched = None
+        if fetched is None:
+            # The pin points somewhere else now; resolve it again from the page
+            await asyncio.to_thread(self.cache.drop_alias, url)
+        return fetched
+
+    async def fetch(self, url: str) -> FetchedImage:
+        """
+        Download an image URL into memory, resolving Pinterest pin pages to their image.
+        """
+        try:
+            if self.cache is not None and is_pinterest(url):
+                fetched = await self._resolve_pinterest(url)
+                if fetched is not None:
+                    return fetched
+            fetched, response, body = await self._download(url, allow_html=is_pinterest(url))
+            if fetched is None and is_pinterest(url):
+                logger.info(f"Pinterest URL detected: {url}, extracting image URL from HTML")
+                html = body.decode(response.encoding or 'utf-8', 'replace')
+                image_url = pinterest_image_url(html, str(response.url))
+                if image_url is None:
+                    raise FetchError(f"Could not find image URL from Pinterest page: {url}")
+                fetched, response, _ = await self._download(image_url)
+                if fetched is not None and self.cache is not None:
+                    await asyncio.to_thread(self.cache.put_alias, url, image_url)
+            if fetched is None:
+                raise FetchError(
+                    f"URL does not point to an image: {url}, Content-Type: {response.headers.get('content-type', '')}"
+                )
+            return fetched
+        except FetchError:
+            raise
+        except httpx.HTTPError as e:
+            raise FetchError(f"Failed to fetch {url}: {e}") from e
+
+
+def decode_image(data: bytes) -> Image.Image:
+    """
+    Decode image bytes to RGB without touching the disk (large JPEGs at reduced scale, see to_rgb).
+    """
+    return to_rgb(Image.open(BytesIO(data)))
+
+
+image_fetcher = ImageFetcher(cache=fetch_cache if FETCH_CACHE_ENABLED else None)
+
+
+async def fetch_image(url: str) -> Image.Image:
+    fetched = await image_fetcher.fetch(url)
+    return await asyncio.to_thread(decode_image, fetched.data)
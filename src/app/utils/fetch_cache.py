@@ -0,0 +1,179 @@
+# app/utils/fetch_cache.py
+
+import hashlib
+import os
+import pickle
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from src.app.settings.setting import FETCH_CACHE_MB, FETCH_CACHE_DIR
+from src.app.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CachedFetch:
+    data: bytes
+    url: str                            # final URL the bytes came from
+    content_type: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """
+        Conditional request headers that revalidate this entry.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class FetchCache:
+    """
+    On-disk cache of downloaded images keyed by source URL (or s3:// URL).
+
+    Entries keep the ETag/Last-Modified they were served with, so a repeat
+    fetch is a conditional request that usually comes back 304 with no body.
+    Resolved redirects such as Pinterest pin page -> og:image URL are kept as
+    small alias entries. Files are evicted least recently used first once
+    the directory grows past max_bytes.
+    """
+
+    def __init__(self, max_bytes: int, directory: str):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._usage: Optional[int] = None
+        self.hits = 0       # revalidated with a 304, served from disk
+        self.misses = 0     # downloaded in full
+        self.alias_hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _path(self, url: str, kind: str) -> str:
+        key = self.key(url)
+        return os.path.join(self.directory, key[:2], f"{key}.{kind}")
+
+    def get(self, url: str) -> Optional[CachedFetch]:
+        path = self._path(url, "entry")
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Dropping unreadable fetch cache entry %s: %s", path, str(e))
+            self._remove(path)
+            return None
+
+    def put(self, url: str, entry: CachedFetch) -> None:
+        self._write(self._path(url, "entry"), pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def touch(self, url: str) -> None:
+        try:
+            os.utime(self._path(url, "entry"))
+        except OSError:
+            pass
+
+    def get_alias(self, url: str) -> Optional[str]:
+        path = self._path(url, "alias")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                target = f.read().strip()
+            os.utime(path)
+        except OSError:
+            return None
+        self.alias_hits += 1
+        return target or None
+
+    def put_alias(self, url: str, target: str) -> None:
+        self._write(self._path(url, "alias"), target.encode("utf-8"))
+
+    def drop_alias(self, url: str) -> None:
+        self._remove(self._path(url, "alias"))
+
+    def _write(self, path: str, data: bytes) -> None:
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            # An overwritten entry (e.g. a refresh) must not be counted twice
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write fetch cache entry %s: %s", path, str(e))
+            self._remove(tmp_path)
+            return
+        with self._lock:
+            self._usage = self._scan() if self._usage is None else self._usage + len(data) - replaced
+            if self._usage > self.max_bytes:
+                self._evict()
+
+    def _scan(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _evict(self) -> None:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        # Evict down to 90% of the budget so we don't rescan on every write
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+            self.evictions += 1
+        self._usage = total
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses
+        return {
+            "size_mb": round((self._usage or 0) / 2**20, 2),
+            "max_size_mb": round(self.max_bytes / 2**20, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+            "alias_hits": self.alias_hits,
+            "evictions": self.evictions
+        }
+
+
+fetch_cache = FetchCache(max_bytes=FETCH_CACHE_MB * 2**20, directory=FETCH_CACHE_DIR)
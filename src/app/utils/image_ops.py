@@ -1,14 +1,25 @@
 # app/utils/image_ops.py
 
 from PIL import Image
-import torch
 import numpy as np
-import cv2
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import asyncio
+import hashlib
+import os
+import threading
 
 from .results import DetectionResult
-from .s3_helper import download_from_s3
+from .compact_mask import CompactMask
+from src.app.utils.fetch import fetch_image, decode_image
+from src.app.utils.s3_reader import s3_reader
+from .resolution import to_rgb
+from .lazy_import import lazy_module
+from src.app.settings.setting import POLYGON_WORKERS
+
+torch = lazy_module("torch")
+cv2 = lazy_module("cv2")
 
 def mask_to_polygon(mask: np.ndarray) -> List[List[int]]:
     contours, _ = cv2.findContours(mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -22,13 +33,77 @@ def polygon_to_mask(polygon: List[List[int]], image_shape: Tuple[int, int]) -> n
     cv2.fillPoly(mask, [pts], color=(255,))
     return mask
 
+def compact_mask_to_polygon(mask: CompactMask) -> List[List[int]]:
+    """
+    Outer polygon of a compact mask in full-image pixel coordinates, traced on its crop only.
+    """
+    if not mask.any():
+        return []
+    x0, y0 = mask.box[:2]
+    return [[x + x0, y + y0] for x, y in mask_to_polygon(mask.crop().astype(np.uint8))]
+
+def mask_polygon_refinement(mask: CompactMask, tolerance: float = 0.0) -> Tuple[CompactMask, List[List[int]]]:
+    """
+    Replace a mask by the filled outline of its largest contour, working on the box crop.
+
+    Returns the refined mask and its outline in image coordinates; with
+    tolerance > 0 the returned outline is simplified (Douglas-Peucker, in
+    pixels), the mask itself is filled from the exact contour.
+    """
+    if not mask.any():
+        return mask, []
+    crop = mask.crop().astype(np.uint8)
+    contours, _ = cv2.findContours(crop, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    largest_contour = max(contours, key=cv2.contourArea)
+    refined = np.zeros(crop.shape, dtype=np.uint8)
+    cv2.fillPoly(refined, [largest_contour.astype(np.int32)], color=(1,))
+    if tolerance > 0:
+        largest_contour = cv2.approxPolyDP(largest_contour, tolerance, True)
+    x0, y0 = mask.box[:2]
+    polygon = (largest_contour.reshape(-1, 2) + np.array([x0, y0])).tolist()
+    return CompactMask.from_crop(refined, (x0, y0), mask.shape), polygon
+
+def refine_compact_mask(mask: CompactMask) -> CompactMask:
+    return mask_polygon_refinement(mask)[0]
+
+_polygon_pool: Optional[ThreadPoolExecutor] = None
+_polygon_pool_lock = threading.Lock()
+
+def _get_polygon_pool() -> ThreadPoolExecutor:
+    global _polygon_pool
+    with _polygon_pool_lock:
+        if _polygon_pool is None:
+            _polygon_pool = ThreadPoolExecutor(max_workers=POLYGON_WORKERS or os.cpu_count() or 1, thread_name_prefix="polygon")
+        return _polygon_pool
+
+def refine_polygons(masks: List[CompactMask], tolerance: float = 0.0) -> Tuple[List[CompactMask], List[List[List[int]]]]:
+    """
+    Polygon refinement for many masks on a worker pool (OpenCV releases the GIL).
+    Returns the refined masks and their outlines, in input order.
+    """
+    refine = partial(mask_polygon_refinement, tolerance=tolerance)
+    if len(masks) < 2:
+        results = [refine(mask) for mask in masks]
+    else:
+        results = list(_get_polygon_pool().map(refine, masks))
+    return [mask for mask, _ in results], [polygon for _, polygon in results]
+
 async def load_image(image_str: str) -> Image.Image:
-    if image_str.startswith("http") or image_str.startswith("s3://"):
-        local_path = await download_from_s3(image_str)
-        image = Image.open(local_path).convert("RGB")
-        return image
+    if image_str.startswith("http://") or image_str.startswith("https://"):
+        return await fetch_image(image_str)
+    elif image_str.startswith("s3://"):
+        data = await s3_reader.read_async(image_str)
+        return await asyncio.to_thread(decode_image, data)
     else:
-        return await asyncio.to_thread(lambda: Image.open(image_str).convert("RGB"))
+        return await asyncio.to_thread(lambda: to_rgb(Image.open(image_str)))
+
+def image_digest(image: Image.Image) -> str:
+    """
+    Content hash of the decoded pixels, so the same picture gets the same key however it was sent.
+    """
+    digest = hashlib.sha256(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
 
 def get_boxes(results: List[DetectionResult]) -> List[List[List[float]]]:
     boxes = []
@@ -36,19 +111,81 @@ def get_boxes(results: List[DetectionResult]) -> List[List[List[float]]]:
         boxes.append(result.box.xyxy)
     return [boxes]
 
-def refine_masks(masks: torch.Tensor, polygon_refinement: bool = False) -> List[np.ndarray]:
+def refine_masks(masks: "torch.Tensor", polygon_refinement: bool = False) -> List[CompactMask]:
     masks = masks.cpu().float()
     masks = masks.permute(0, 2, 3, 1)
     masks = masks.mean(dim=-1)
     masks = (masks > 0).int()
     masks_np = masks.numpy().astype(np.uint8)
-    masks_list = list(masks_np)
+    masks_list = [CompactMask.from_dense(mask) for mask in masks_np]
+
+    if polygon_refinement:
+        masks_list, _ = refine_polygons(masks_list)
+
+    return masks_list
+
+def _low_res_window(positive: np.ndarray, scale_x: float, scale_y: float, original_size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    Original-image window that can contain mask pixels, given the positive low-res logits.
+    Bilinear upsampling is only > 0 within one low-res pixel of a positive one.
+    """
+    orig_h, orig_w = original_size
+    rows = np.flatnonzero(positive.any(axis=1))
+    cols = np.flatnonzero(positive.any(axis=0))
+    x0 = max(0, int(np.floor((cols[0] - 0.5) / scale_x - 0.5)))
+    y0 = max(0, int(np.floor((rows[0] - 0.5) / scale_y - 0.5)))
+    x1 = min(orig_w, int(np.ceil((cols[-1] + 1.5) / scale_x - 0.5)) + 1)
+    y1 = min(orig_h, int(np.ceil((rows[-1] + 1.5) / scale_y - 0.5)) + 1)
+    return x0, y0, x1, y1
+
+def refine_low_res_masks(
+    low_res_masks: "torch.Tensor",
+    original_size: Tuple[int, int],
+    reshaped_input_size: Tuple[int, int],
+    pad_size: Tuple[int, int] = (1024, 1024),
+    polygon_refinement: bool = False
+) -> List[CompactMask]:
+    """
+    Post-process SAM's low-res mask logits without building full-frame tensors.
+
+    The 3 multimask outputs are merged (max logit) at low resolution, and
+    only the window around each mask is resampled to original pixels, in
+    one bilinear step straight from the low-res grid. low_res_masks is
+    [n, 3, h, w] (or [1, n, 3, h, w]) as returned in SamModel's pred_masks;
+    pad_size is the (height, width) of the padded SAM input.
+    """
+    logits = low_res_masks.detach().cpu()
+    if logits.dim() == 5:
+        logits = logits[0]
+    merged = logits.max(dim=1).values.float().numpy()
+
+    orig_h, orig_w = original_size
+    new_h, new_w = reshaped_input_size
+    low_h, low_w = merged.shape[-2:]
+    # Low-res pixels per original pixel
+    scale_x = (new_w / orig_w) * (low_w / pad_size[1])
+    scale_y = (new_h / orig_h) * (low_h / pad_size[0])
+
+    masks_list = []
+    for logit in merged:
+        positive = logit > 0
+        if not positive.any():
+            masks_list.append(CompactMask.empty(original_size))
+            continue
+        x0, y0, x1, y1 = _low_res_window(positive, scale_x, scale_y, original_size)
+        # dst(u, v) = src((x0 + u + 0.5) * scale_x - 0.5, (y0 + v + 0.5) * scale_y - 0.5)
+        transform = np.float32([
+            [scale_x, 0, (x0 + 0.5) * scale_x - 0.5],
+            [0, scale_y, (y0 + 0.5) * scale_y - 0.5]
+        ])
+        crop = cv2.warpAffine(
+            logit, transform, (x1 - x0, y1 - y0),
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_REPLICATE
+        )
+        masks_list.append(CompactMask.from_crop(crop > 0, (x0, y0), original_size))
 
     if polygon_refinement:
-        for idx, mask in enumerate(masks_list):
-            shape = tuple(mask.shape)
-            polygon = mask_to_polygon(mask)
-            refined_mask = polygon_to_mask(polygon, shape)
-            masks_list[idx] = refined_mask
+        masks_list, _ = refine_polygons(masks_list)
 
     return masks_list
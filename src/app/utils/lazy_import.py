@@ -0,0 +1,47 @@
+# app/utils/lazy_import.py
+
+import importlib
+import sys
+import types
+from typing import List
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    `torch = lazy_module("torch")` at the top of a file keeps `torch.x` call
+    sites unchanged while moving the import cost from app startup to the
+    first request (or the background warm-up). Annotations that name the
+    module must be strings, or they would trigger the import at definition time.
+    """
+
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self.__name__)
+        # Later lookups hit the copied attributes and skip __getattr__
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__name__ in sys.modules else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_module(name: str) -> types.ModuleType:
+    """
+    The module itself if it is already imported, otherwise a LazyModule for it.
+    """
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def import_modules(names: List[str]) -> List[str]:
+    """
+    Import modules now (e.g. in a warm-up thread). Returns the names that failed to import.
+    """
+    failed = []
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            failed.append(name)
+    return failed
@@ -1,49 +1,117 @@
 # app/utils/plotting.py
 
-import matplotlib
-matplotlib.use('Agg')  # Set non-GUI backend before importing pyplot
-
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
+import os
+import threading
+import zlib
 import numpy as np
-import cv2
 from PIL import Image
-import matplotlib.pyplot as plt
 import random
-import plotly.express as px
-import plotly.graph_objects as go
 
 # from .image_ops import mask_to_polygon
 from .results import DetectionResult
+from .lazy_import import lazy_module
+from src.app.settings.setting import ARTIFACT_QUALITY, ARTIFACT_PNG_COMPRESSION, MASK_OVERLAY_ALPHA
 
-def annotate(image: Image.Image, detection_results: List[DetectionResult]) -> np.ndarray:
-    image_cv2 = np.array(image) if isinstance(image, Image.Image) else image
-    image_cv2 = cv2.cvtColor(image_cv2, cv2.COLOR_RGB2BGR)
+cv2 = lazy_module("cv2")
+
+# Fixed BGR palette (tab20); a label always gets the same color
+PALETTE: List[Tuple[int, int, int]] = [
+    (180, 119, 31), (232, 199, 174), (14, 127, 255), (120, 187, 255), (44, 160, 44),
+    (138, 223, 152), (40, 39, 214), (150, 152, 255), (189, 103, 148), (213, 176, 197),
+    (75, 86, 140), (148, 156, 196), (194, 119, 227), (210, 182, 247), (127, 127, 127),
+    (199, 199, 199), (34, 189, 188), (141, 219, 219), (207, 190, 23), (229, 218, 158)
+]
+
+# One drawing buffer per worker thread, reused while the image size stays the same
+_buffers = threading.local()
+
+def label_color(label: str) -> Tuple[int, int, int]:
+    key = label.lower().strip().rstrip('.')
+    return PALETTE[zlib.crc32(key.encode()) % len(PALETTE)]
+
+def _canvas(image_rgb: np.ndarray) -> np.ndarray:
+    buffer = getattr(_buffers, "canvas", None)
+    if buffer is None or buffer.shape != image_rgb.shape:
+        buffer = np.empty_like(image_rgb)
+        _buffers.canvas = buffer
+    return cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR, dst=buffer)
+
+def render(image: Image.Image, detection_results: List[DetectionResult], alpha: float = MASK_OVERLAY_ALPHA) -> np.ndarray:
+    """
+    Draw masks (translucent fill + outline), boxes and labels on a BGR copy of the image.
+
+    The returned array is this thread's reusable buffer: encode or copy it
+    before the next render() call on the same thread.
+    """
+    image_rgb = np.asarray(image) if isinstance(image, Image.Image) else image
+    canvas = _canvas(np.ascontiguousarray(image_rgb[..., :3]))
+    height, width = canvas.shape[:2]
+    thickness = max(2, round(max(height, width) / 600))
+    font_scale = max(0.5, max(height, width) / 1600)
 
     for detection in detection_results:
-        label = detection.label
-        score = detection.score
-        box = detection.box
+        color = label_color(detection.label)
         mask = detection.mask
+        if mask is not None and mask.any():
+            x0, y0, x1, y1 = mask.box
+            region = canvas[y0:y1, x0:x1]
+            crop = mask.crop()
+            region[crop] = (region[crop] * (1.0 - alpha) + np.array(color) * alpha).astype(np.uint8)
+            # Trace contours on the mask's box crop only, shifted back to image coordinates
+            contours, _ = cv2.findContours(crop.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x0, y0))
+            cv2.drawContours(canvas, contours, -1, color, thickness)
 
-        color = np.random.randint(0, 256, size=3)
+    for detection in detection_results:
+        color = label_color(detection.label)
+        box = detection.box
+        cv2.rectangle(canvas, (int(box.xmin), int(box.ymin)), (int(box.xmax), int(box.ymax)), color, thickness)
+        text = f"{detection.label}: {detection.score:.2f}"
+        (text_w, text_h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+        top = max(0, int(box.ymin) - text_h - baseline - 4)
+        cv2.rectangle(canvas, (int(box.xmin), top), (int(box.xmin) + text_w + 4, top + text_h + baseline + 4), color, -1)
+        cv2.putText(canvas, text, (int(box.xmin) + 2, top + text_h + 2), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), 1, cv2.LINE_AA)
 
-        cv2.rectangle(image_cv2, (box.xmin, box.ymin), (box.xmax, box.ymax), color.tolist(), 2)
-        cv2.putText(image_cv2, f"{label}: {score:.2f}", (box.xmin, box.ymin - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color.tolist(), 2)
+    return canvas
 
-        if mask is not None:
-            mask_uint8 = (mask * 255).astype(np.uint8)
-            contours, _ = cv2.findContours(mask_uint8, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            cv2.drawContours(image_cv2, contours, -1, color.tolist(), 2)
+def annotate(image: Image.Image, detection_results: List[DetectionResult]) -> np.ndarray:
+    """
+    Annotated RGB copy of the image.
+    """
+    return cv2.cvtColor(render(image, detection_results), cv2.COLOR_BGR2RGB)
 
-    return cv2.cvtColor(image_cv2, cv2.COLOR_BGR2RGB)
+def encode_image(image_bgr: np.ndarray, fmt: str = "png", quality: int = ARTIFACT_QUALITY) -> bytes:
+    """
+    Encode a BGR array as png, webp or jpeg. quality (1-100) applies to webp/jpeg;
+    png is lossless and uses ARTIFACT_PNG_COMPRESSION.
+    """
+    fmt = fmt.lower().lstrip(".")
+    if fmt == "png":
+        ext, params = ".png", [cv2.IMWRITE_PNG_COMPRESSION, ARTIFACT_PNG_COMPRESSION]
+    elif fmt == "webp":
+        ext, params = ".webp", [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    elif fmt in ("jpg", "jpeg"):
+        ext, params = ".jpg", [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    else:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    ok, encoded = cv2.imencode(ext, image_bgr, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {fmt}")
+    return encoded.tobytes()
 
-def plot_detections(image: Image.Image, detections: List[DetectionResult], save_name: Optional[str] = None) -> None:
-    annotated_image = annotate(image, detections)
+def plot_detections(
+    image: Image.Image,
+    detections: List[DetectionResult],
+    save_name: Optional[str] = None,
+    quality: int = ARTIFACT_QUALITY
+) -> None:
+    """
+    Render detections and save them at full resolution; the format follows save_name's extension.
+    """
     if save_name:
-        plt.imshow(annotated_image)
-        plt.axis('off')
-        plt.savefig(save_name, bbox_inches='tight')
-        plt.close()
+        data = encode_image(render(image, detections), os.path.splitext(save_name)[1] or "png", quality)
+        with open(save_name, "wb") as f:
+            f.write(data)
 
 def random_named_css_colors(num_colors: int) -> List[str]:
     named_css_colors = [
@@ -0,0 +1,82 @@
+# app/utils/resolution.py
+
+import math
+from typing import List, Tuple
+
+from PIL import Image
+
+from .results import DetectionResult
+from src.app.settings.setting import INFERENCE_MAX_SIDE, INFERENCE_MAX_MEGAPIXELS, INFERENCE_DRAFT_DECODE
+
+
+def inference_size(
+    size: Tuple[int, int],
+    max_side: int = INFERENCE_MAX_SIDE,
+    max_megapixels: float = INFERENCE_MAX_MEGAPIXELS
+) -> Tuple[int, int]:
+    """
+    (width, height) the models should see for an image of this size: scaled down, keeping the
+    aspect ratio, until the long side is at most max_side and the area at most max_megapixels.
+    A limit of 0 is ignored; images already within both limits keep their size.
+    """
+    width, height = size
+    scale = 1.0
+    if max_side:
+        scale = min(scale, max_side / max(width, height))
+    if max_megapixels:
+        scale = min(scale, math.sqrt(max_megapixels * 1e6 / (width * height)))
+    if scale >= 1.0:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def original_size(image: Image.Image) -> Tuple[int, int]:
+    """
+    (width, height) of the picture as stored, even if it was decoded at reduced scale.
+    """
+    return image.info.get("original_size", image.size)
+
+
+def to_rgb(image: Image.Image, draft: bool = INFERENCE_DRAFT_DECODE) -> Image.Image:
+    """
+    Decode an opened image to RGB.
+
+    With draft on, a JPEG larger than its inference size is decoded at a
+    reduced DCT scale (1/2, 1/4 or 1/8, never below the inference size), which
+    skips most of the decode work. The real size is kept in info["original_size"].
+    """
+    size = image.size
+    if draft and image.format == "JPEG":
+        target = inference_size(size)
+        if target != size:
+            image.draft("RGB", target)
+    rgb = image.convert("RGB")
+    if rgb.size != size:
+        rgb.info["original_size"] = size
+    return rgb
+
+
+def resize_for_inference(image: Image.Image) -> Image.Image:
+    """
+    The image at its inference size (the image itself when no downscaling is needed).
+    """
+    target = inference_size(original_size(image))
+    if target == image.size:
+        return image
+    # reducing_gap does most of the shrink with a cheap box reduce before the bilinear pass
+    return image.resize(target, Image.BILINEAR, reducing_gap=2.0)
+
+
+def rescale_boxes(detections: List[DetectionResult], from_size: Tuple[int, int], to_size: Tuple[int, int]) -> None:
+    """
+    Map detection boxes in place from one (width, height) frame to another.
+    """
+    if from_size == to_size:
+        return
+    sx, sy = to_size[0] / from_size[0], to_size[1] / from_size[1]
+    for detection in detections:
+        box = detection.box
+        box.xmin = min(to_size[0], max(0, round(box.xmin * sx)))
+        box.ymin = min(to_size[1], max(0, round(box.ymin * sy)))
+        box.xmax = min(to_size[0], max(0, round(box.xmax * sx)))
+        box.ymax = min(to_size[1], max(0, round(box.ymax * sy)))
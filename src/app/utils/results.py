@@ -4,6 +4,8 @@ from dataclasses import dataclass
 from typing import List, Optional, Dict
 import numpy as np
 
+from .compact_mask import CompactMask
+
 @dataclass
 class BoundingBox:
     xmin: int
@@ -20,7 +22,9 @@ class DetectionResult:
     score: float
     label: str
     box: BoundingBox
-    mask: Optional[np.ndarray] = None
+    mask: Optional[CompactMask] = None
+    # Outline of the refined mask in image pixels, set when polygon refinement ran
+    polygon: Optional[List[List[int]]] = None
 
     @classmethod
     def from_dict(cls, detection_dict: Dict) -> 'DetectionResult':
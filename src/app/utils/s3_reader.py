@@ -0,0 +1,205 @@
+# app/utils/s3_reader.py
+
+import asyncio
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from src.app.settings.setting import (
+    S3_MAX_POOL_CONNECTIONS, S3_ADDRESSING_STYLE, S3_RANGE_CHUNK_MB, S3_RANGE_CONCURRENCY,
+    S3_PREFETCH_CONCURRENCY, FETCH_MAX_BYTES, FETCH_CACHE_ENABLED
+)
+from src.app.utils.fetch import FetchError, sniff_image_type
+from src.app.utils.fetch_cache import CachedFetch, FetchCache, fetch_cache
+from src.app.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+# S3 Configuration
+S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY')
+S3_SECRET_KEY = os.getenv('S3_SECRET_KEY')
+S3_ENDPOINT = os.getenv('S3_ENDPOINT')
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+def parse_s3_url(s3_url: str) -> Tuple[str, str]:
+    """
+    Parse an S3 URL (s3://bucket-name/path/to/object) into bucket name and object key.
+    """
+    parsed = urlparse(s3_url)
+    if parsed.scheme != 's3':
+        raise ValueError(f"Invalid S3 URL scheme: {parsed.scheme}. URL must start with 's3://'")
+    return parsed.netloc, parsed.path.lstrip('/')
+
+
+class _ObjectChanged(FetchError):
+    """
+    A later chunk of an object no longer matched the ETag of its first chunk.
+    """
+
+
+class S3Reader:
+    """
+    Reads S3 objects straight into memory.
+
+    The boto3 client is created on first use (importing boto3 and building a
+    client costs ~0.5 s), with a connection pool sized for concurrent reads.
+    Every read starts with one ranged GET for the first chunk; small objects
+    are complete after it, larger ones fetch the remaining chunks in
+    parallel. With a FetchCache the first GET carries If-None-Match and a
+    304 is served from disk. endpoint_url points it at any S3-compatible
+    store, including a local stand-in.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: Optional[str] = S3_ENDPOINT,
+        access_key: Optional[str] = S3_ACCESS_KEY,
+        secret_key: Optional[str] = S3_SECRET_KEY,
+        addressing_style: str = S3_ADDRESSING_STYLE,
+        max_pool_connections: int = S3_MAX_POOL_CONNECTIONS,
+        chunk_bytes: int = S3_RANGE_CHUNK_MB * 2**20,
+        range_concurrency: int = S3_RANGE_CONCURRENCY,
+        max_bytes: int = FETCH_MAX_BYTES,
+        cache: Optional[FetchCache] = None
+    ):
+        self.endpoint_url = endpoint_url
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.addressing_style = addressing_style
+        self.max_pool_connections = max_pool_connections
+        self.chunk_bytes = chunk_bytes
+        self.range_concurrency = range_concurrency
+        self.max_bytes = max_bytes
+        self.cache = cache
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._range_pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                import boto3
+                from botocore.config import Config
+
+                self._client = boto3.client(
+                    's3',
+                    aws_access_key_id=self.access_key,
+                    aws_secret_access_key=self.secret_key,
+                    endpoint_url=self.endpoint_url,
+                    config=Config(
+                        s3={'addressing_style': self.addressing_style},
+                        max_pool_connections=self.max_pool_connections,
+                        retries={'max_attempts': 3, 'mode': 'adaptive'}
+                    )
+                )
+                self._range_pool = ThreadPoolExecutor(max_workers=self.range_concurrency, thread_name_prefix="s3-range")
+            return self._client
+
+    def _get_range(self, bucket: str, key: str, start: int, end: int, **kwargs) -> Dict[str, Any]:
+        return self.client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", **kwargs)
+
+    def _read_range(self, bucket: str, key: str, start: int, end: int, etag: str) -> bytes:
+        from botocore.exceptions import ClientError
+
+        # IfMatch makes every chunk come from the same version of the object
+        try:
+            response = self._get_range(bucket, key, start, end, IfMatch=etag)
+        except ClientError as e:
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            code = e.response.get("Error", {}).get("Code")
+            if status == 412 or code == "PreconditionFailed":
+                raise _ObjectChanged(f"S3 object changed during read: s3://{bucket}/{key}") from e
+            raise FetchError(f"Failed to read s3://{bucket}/{key}: {e}") from e
+        return response["Body"].read()
+
+    def read(self, url: str) -> bytes:
+        """
+        Whole object as bytes. Raises FetchError if it is missing, too large or not an image.
+        An object replaced while its chunks are read is read again once from the first chunk.
+        """
+        try:
+            return self._read(url)
+        except _ObjectChanged as e:
+            logger.warning("%s, reading it again", str(e))
+            return self._read(url)
+
+    def _read(self, url: str) -> bytes:
+        from botocore.exceptions import ClientError
+
+        bucket, key = parse_s3_url(url)
+        cached = self.cache.get(url) if self.cache is not None else None
+        try:
+            first = self._get_range(
+                bucket, key, 0, self.chunk_bytes - 1,
+                **({"IfNoneMatch": cached.etag} if cached is not None and cached.etag else {})
+            )
+        except ClientError as e:
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            code = e.response.get("Error", {}).get("Code")
+            if cached is not None and (status == 304 or code == "304"):
+                self.cache.hits += 1
+                self.cache.touch(url)
+                return cached.data
+            if code == "InvalidRange":
+                # Empty object: any range is unsatisfiable
+                raise FetchError(f"S3 object is empty: {url}") from e
+            raise FetchError(f"Failed to read {url}: {e}") from e
+
+        head = first["Body"].read()
+        match = _CONTENT_RANGE.match(first.get("ContentRange") or "")
+        total = int(match.group(3)) if match else len(head)
+        if total > self.max_bytes:
+            raise FetchError(f"Image too large: {url} ({total} bytes, limit {self.max_bytes})")
+        content_type = sniff_image_type(head[:16])
+        if content_type is None:
+            raise FetchError(f"S3 object is not an image: {url}, Content-Type: {first.get('ContentType', '')}")
+
+        etag = first.get("ETag")
+        if total > len(head):
+            starts = range(len(head), total, self.chunk_bytes)
+            chunks = self._range_pool.map(
+                lambda start: self._read_range(bucket, key, start, min(start + self.chunk_bytes, total) - 1, etag),
+                starts
+            )
+            data = b"".join([head, *chunks])
+        else:
+            data = head
+
+        if self.cache is not None:
+            self.cache.misses += 1
+            if etag:
+                self.cache.put(url, CachedFetch(data=data, url=url, content_type=content_type, etag=etag))
+        return data
+
+    async def read_async(self, url: str) -> bytes:
+        return await asyncio.to_thread(self.read, url)
+
+    def prefetch(self, urls: Iterable[str], concurrency: int = S3_PREFETCH_CONCURRENCY) -> Dict[str, Optional[str]]:
+        """
+        Download many objects ahead of a batch job, into the fetch cache.
+        Returns url -> error message (None on success); never raises for a single object.
+        """
+        urls: List[str] = list(dict.fromkeys(urls))
+
+        def _one(url: str) -> Optional[str]:
+            try:
+                self.read(url)
+                return None
+            except Exception as e:
+                logger.warning("Prefetch failed for %s: %s", url, str(e))
+                return str(e)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(urls)))) as pool:
+            return dict(zip(urls, pool.map(_one, urls)))
+
+    async def prefetch_async(self, urls: Iterable[str], concurrency: int = S3_PREFETCH_CONCURRENCY) -> Dict[str, Optional[str]]:
+        return await asyncio.to_thread(self.prefetch, urls, concurrency)
+
+
+s3_reader = S3Reader(cache=fetch_cache if FETCH_CACHE_ENABLED else None)
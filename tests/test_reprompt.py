@@ -0,0 +1,168 @@
+# tests/test_reprompt.py
+"""
+/detect -> /segment/reprompt through the ASGI app, with the stub models from benchmarks/stubs.py.
+
+The stub segmenter never fills the SAM embedding cache, so every re-prompt
+here depends on the image /detect kept for its result_id: on a result-cache
+hit, on an image without a person and with boxes_only, SAM does not run at all.
+"""
+
+import asyncio
+import importlib
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import benchmarks.common  # noqa: F401  (sets up import paths)
+from benchmarks.stubs import StubModels, encode, make_scene, render_scene
+
+# Applied to both names the settings module is imported under, before the app reads them
+SETTINGS = {
+    "RESULT_CACHE_ENABLED": True,
+    "PRELOAD_MODELS": False,
+    "WARMUP_MODELS": False,
+    "INFERENCE_PROCESSES": 0,
+    "DEBUG_MODE": False,
+}
+
+SCENES = [make_scene(0, 640, 480, persons=2), make_scene(1, 640, 480, persons=0)]
+WITH_PERSONS, NO_PERSON = SCENES
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    # The app writes results/ and .cache/ relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    os.makedirs("results")
+    for module in ("src.app.settings.setting", "app.settings.setting"):
+        settings = importlib.import_module(module)
+        for key, value in SETTINGS.items():
+            setattr(settings, key, value)
+
+    models = StubModels(SCENES)
+    models.install()
+    segment = importlib.import_module("src.app.core.segment")
+    encoded = []
+
+    def get_image_embedding(image, model_id, image_key=None, original_size=None):
+        encoded.append(image_key)
+        width, height = original_size if original_size is not None else image.size
+        embedding = SimpleNamespace(nbytes=1, original_size=(height, width), reshaped_input_size=(image.height, image.width))
+        segment.embedding_cache.put((model_id, image_key), embedding)
+        return image_key, embedding
+
+    def decode_masks(embedding, boxes, model_id, polygon_refinement=False):
+        height, width = embedding.original_size
+        return models.segment_boxes(None, boxes, model_id, polygon_refinement, None, (width, height))
+
+    segment.get_image_embedding = get_image_embedding
+    segment.decode_masks = decode_masks
+
+    import src.app.main as main
+    from src.app.services.result_store import result_store
+
+    yield SimpleNamespace(app=main.app, segment=segment, encoded=encoded)
+
+    result_store.close()
+    os.chdir(cwd)
+
+
+def _run(app, scenario):
+    import httpx
+    from src.app.services import outfit_results, segmentation_service
+
+    async def main():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            result = await scenario(client)
+        await asyncio.gather(*list(outfit_results._background_writes), *list(segmentation_service._background_tasks))
+        return result
+
+    return asyncio.run(main())
+
+
+async def _detect(client, scene, **data):
+    response = await client.post(
+        "/detect",
+        files={"file": (f"{scene.name}.jpg", encode(render_scene(scene)), "image/jpeg")},
+        data={"render": "false", **data}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "completed", body
+    return body
+
+
+async def _reprompt(client, result_id, boxes, labels=None):
+    data = {"result_id": result_id, "boxes": json.dumps(boxes)}
+    if labels is not None:
+        data["labels"] = labels
+    return await client.post("/segment/reprompt", data=data)
+
+
+def _forget(app):
+    app.segment.embedding_cache.clear()
+    app.segment.reprompt_images.clear()
+
+
+def test_reprompt_after_result_cache_hit(app):
+    from src.app.services.result_cache import result_cache
+
+    async def scenario(client):
+        await _detect(client, WITH_PERSONS)
+        # Only the cached /detect below can make the image re-promptable again
+        _forget(app)
+        hits = result_cache.memory.hits
+        detected = await _detect(client, WITH_PERSONS)
+        assert result_cache.memory.hits == hits + 1
+        return detected, await _reprompt(client, detected["result_id"], [[40, 40, 200, 300]], "shirt")
+
+    detected, response = _run(app, scenario)
+    body = response.json()
+    assert body["status"] == "completed", body
+    assert [segment["text_prompt"] for segment in body["segments"]] == ["shirt"]
+    assert app.encoded[-1] == detected["result_id"]
+
+
+def test_reprompt_after_no_person_image(app):
+    async def scenario(client):
+        _forget(app)
+        detected = await _detect(client, NO_PERSON, bypass_cache="true")
+        assert detected["num_persons"] == 0
+        return detected, await _reprompt(client, detected["result_id"], [[10, 10, 120, 90], [200, 150, 400, 300]])
+
+    detected, response = _run(app, scenario)
+    body = response.json()
+    assert body["status"] == "completed", body
+    assert len(body["segments"]) == 2
+
+
+def test_reprompt_after_boxes_only(app):
+    async def scenario(client):
+        _forget(app)
+        detected = await _detect(client, WITH_PERSONS, boxes_only="true", bypass_cache="true")
+        return await _reprompt(client, detected["result_id"], [[40, 40, 200, 300]])
+
+    body = _run(app, scenario).json()
+    assert body["status"] == "completed", body
+    assert len(body["segments"]) == 1
+
+
+def test_reprompt_unknown_result_id(app):
+    async def scenario(client):
+        _forget(app)
+        return await _reprompt(client, "0" * 64, [[0, 0, 10, 10]])
+
+    body = _run(app, scenario).json()
+    assert body["status"] == "failed"
+    assert "run /detect" in body["error"]
+
+
+def test_reprompt_rejects_label_count_mismatch(app):
+    async def scenario(client):
+        return await _reprompt(client, "0" * 64, [[0, 0, 10, 10], [5, 5, 20, 20]], "shirt")
+
+    assert _run(app, scenario).status_code == 400